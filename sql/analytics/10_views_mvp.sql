@@ -1,17 +1,67 @@
+-- Códigos decodificados pelas tabelas de domínio (dim_*, src/ingest/domains.py).
+-- A descrição vem por último: CREATE OR REPLACE VIEW só acrescenta colunas no fim.
+-- Tabelas sem schema: a etapa 07 define o search_path (current, com RELEASE_SCHEMAS, ou public).
+--
+-- As agregações ficam em materialized views (mv_*), atualizadas pela etapa 07 com
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY após cada carga: o índice único (uma linha
+-- por código, NULL incluso) é o que permite o CONCURRENTLY. As views v_* mantêm a
+-- interface dos painéis (colunas e ordem), lendo das mv_*.
+-- IF NOT EXISTS: a etapa 07 compara a definição de cada mv_* existente com a deste arquivo
+-- (pg_get_viewdef) e, se mudou, remove a mv_* (e as views que a leem) para recriá-la.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_distribuicao_natureza AS
+SELECT e.natureza_juridica, COUNT(*) AS qtd, d.descricao
+FROM empresas e
+LEFT JOIN dim_natureza d ON d.codigo = e.natureza_juridica
+GROUP BY e.natureza_juridica, d.descricao;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_distribuicao_natureza_key
+ON analytics.mv_distribuicao_natureza (natureza_juridica) NULLS NOT DISTINCT;
+
 CREATE OR REPLACE VIEW analytics.v_distribuicao_natureza AS
-SELECT natureza_juridica, COUNT(*) AS qtd
-FROM public.empresas
-GROUP BY natureza_juridica
-ORDER BY COUNT(*) DESC;
+SELECT natureza_juridica, qtd, descricao
+FROM analytics.mv_distribuicao_natureza
+ORDER BY qtd DESC;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_distribuicao_municipio AS
+SELECT e.municipio, COUNT(*) AS qtd, d.descricao
+FROM estabelecimentos e
+LEFT JOIN dim_municipio d ON d.codigo = e.municipio
+GROUP BY e.municipio, d.descricao;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_distribuicao_municipio_key
+ON analytics.mv_distribuicao_municipio (municipio) NULLS NOT DISTINCT;
 
 CREATE OR REPLACE VIEW analytics.v_distribuicao_municipio AS
-SELECT municipio, COUNT(*) AS qtd
-FROM public.estabelecimentos
-GROUP BY municipio
-ORDER BY COUNT(*) DESC;
+SELECT municipio, qtd, descricao
+FROM analytics.mv_distribuicao_municipio
+ORDER BY qtd DESC;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_distribuicao_socios AS
+SELECT s.qualificacao_socio, COUNT(*) AS qtd, d.descricao
+FROM socios s
+LEFT JOIN dim_qualificacao d ON d.codigo = s.qualificacao_socio
+GROUP BY s.qualificacao_socio, d.descricao;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_distribuicao_socios_key
+ON analytics.mv_distribuicao_socios (qualificacao_socio) NULLS NOT DISTINCT;
 
 CREATE OR REPLACE VIEW analytics.v_distribuicao_socios AS
-SELECT qualificacao_socio, COUNT(*) AS qtd
-FROM public.socios
-GROUP BY qualificacao_socio
-ORDER BY COUNT(*) DESC;
+SELECT qualificacao_socio, qtd, descricao
+FROM analytics.mv_distribuicao_socios
+ORDER BY qtd DESC;
+
+-- dim_cnae.chave é o valor gravado em cnae_fiscal_principal (id no esquema tipado, código no texto)
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_distribuicao_cnae AS
+SELECT d.codigo AS cnae_fiscal_principal, COUNT(*) AS qtd, d.descricao
+FROM estabelecimentos e
+LEFT JOIN dim_cnae d ON d.chave = e.cnae_fiscal_principal
+GROUP BY d.codigo, d.descricao;
+
+CREATE UNIQUE INDEX IF NOT EXISTS mv_distribuicao_cnae_key
+ON analytics.mv_distribuicao_cnae (cnae_fiscal_principal) NULLS NOT DISTINCT;
+
+CREATE OR REPLACE VIEW analytics.v_distribuicao_cnae AS
+SELECT cnae_fiscal_principal, qtd, descricao
+FROM analytics.mv_distribuicao_cnae
+ORDER BY qtd DESC;
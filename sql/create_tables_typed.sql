@@ -0,0 +1,73 @@
+-- Variante tipada do esquema (SCHEMA_VARIANT=typed)
+-- Mesmas tabelas e ordem de colunas de create_tables.sql, com códigos inteiros,
+-- capital_social numérico e datas reais. Carregada via COPY ... FORMAT BINARY
+-- a partir dos arquivos .pgcopy gerados pela etapa 03.
+-- Datas '00000000' (ou inválidas) viram NULL; códigos perdem os zeros à esquerda
+-- (use lpad(cnpj_basico::text, 8, '0') para exibir). Os códigos de domínio são
+-- chaves smallint das tabelas dim_* (src/ingest/domains.py); o CNAE principal
+-- guarda o id de dim_cnae, não o código; os secundários, um array desses ids.
+
+-- Drop tables para reset total
+DROP TABLE IF EXISTS empresas;
+DROP TABLE IF EXISTS estabelecimentos;
+DROP TABLE IF EXISTS socios;
+
+-- 1. TABELA EMPRESAS
+CREATE TABLE empresas (
+    cnpj_basico INTEGER NOT NULL,
+    razao_social VARCHAR(255),
+    natureza_juridica SMALLINT,
+    qualificacao_responsavel SMALLINT,
+    capital_social NUMERIC(18,2),
+    porte_empresa SMALLINT,
+    ente_federativo_responsavel VARCHAR(255)
+);
+
+-- 2. TABELA ESTABELECIMENTOS
+CREATE TABLE estabelecimentos (
+    cnpj_basico INTEGER NOT NULL,
+    cnpj_ordem SMALLINT NOT NULL,
+    cnpj_dv SMALLINT NOT NULL,
+    identificador_matriz_filial SMALLINT,
+    nome_fantasia VARCHAR(255),
+    situacao_cadastral SMALLINT,
+    data_situacao_cadastral DATE,
+    motivo_situacao_cadastral SMALLINT,
+    nome_cidade_exterior VARCHAR(255),
+    pais SMALLINT,
+    data_inicio_atividade DATE,
+    cnae_fiscal_principal SMALLINT, -- dim_cnae.id (chave substituta)
+    cnae_fiscal_secundaria SMALLINT[], -- ids de dim_cnae (índice GIN criado após a carga)
+    tipo_logradouro VARCHAR(255),
+    logradouro VARCHAR(255),
+    numero VARCHAR(255),
+    complemento VARCHAR(255),
+    bairro VARCHAR(255),
+    cep CHAR(8), -- Texto: zeros à esquerda são significativos
+    uf CHAR(2),
+    municipio SMALLINT,
+    ddd_1 VARCHAR(4),
+    telefone_1 VARCHAR(20),
+    ddd_2 VARCHAR(4),
+    telefone_2 VARCHAR(20),
+    ddd_fax VARCHAR(4),
+    fax VARCHAR(20),
+    correio_eletronico VARCHAR(255),
+    situacao_especial VARCHAR(255),
+    data_situacao_especial DATE
+);
+
+-- 3. TABELA SOCIOS
+CREATE TABLE socios (
+    cnpj_basico INTEGER NOT NULL,
+    identificador_socio SMALLINT,
+    nome_socio_razao_social VARCHAR(255),
+    cpf_cnpj_socio VARCHAR(14),
+    qualificacao_socio SMALLINT,
+    data_entrada_sociedade DATE,
+    pais SMALLINT,
+    representante_legal VARCHAR(11),
+    nome_representante VARCHAR(255),
+    qualificacao_representante_legal SMALLINT,
+    faixa_etaria SMALLINT
+);
@@ -1,6 +1,10 @@
 import logging
+import re
+import sys
+import time
 from sqlalchemy import create_engine, text
-from src.config import settings
+from src.config import settings, pipeline_settings
+from src.ingest import bulk, load_manifest, metrics, release_schema
 from src.paths import PROJECT_ROOT
 from src.runners.bootstrap import bootstrap
 
@@ -12,6 +16,86 @@ logger = logging.getLogger("PromoteAnalytics")
 
 SQL_FILE = PROJECT_ROOT / "sql" / "analytics" / "10_views_mvp.sql"
 
+REFRESH_DDL = """
+CREATE TABLE IF NOT EXISTS analytics.matview_refreshes (
+    release TEXT NOT NULL,
+    matview TEXT NOT NULL,
+    concurrent BOOLEAN NOT NULL,
+    rows BIGINT NOT NULL,
+    seconds DOUBLE PRECISION NOT NULL,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+def list_matviews(conn) -> list[str]:
+    return conn.execute(text(
+        "SELECT format('%I.%I', schemaname, matviewname) FROM pg_matviews WHERE schemaname = 'analytics' ORDER BY 1"
+    )).scalars().all()
+
+MATVIEW_STATEMENT = re.compile(r"CREATE\s+MATERIALIZED\s+VIEW\s+IF\s+NOT\s+EXISTS\s+(\S+)\s+AS\s+(.+)", re.IGNORECASE | re.DOTALL)
+
+def drop_changed_matviews(conn, commands: list[str]) -> dict[str, list[bulk.DependentView]]:
+    """
+    IF NOT EXISTS não altera uma materialized view existente: compara a
+    definição atual (pg_get_viewdef) com a do arquivo, deparseada por uma view
+    temporária no mesmo search_path, e remove as que mudaram (com as views que
+    as leem) para que o arquivo as recrie. Retorna as removidas, com as views
+    dependentes de cada uma.
+    """
+    dropped = {}
+    for cmd in commands:
+        match = MATVIEW_STATEMENT.search(cmd)
+        if not match:
+            continue
+        name, query = match.groups()
+        if not conn.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": name}).scalar():
+            continue
+        conn.exec_driver_sql(f"CREATE TEMPORARY VIEW mv_definition AS {query}")
+        wanted = conn.execute(text("SELECT pg_get_viewdef(CAST('mv_definition' AS regclass))")).scalar()
+        conn.execute(text("DROP VIEW mv_definition"))
+        current = conn.execute(text("SELECT pg_get_viewdef(CAST(:n AS regclass))"), {"n": name}).scalar()
+        if wanted == current:
+            continue
+        dependents = bulk.dependent_views(conn, name)
+        bulk.drop_views(conn, dependents)
+        conn.execute(text(f"DROP MATERIALIZED VIEW {name}"))
+        logger.warning(f"⚠️ {name}: definição mudou; recriando (dependentes: {len(dependents)}).")
+        dropped[name] = dependents
+    return dropped
+
+def refresh_matviews(engine, names: list[str]) -> list[dict]:
+    """
+    Atualiza as materialized views com os dados da carga, uma transação por
+    view. CONCURRENTLY: os painéis seguem lendo a versão anterior até o fim
+    (exige o índice único e a view já populada; senão, REFRESH comum).
+    """
+    results = []
+    for name in names:
+        start = time.time()
+        with engine.begin() as conn:
+            populated = conn.execute(text("SELECT relispopulated FROM pg_class WHERE oid = CAST(:n AS regclass)"), {"n": name}).scalar()
+            unique = conn.execute(text(
+                "SELECT EXISTS (SELECT 1 FROM pg_index WHERE indrelid = CAST(:n AS regclass) AND indisunique)"
+            ), {"n": name}).scalar()
+            concurrent = bool(populated and unique)
+            conn.execute(text(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrent else ''}{name}"))
+            rows = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+        seconds = time.time() - start
+        logger.info(f"♻️  {name}: {rows} linhas em {seconds:.2f}s{' (CONCURRENTLY)' if concurrent else ''}.")
+        results.append({"matview": name, "concurrent": concurrent, "rows": rows, "seconds": seconds})
+
+    if results:
+        with engine.begin() as conn:
+            conn.execute(text(REFRESH_DDL))
+            conn.execute(text("""
+                INSERT INTO analytics.matview_refreshes (release, matview, concurrent, rows, seconds)
+                VALUES (:release, :matview, :concurrent, :rows, :seconds)
+            """), [{"release": load_manifest.current_release(), **r} for r in results])
+        metrics.record("analytics", [
+            {"file": r["matview"], "table": r["matview"], "rows": r["rows"], "seconds": r["seconds"]} for r in results
+        ])
+    return results
+
 def main():
     bootstrap()
     
@@ -20,42 +104,60 @@ def main():
     
     # 1. Gate: Validação de Dados (Exemplo simplificado)
     # Em produção, aqui verificaríamos os resultados do Great Expectations
+    # As views leem as tabelas sem schema: as de `current` (release publicada) ou as de public
+    source = release_schema.CURRENT_SCHEMA if pipeline_settings.release_schemas else "public"
     with engine.connect() as conn:
-        logger.info("🛡️  Executando Gate de Qualidade (Sanity Check)...")
-        count = conn.execute(text("SELECT COUNT(*) FROM public.empresas")).scalar()
+        conn.execute(text(f"SET search_path TO {source}"))
+        logger.info(f"🛡️  Executando Gate de Qualidade (Sanity Check) em {source}...")
+        # EXISTS em vez de COUNT(*): não percorre a tabela inteira
+        has_rows = conn.execute(text("SELECT EXISTS (SELECT 1 FROM empresas)")).scalar()
         
-        if count == 0:
+        if not has_rows:
             logger.error("❌ Gate FALHOU: Tabela 'empresas' está vazia.")
-            return
-        logger.info(f"✅ Gate APROVADO: {count} empresas encontradas.")
+            sys.exit(1)
+        logger.info("✅ Gate APROVADO: tabela 'empresas' com dados.")
 
         # 2. Executar Views
         if not SQL_FILE.exists():
             logger.error(f"❌ Arquivo SQL não encontrado: {SQL_FILE}")
-            return
+            sys.exit(1)
 
         logger.info(f"📂 Aplicando views de: {SQL_FILE.name}")
         with open(SQL_FILE, "r", encoding="utf-8") as f:
             sql_content = f.read()
             
         try:
+            # Materialized views novas nascem populadas; as que já existiam são atualizadas depois
+            existing = list_matviews(conn)
+
             # Executa comandos separados por ;
-            commands = sql_content.split(';')
+            commands = [cmd for cmd in sql_content.split(';') if cmd.strip()]
+            # Definição alterada no arquivo: a mv_* é removida aqui e recriada (populada) abaixo
+            dropped = drop_changed_matviews(conn, commands)
             for cmd in commands:
-                if cmd.strip():
-                    conn.execute(text(cmd))
+                conn.execute(text(cmd))
+            # Dependentes que o arquivo não recria voltam sobre a nova definição
+            pending = {}
+            for view in (v for views in dropped.values() for v in views):
+                if not conn.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": view.name}).scalar():
+                    pending.setdefault(view.name, view)
+            bulk.create_views(conn, list(pending.values()))
             
             conn.commit() # Commit explícito para DDL
             
             logger.info("✅ Views criadas/atualizadas com sucesso!")
+
+            # 3. Refresh das agregações com os dados da carga (registrado em analytics.matview_refreshes)
+            refresh_matviews(engine, [name for name in existing if name not in dropped])
             
-            # 3. Validação pós-promoção (Smoke Test)
+            # 4. Validação pós-promoção (Smoke Test)
             logger.info("🔎 Validando view 'v_distribuicao_natureza'...")
             res = conn.execute(text("SELECT COUNT(*) FROM analytics.v_distribuicao_natureza")).scalar()
             logger.info(f"✅ View acessível. Linhas retornadas: {res}")
 
         except Exception as e:
             logger.error(f"❌ Erro ao criar views: {e}")
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
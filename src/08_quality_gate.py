@@ -4,11 +4,17 @@ import sys
 import webbrowser
 from pathlib import Path
 
+from src.ingest import release_schema
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
 logger = logging.getLogger("QualityGate")
 
 def main():
     logger.info("🛡️  Iniciando Quality Gate (Great Expectations)...")
+    # RELEASE_SCHEMAS: valida a release recém-carregada, antes da troca (etapa 09)
+    schema = release_schema.use_load_schema()
+    if schema:
+        logger.info(f"🗂️  Validando o schema {schema}.")
     
     context = gx.get_context(project_root_dir=".")
     checkpoint_name = "checkpoint_full_validation"
@@ -0,0 +1,57 @@
+import argparse
+import logging
+import sys
+from sqlalchemy import create_engine, text
+from src.config import settings, pipeline_settings
+from src.ingest import load_manifest, release_schema
+from src.runners.bootstrap import bootstrap
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("ReleaseCutover")
+
+def main():
+    """
+    Etapa 09 (RELEASE_SCHEMAS=1): publica a release carregada (e aprovada pelo
+    quality gate) apontando o schema `current` para `release_<release>` numa
+    única transação, e remove as releases além da retenção (RELEASE_RETAIN).
+    Também faz o rollback para a release anterior e lista as retidas.
+    """
+    bootstrap()
+    parser = argparse.ArgumentParser(description="Troca atômica da release publicada (schema current)")
+    parser.add_argument("--release", help="Release a publicar (padrão: a da carga, PIPELINE_RELEASE ou manifesto)")
+    parser.add_argument("--rollback", action="store_true", help="Volta current para a release publicada antes da atual")
+    parser.add_argument("--list", action="store_true", help="Lista as releases retidas e a publicada")
+    parser.add_argument("--retain", type=int, default=pipeline_settings.release_retain, help="Releases mantidas, incluindo a publicada")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.sqlalchemy_url)
+
+    if args.list:
+        with engine.connect() as conn:
+            active = release_schema.active_schema(conn)
+            for schema in release_schema.release_schemas(conn):
+                logger.info(f"{'👉' if schema == active else '  '} {schema}")
+        return
+
+    if args.rollback:
+        if not release_schema.rollback(engine):
+            sys.exit(1)
+        return
+
+    schema = release_schema.schema_for(args.release or load_manifest.current_release())
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regnamespace(:s) IS NULL"), {"s": schema}).scalar():
+            logger.error(f"❌ Schema {schema} não existe: carregue a release com RELEASE_SCHEMAS=1.")
+            sys.exit(1)
+    try:
+        release_schema.cutover(engine, schema)
+    except Exception as e:
+        logger.error(f"❌ Troca para {schema} falhou (leitores seguem na release anterior): {e}")
+        sys.exit(1)
+    release_schema.retain(engine, max(1, args.retain))
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,38 @@ class PipelineConfig:
     sample_files_per_type: int = int(os.getenv("SAMPLE_FILES_PER_TYPE", "1"))
     sample_seed: int = int(os.getenv("SAMPLE_SEED", "42"))
     sample_force: bool = os.getenv("SAMPLE_FORCE", "0") == "1"
+    sample_strategy: str = os.getenv("SAMPLE_STRATEGY", "head").lower()  # head | reservoir | hash
+    sample_hash_rate: float = float(os.getenv("SAMPLE_HASH_RATE", "0.002"))
+    download_workers: int = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+    download_segments: int = int(os.getenv("DOWNLOAD_SEGMENTS", "4"))
+    download_verify: str = os.getenv("DOWNLOAD_VERIFY", "fast")  # fast | full
+    delta: bool = os.getenv("PIPELINE_DELTA", "0") == "1"
+    stream_extract: bool = os.getenv("STREAM_EXTRACT", "0") == "1"
+    stream_keep_archive: bool = os.getenv("STREAM_KEEP_ARCHIVE", "0") == "1"
+    extract_workers: int = int(os.getenv("EXTRACT_WORKERS", "1"))
+    extract_engine: str = os.getenv("EXTRACT_ENGINE", "python").lower()  # python | arrow
+    processed_format: str = os.getenv("PROCESSED_FORMAT", "csv").lower()  # csv | parquet
+    schema_variant: str = os.getenv("SCHEMA_VARIANT", "text").lower()  # text | typed
+    load_workers: int = int(os.getenv("LOAD_WORKERS", "1"))
+    load_split_mb: int = int(os.getenv("LOAD_SPLIT_MB", "0"))  # 0 = não divide arquivos
+    load_chunk_retries: int = int(os.getenv("LOAD_CHUNK_RETRIES", "2"))
+    load_batch_rows: int = int(os.getenv("LOAD_BATCH_ROWS", "1000000"))  # 0 = um COPY por arquivo
+    bulk_load: bool = os.getenv("BULK_LOAD", "0") == "1"
+    merge_refresh: bool = os.getenv("MERGE_REFRESH", "0") == "1"
+    bulk_maintenance_work_mem: str = os.getenv("BULK_MAINTENANCE_WORK_MEM", "1GB")
+    sorted_layout: bool = os.getenv("SORTED_LAYOUT", "0") == "1"
+    partition_strategy: str = os.getenv("PARTITION_STRATEGY", "none").lower()  # none | uf | hash
+    partition_count: int = int(os.getenv("PARTITION_COUNT", "8"))  # partições HASH
+    full_direct_copy: bool = os.getenv("FULL_DIRECT_COPY", "0") == "1"
+    index_workers: int = int(os.getenv("INDEX_WORKERS", "3"))  # conexões (tabelas) em paralelo na etapa 05
+    index_parallel_workers: int = int(os.getenv("INDEX_PARALLEL_WORKERS", "4"))  # max_parallel_maintenance_workers
+    release_schemas: bool = os.getenv("RELEASE_SCHEMAS", "0") == "1"  # cada release no seu schema + troca atômica
+    release_retain: int = int(os.getenv("RELEASE_RETAIN", "2"))  # releases mantidas para rollback (inclui a ativa)
+
+    def __post_init__(self):
+        # Combinações inválidas são recusadas aqui, para a CLI e para quem define as variáveis direto
+        if self.full_direct_copy and self.schema_variant == "typed":
+            raise ValueError("FULL_DIRECT_COPY não se combina com SCHEMA_VARIANT=typed (a conversão de tipos é feita na etapa 03).")
 
 settings = DBConfig()
 pipeline_settings = PipelineConfig()
\ No newline at end of file
@@ -1,10 +1,12 @@
 import logging
-import os
-import re
+import sys
 import requests
-from pathlib import Path
-from tqdm import tqdm
 from src.paths import RAW_DIR
+from src.ingest.discovery import BASE_URL, discover_months, list_folders, list_release_files, select_sample_files
+from src.ingest.downloader import download_many, probe
+from src.ingest.download_manifest import DownloadManifest, verify_local
+from src.ingest.http_session import get_session
+from src.ingest.release_diff import carry_over_unchanged, compute_delta, previous_release
 from src.runners.bootstrap import bootstrap
 from src.config import pipeline_settings
 
@@ -15,83 +17,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj/"
-
 def get_available_folders(base_url: str) -> list:
     """Retorna lista de pastas de data (YYYY-MM) ordenadas."""
     logger.info(f"🔍 Mapeando versões disponíveis em: {base_url}")
-    try:
-        response = requests.get(base_url, timeout=10)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"❌ Erro de conexão: {e}")
-        return []
-
-    # Regex para capturar pastas no formato YYYY-MM
-    folders = re.findall(r'href="(\d{4}-\d{2})/"', response.text)
-    return sorted(list(set(folders)))
+    return list_folders(base_url)
 
 def get_files_from_folder(folder_url: str) -> list:
-    """Retorna lista de arquivos .zip dentro de uma pasta."""
+    """Retorna lista de arquivos .zip de interesse dentro de uma pasta."""
     logger.info(f"📡 Inspecionando: {folder_url}")
-    try:
-        response = requests.get(folder_url, timeout=10)
-        response.raise_for_status()
-    except requests.exceptions.RequestException:
-        return []
-
-    # Regex mais robusto para encontrar .zip (aceita aspas simples ou duplas)
-    # Ignora maiúsculas/minúsculas
-    files = re.findall(r'href=["\'](.*?\.zip)["\']', response.text, re.IGNORECASE)
-    
-    # Filtra apenas os arquivos de interesse
-    targets = [
-        f for f in files
-        if f.startswith(("Empresas", "Estabelecimentos", "Socios"))
-    ]
-    return list(set(targets)) # Remove duplicatas se houver
-
-def download_file(url: str, output_path: Path):
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    total_size = int(response.headers.get("content-length", 0))
-
-    with open(output_path, "wb") as file, tqdm(
-        desc=output_path.name,
-        total=total_size,
-        unit="B",
-        unit_scale=True,
-        unit_divisor=1024,
-    ) as bar:
-        for chunk in response.iter_content(chunk_size=1024):
-            if chunk:
-                file.write(chunk)
-                bar.update(len(chunk))    
+    return list_release_files(folder_url)
 
 def main():
     bootstrap()
+    if pipeline_settings.stream_extract:
+        logger.info("🌊 MODO STREAMING: o download acontece junto com a extração (etapa 03). Pulando.")
+        return
+
     folders = get_available_folders(BASE_URL)
     if not folders:
         logger.error("❌ Nenhuma pasta de dados encontrada.")
         return
 
     # Tenta do mais recente para o mais antigo (fallback)
-    # Pega os 3 últimos meses para garantir
+    # Pega os 3 últimos meses para garantir; as listagens são consultadas em paralelo
     candidate_folders = folders[-3:] 
     candidate_folders.reverse() # Começa do mais atual
+    listings = discover_months(candidate_folders, BASE_URL)
 
     selected_files = []
     target_url = ""
+    selected_month = ""
 
     for month_folder in candidate_folders:
-        target_url = BASE_URL + month_folder + "/"
-        logger.info(f"Tentando mês: {month_folder}...")
-        
-        found_files = get_files_from_folder(target_url)
+        found_files = listings.get(month_folder, [])
         
         if len(found_files) > 0:
             logger.info(f"✅ Sucesso! Encontrados {len(found_files)} arquivos em {month_folder}")
             selected_files = found_files
+            selected_month = month_folder
+            target_url = BASE_URL + month_folder + "/"
             break
         else:
             logger.warning(f"⚠️  Pasta {month_folder} parece vazia ou incompleta. Tentando anterior...")
@@ -104,42 +68,67 @@ def main():
     if pipeline_settings.mode == "sample":
         logger.info(f"🧪 MODO SAMPLE ATIVADO: Baixando apenas {pipeline_settings.sample_files_per_type} arquivos por tipo.")
         
-        empresas = [f for f in selected_files if "Empresas" in f]
-        estabelecimentos = [f for f in selected_files if "Estabelecimentos" in f]
-        socios = [f for f in selected_files if "Socios" in f]
-        
-        # Pega os primeiros K de cada (determinístico pois a lista vem ordenada/estável do site)
-        k = pipeline_settings.sample_files_per_type
-        
-        # Ordena para garantir determinismo absoluto
-        empresas.sort()
-        estabelecimentos.sort()
-        socios.sort()
-        
-        sample_selection = []
-        sample_selection.extend(empresas[:k])
-        sample_selection.extend(estabelecimentos[:k])
-        sample_selection.extend(socios[:k])
+        # Pega os primeiros K de cada tipo, em ordem alfabética (determinístico)
+        sample_selection = select_sample_files(selected_files, pipeline_settings.sample_files_per_type)
         
         logger.info(f"📋 Arquivos selecionados para amostra: {sample_selection}")
         selected_files = sample_selection
 
-    # Inicia Download
-    logger.info(f"🚀 Iniciando download de {len(selected_files)} arquivos...")
-    for filename in selected_files:
-        file_path = RAW_DIR / filename
-        
-        if file_path.exists():
-            logger.info(f"⏭️  {filename} já existe. Pulando.")
-            continue
+    # Confere o que já existe contra o manifesto da release (tamanho, ETag, checksum)
+    manifest = DownloadManifest.load(selected_month)
+    prev_month = previous_release(selected_month)
+    prev_manifest = DownloadManifest.load(prev_month) if prev_month else None
+    session = get_session()
+    full_verify = pipeline_settings.download_verify == "full"
 
+    jobs = []
+    for filename in sorted(selected_files):
+        file_path = RAW_DIR / filename
         file_url = target_url + filename
-        logger.info(f"⬇️  Baixando {filename}...")
+
         try:
-            download_file(file_url, file_path)
-        except Exception as e:
-            logger.error(f"❌ Erro em {filename}: {e}")
-            if file_path.exists(): os.remove(file_path)
+            remote = probe(session, file_url)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ Falha ao consultar {filename}: {e}")
+            continue
+
+        if carry_over_unchanged(manifest, prev_manifest, file_path, remote):
+            logger.info(f"⏭️  {filename} inalterado desde {prev_month}. Pulando.")
+            continue
+
+        valid, reason = verify_local(manifest, file_path, remote, full=full_verify)
+        if valid:
+            logger.info(f"⏭️  {filename} já existe ({reason}). Pulando.")
+            continue
+
+        if file_path.exists():
+            logger.warning(f"⚠️  {filename} inválido ({reason}). Baixando novamente.")
+        jobs.append((file_url, file_path))
+
+    logger.info(
+        f"🚀 Iniciando download de {len(jobs)} arquivos "
+        f"({pipeline_settings.download_workers} simultâneos, {pipeline_settings.download_segments} segmentos cada)..."
+    )
+    results = download_many(
+        jobs,
+        workers=pipeline_settings.download_workers,
+        segments=pipeline_settings.download_segments,
+        session=session,
+        on_complete=manifest.record,
+    )
+
+    failed = [r for r in results if not r.ok]
+    if failed:
+        logger.error(f"❌ {len(failed)} arquivo(s) falharam: {[r.filename for r in failed]}")
+
+    # Delta contra a release anterior (consumido pelas etapas 03/04 no modo delta)
+    delta = compute_delta(manifest, prev_manifest, listed=selected_files)
+    delta.save()
+    logger.info(f"🧮 Delta {selected_month} vs {prev_month or '-'}: {delta.summary()}")
+    if not delta.complete() and pipeline_settings.delta and pipeline_settings.mode == "full":
+        # Falha de rede não é remoção: sem todos os arquivos, o delta não equivale à carga completa
+        logger.error(f"❌ Delta incompleto, arquivos sem download: {delta.unknown()}. Abortando.")
+        sys.exit(1)
 
     logger.info("🎉 Processo finalizado.")
 
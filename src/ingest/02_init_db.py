@@ -1,19 +1,25 @@
 import logging
+import sys
 import time
 from pathlib import Path
 from sqlalchemy import create_engine, text
-from src.config import settings
+from src.config import settings, pipeline_settings
 from src.paths import PROJECT_ROOT
 from src.runners.bootstrap import bootstrap
+from src.ingest import bulk, domains, load_manifest, merge_refresh, partitioning, release_schema
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-SQL_FILE = PROJECT_ROOT / "sql" / "create_tables.sql"
+SQL_FILE = PROJECT_ROOT / "sql" / (
+    "create_tables_typed.sql" if pipeline_settings.schema_variant == "typed" else "create_tables.sql"
+)
 
 def main():
     bootstrap()
+    # Antes de qualquer conexão: com RELEASE_SCHEMAS, tudo abaixo acontece no schema da release
+    schema = release_schema.use_load_schema()
     logger.info("🔌 Conectando ao banco de dados...")
     engine = create_engine(settings.sqlalchemy_url)
     
@@ -28,12 +34,61 @@ def main():
     logger.info("🚀 Executando criação de tabelas...")
     try:
         with engine.connect() as conn:
+            if pipeline_settings.delta and pipeline_settings.mode == "full":
+                exists = conn.execute(text("SELECT to_regclass('empresas') IS NOT NULL")).scalar()
+                if exists:
+                    # Modo delta: as tabelas são atualizadas in-place pela etapa 04
+                    logger.info("🧮 MODO DELTA: tabelas existentes preservadas (sem DROP).")
+                    return
+
+            if pipeline_settings.release_schemas and not release_schema.enabled():
+                logger.warning("⚠️ RELEASE_SCHEMAS ignorado no modo delta.")
+
+            if schema:
+                with conn.begin():
+                    if schema == release_schema.active_schema(conn):
+                        # Recarregar a release publicada a deixaria vazia para os leitores
+                        logger.error(f"❌ {schema} é a release publicada em '{release_schema.CURRENT_SCHEMA}': recarga recusada.")
+                        sys.exit(1)
+                    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+                logger.info(f"🗂️  RELEASE_SCHEMAS: carga no schema {schema} (publicado pela etapa 09).")
+
+            if pipeline_settings.merge_refresh and not merge_refresh.enabled():
+                logger.warning("⚠️ MERGE_REFRESH ignorado no modo delta.")
+
+            if bulk.enabled() or merge_refresh.enabled():
+                # Modos bulk e merge: produção continua no ar; a carga vai para stagings UNLOGGED
+                with conn.begin():
+                    exists = conn.execute(text("SELECT to_regclass('empresas') IS NOT NULL")).scalar()
+                    if not exists:
+                        conn.execute(text(sql_content))
+                        partitioning.apply(conn, bulk.TABLES)
+                        logger.info("✅ Tabelas de produção criadas (primeira carga).")
+                    domains.create_tables(conn)
+                    bulk.create_staging(conn)
+                    cursor = conn.connection.cursor()
+                    load_manifest.ensure_table(cursor)
+                    # A próxima troca (ou merge) substitui o conteúdo da produção: tudo deve ser recarregado
+                    load_manifest.drop_tables(cursor, [*bulk.TABLES, *(bulk.staging_name(t) for t in bulk.TABLES)])
+                if merge_refresh.enabled():
+                    logger.info("🔀 MODO MERGE: produção preservada; as mudanças da release são aplicadas ao fim da etapa 04.")
+                else:
+                    logger.info("🧱 MODO BULK: stagings prontas; a troca acontece ao fim da etapa 04.")
+                return
+
             # SQLAlchemy text() para execucao
             # Como sao multiplos statements, precisamos garantir o commit
             # O execute do sqlalchemy com string bruta pode falhar se forem multiplos comandos
             # sem transação explícita
             with conn.begin():
                 conn.execute(text(sql_content))
+                partitioning.apply(conn, bulk.TABLES)
+                # Domínios recriados junto: o tipo dos códigos acompanha SCHEMA_VARIANT
+                domains.create_tables(conn, replace=True)
+                # Tabelas recriadas vazias: cargas registradas deixam de valer
+                cursor = conn.connection.cursor()
+                load_manifest.ensure_table(cursor)
+                load_manifest.drop_tables(cursor, bulk.TABLES)
             
             logger.info("✅ Tabelas criadas com sucesso!")
     
@@ -1,13 +1,34 @@
 import zipfile
 import logging
+import contextlib
 import csv
+import hashlib
+import io
+import json
 import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+import numpy as np
 from tqdm import tqdm
 
 from src.paths import RAW_DIR, PROCESSED_DIR, SAMPLE_DIR
 from src.runners.bootstrap import bootstrap
 from src.config import pipeline_settings
+from src.ingest.discovery import BASE_URL, latest_release, select_sample_files
+from src.ingest.download_manifest import DownloadManifest
+from src.ingest.downloader import CHUNK_SIZE, TIMEOUT, DownloadResult, part_path_for
+from src.ingest.http_session import get_session
+from src.ingest.key_index import KeyIndex
+from src.ingest import domains, load_manifest, metrics
+from src.ingest.layout import DOMAIN_PREFIXES
+from src.ingest.release_diff import ReleaseDelta
+from src.ingest.arrow_engine import sample_member_arrow
+from src.ingest.sampling import Reservoir, hash_mask, member_seed
+from src.ingest.sinks import open_sink, output_path, read_key_batches, record_release_outputs
+from src.ingest.stream_unzip import ChunkReader, StreamUnzipError, iter_members
 
 # Configuração de logging padronizada
 logging.basicConfig(
@@ -16,22 +37,174 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Conjunto global para armazenar chaves de empresas (CNPJ Básico)
-# Usado apenas no modo sample para garantir integridade referencial
-EMPRESA_KEYS = set()
+# Índice global das chaves de empresas (CNPJ Básico), um bitmap de ~12 MB
+# Usado para garantir integridade referencial de Estabelecimentos/Socios
+EMPRESA_KEYS = KeyIndex()
 
-def extract_and_sample(zip_path: Path, output_dir: Path, is_empresa: bool = False):
+# Índice persistido ao lado das saídas: re-execuções reabrem via memory-map
+KEY_INDEX_NAME = "empresa_keys.npy"
+# Linhas por lote nas operações vetorizadas sobre o índice
+KEY_BATCH_ROWS = 50_000
+
+# Registro dos membros extraídos no modo streaming (idempotência sem o zip em disco)
+STREAM_INDEX_NAME = "stream_index.json"
+
+def _iter_key_batches(reader, size: int = KEY_BATCH_ROWS):
+    """Agrupa a coluna cnpj_basico de um csv.reader em listas de até `size` chaves."""
+    batch = []
+    for row in reader:
+        if row:
+            batch.append(row[0])
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def load_keys_from_output(final_path: Path):
+    """Recarrega EMPRESA_KEYS a partir de uma amostra de Empresas já gerada."""
+    logger.info(f"♻️  Carregando chaves de empresa existentes de {final_path.name}...")
+    for keys in read_key_batches(final_path, KEY_BATCH_ROWS):
+        EMPRESA_KEYS.add_many(keys)
+    logger.info(f"📊 Chaves carregadas: {len(EMPRESA_KEYS)}")
+
+def sample_member(binary_stream, final_path: Path, is_empresa: bool) -> dict:
+    """
+    Lê um membro (stream binário latin1) e grava a amostra filtrada em final_path
+    (CSV, Parquet ou .pgcopy, conforme a extensão; ver src/ingest/sinks.py).
+    Se is_empresa=True, popula o índice EMPRESA_KEYS.
+    Se is_empresa=False, filtra usando EMPRESA_KEYS.
+    As linhas são processadas em lotes para que inserção e filtro no índice
+    sejam vetorizados; o resultado é idêntico ao processamento linha a linha.
+    No modo sample, a seleção segue SAMPLE_STRATEGY (ver src/ingest/sampling.py).
+    No modo full, todas as linhas são gravadas, sem limite nem filtro por chave
+    (o mesmo resultado do COPY direto, órfãos inclusos).
+    Com EXTRACT_ENGINE=arrow, delega ao motor vetorizado (src/ingest/arrow_engine.py).
+    Retorna o resumo do arquivo (bytes e linhas lidos, linhas escritas/descartadas,
+    tempo total e tempo gasto gravando a saída).
+    """
+    # Conta os bytes (descompactados) efetivamente lidos do membro
+    counter = metrics.CountingReader(binary_stream)
+    binary_stream = io.BufferedReader(counter, buffer_size=CHUNK_SIZE)
+    if pipeline_settings.extract_engine == "arrow":
+        summary = sample_member_arrow(binary_stream, final_path, is_empresa, EMPRESA_KEYS)
+        return {**summary, "bytes": counter.bytes_read, "finished_at": time.time()}
+
+    start_time = time.time()
+    limit = pipeline_settings.sample_rows
+    strategy = pipeline_settings.sample_strategy if pipeline_settings.mode == "sample" else "head"
+    seed = member_seed(pipeline_settings.sample_seed, final_path.name)
+    # Wrapper para ler como texto (latin1 é o padrão da RFB)
+    text_stream = io.TextIOWrapper(binary_stream, encoding="latin1", errors="replace")
+    
+    with open_sink(final_path) as writer:
+        reader = csv.reader(text_stream, delimiter=";")
+        
+        count = 0
+        skipped = 0
+        read = 0
+        reservoir = Reservoir(limit, seed) if strategy == "reservoir" else None
+        
+        def flush_head(batch: list) -> bool:
+            """Escreve o lote; retorna True quando o limite de linhas foi atingido."""
+            nonlocal count, skipped
+            keys = [row[0] for row in batch]
+            
+            if is_empresa:
+                # Modo Empresa: Adiciona ao índice e escreve
+                rows = batch[:limit - count]
+                EMPRESA_KEYS.add_many(keys[:len(rows)])
+            else:
+                # Modo Satélite (Estab/Socio): Filtra pelo índice
+                kept = np.flatnonzero(EMPRESA_KEYS.contains_many(keys))
+                if count + len(kept) >= limit:
+                    kept = kept[:limit - count]
+                    # Descartes contam só até a linha que completou o limite
+                    skipped += (int(kept[-1]) + 1 - len(kept)) if len(kept) else len(batch)
+                else:
+                    skipped += len(batch) - len(kept)
+                rows = [batch[i] for i in kept]
+            
+            writer.write_rows(rows)
+            count += len(rows)
+            # Limite de linhas (apenas se escreveu)
+            return count >= limit
+        
+        def flush_hash(batch: list) -> bool:
+            """Mantém as linhas cujas empresas caem na fração de hash (sem limite de linhas)."""
+            nonlocal count, skipped
+            keys = [row[0] for row in batch]
+            kept = np.flatnonzero(hash_mask(keys, pipeline_settings.sample_seed, pipeline_settings.sample_hash_rate))
+            rows = [batch[i] for i in kept]
+            if is_empresa:
+                EMPRESA_KEYS.add_many([row[0] for row in rows])
+            writer.write_rows(rows)
+            count += len(rows)
+            skipped += len(batch) - len(rows)
+            return False
+        
+        def flush_reservoir(batch: list) -> bool:
+            """Oferece ao reservatório as linhas elegíveis; a escrita fica para o fim da passada."""
+            nonlocal skipped
+            if not is_empresa:
+                kept = EMPRESA_KEYS.contains_many([row[0] for row in batch])
+                skipped += len(batch) - int(kept.sum())
+                batch = [row for row, keep in zip(batch, kept) if keep]
+            reservoir.offer(batch)
+            return False
+        
+        def flush_all(batch: list) -> bool:
+            """Modo full: o arquivo inteiro, sem limite nem filtro por chave."""
+            nonlocal count
+            if is_empresa:
+                EMPRESA_KEYS.add_many([row[0] for row in batch])
+            writer.write_rows(batch)
+            count += len(batch)
+            return False
+        
+        if pipeline_settings.mode == "full":
+            flush = flush_all
+        else:
+            flush = {"hash": flush_hash, "reservoir": flush_reservoir}.get(strategy, flush_head)
+        
+        batch = []
+        for row in reader:
+            if not row: continue
+            read += 1
+            batch.append(row)
+            if len(batch) >= KEY_BATCH_ROWS:
+                if flush(batch):
+                    batch = []
+                    break
+                batch = []
+        if batch:
+            flush(batch)
+        
+        if reservoir is not None:
+            rows = reservoir.result()
+            if is_empresa:
+                EMPRESA_KEYS.add_many([row[0] for row in rows])
+            writer.write_rows(rows)
+            count = len(rows)
+            skipped += reservoir.seen - count
+        
+        logger.info(f"✅ {final_path.name}: {count} linhas escritas. (Skipped: {skipped})")
+
+    return {"file": final_path.name, "written": count, "skipped": skipped, "read": read, "bytes": counter.bytes_read,
+            "seconds": time.time() - start_time, "write_seconds": writer.write_seconds, "finished_at": time.time()}
+
+def extract_and_sample(zip_path: Path, output_dir: Path, is_empresa: bool = False) -> list[dict]:
     """
     Extrai arquivo do zip e gera amostra.
     Se is_empresa=True, popula o set EMPRESA_KEYS.
     Se is_empresa=False, filtra usando EMPRESA_KEYS.
+    Retorna os resumos dos membros processados.
     """
-    global EMPRESA_KEYS
-    
+    summaries = []
     try:
         with zipfile.ZipFile(zip_path, 'r') as zf:
             for member in zf.infolist():
-                final_path = output_dir / member.filename
+                final_path = output_path(output_dir, member.filename)
                 
                 # Check de idempotência (se não forçado)
                 if final_path.exists() and not pipeline_settings.sample_force:
@@ -39,13 +212,8 @@ def extract_and_sample(zip_path: Path, output_dir: Path, is_empresa: bool = Fals
                     
                     # Se for empresa e o arquivo já existe, precisamos carregar as chaves dele
                     # para poder filtrar os próximos (estabelecimentos/socios)
-                    if is_empresa and pipeline_settings.mode == "sample":
-                        logger.info(f"♻️  Carregando chaves de empresa existentes de {final_path.name}...")
-                        with open(final_path, "r", encoding="utf-8") as f:
-                            reader = csv.reader(f, delimiter=";")
-                            for row in reader:
-                                if row: EMPRESA_KEYS.add(row[0])
-                        logger.info(f"📊 Chaves carregadas: {len(EMPRESA_KEYS)}")
+                    if is_empresa:
+                        load_keys_from_output(final_path)
                     continue
 
                 logger.info(f"📂 Extraindo e gerando amostra inteligente de {member.filename}...")
@@ -53,59 +221,257 @@ def extract_and_sample(zip_path: Path, output_dir: Path, is_empresa: bool = Fals
                 # Extrai para stream (usando open do zipfile)
                 # Não extrai para disco para economizar I/O e espaço
                 with zf.open(member) as zfile:
-                    # Wrapper para ler como texto (latin1 é o padrão da RFB)
-                    import io
-                    text_stream = io.TextIOWrapper(zfile, encoding="latin1", errors="replace")
-                    
-                    with open(final_path, "w", encoding="utf-8", newline="") as fout:
-                        reader = csv.reader(text_stream, delimiter=";")
-                        writer = csv.writer(fout, delimiter=";")
-                        
-                        count = 0
-                        skipped = 0
-                        
-                        for row in reader:
-                            if not row: continue
-                            
-                            cnpj_basico = row[0]
-                            
-                            if is_empresa:
-                                # Modo Empresa: Adiciona ao set e escreve
-                                EMPRESA_KEYS.add(cnpj_basico)
-                                writer.writerow(row)
-                                count += 1
-                            else:
-                                # Modo Satélite (Estab/Socio): Filtra pelo set
-                                if cnpj_basico in EMPRESA_KEYS:
-                                    writer.writerow(row)
-                                    count += 1
-                                else:
-                                    skipped += 1
-                            
-                            # Limite de linhas (apenas se escreveu)
-                            if count >= pipeline_settings.sample_rows:
-                                break
-                        
-                        logger.info(f"✅ {final_path.name}: {count} linhas escritas. (Skipped: {skipped})")
+                    summaries.append(sample_member(zfile, final_path, is_empresa))
 
     except zipfile.BadZipFile:
         logger.error(f"❌ Arquivo corrompido: {zip_path.name}")
+        summaries.append({"file": zip_path.name, "error": "zip corrompido"})
     except Exception as e:
         logger.error(f"❌ Erro ao processar {zip_path.name}: {e}")
+        summaries.append({"file": zip_path.name, "error": str(e)})
+    return summaries
+
+def _load_stream_index(output_dir: Path) -> dict:
+    index_path = output_dir / STREAM_INDEX_NAME
+    if index_path.exists():
+        return json.loads(index_path.read_text(encoding="utf-8"))
+    return {}
+
+def _save_stream_index(output_dir: Path, index: dict):
+    index_path = output_dir / STREAM_INDEX_NAME
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    tmp.write_text(json.dumps(index, indent=2), encoding="utf-8")
+    tmp.replace(index_path)
+
+def stream_and_sample(file_url: str, zip_name: str, output_dir: Path, is_empresa: bool = False,
+                      manifest: DownloadManifest | None = None) -> list[dict]:
+    """
+    Modo streaming: baixa o zip e extrai/amostra os membros enquanto os bytes chegam,
+    sem gravar o zip em RAW_DIR (a menos que STREAM_KEEP_ARCHIVE=1).
+    """
+    summaries = []
+    index = _load_stream_index(output_dir)
+    index_key = f"{manifest.release}/{zip_name}" if manifest else zip_name
+    members = index.get(index_key)
+    if members and all(output_path(output_dir, m).exists() for m in members) and not pipeline_settings.sample_force:
+        logger.info(f"⏩ {zip_name} já extraído em streaming. Pulando.")
+        if is_empresa:
+            for m in members:
+                load_keys_from_output(output_path(output_dir, m))
+        return summaries
+
+    keep = pipeline_settings.stream_keep_archive
+    archive_path = RAW_DIR / zip_name
+    part = part_path_for(archive_path)
+    hasher = hashlib.sha256()
+
+    logger.info(f"🌊 Extraindo {zip_name} em streaming{' (mantendo o zip)' if keep else ''}...")
+    try:
+        with get_session().get(file_url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+
+            def _chunks():
+                with open(part, "wb") if keep else contextlib.nullcontext() as fout:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if keep:
+                            fout.write(chunk)
+                            hasher.update(chunk)
+                        yield chunk
+
+            chunks = _chunks()
+            extracted = []
+            for name, data in iter_members(chunks):
+                logger.info(f"📂 Extraindo e gerando amostra inteligente de {name}...")
+                reader = io.BufferedReader(ChunkReader(data), buffer_size=CHUNK_SIZE)
+                summaries.append(sample_member(reader, output_path(output_dir, name), is_empresa))
+                extracted.append(name)
+
+            if keep:
+                # O diretório central fica depois dos membros: consome até o fim
+                for _ in chunks:
+                    pass
+
+        if keep:
+            part.replace(archive_path)
+            if manifest is not None:
+                manifest.record(DownloadResult(
+                    zip_name, archive_path, True,
+                    size=archive_path.stat().st_size,
+                    sha256=hasher.hexdigest(),
+                    etag=response.headers.get("etag"),
+                    last_modified=response.headers.get("last-modified"),
+                ))
+
+        index[index_key] = extracted
+        _save_stream_index(output_dir, index)
+
+    except (StreamUnzipError, zlib.error):
+        logger.error(f"❌ Arquivo corrompido: {zip_name}")
+        summaries.append({"file": zip_name, "error": "zip corrompido"})
+    except Exception as e:
+        logger.error(f"❌ Erro ao processar {zip_name}: {e}")
+        summaries.append({"file": zip_name, "error": str(e)})
+    return summaries
+
+def _fetch_archive(file_url: str) -> io.BytesIO:
+    """Baixa um zip pequeno (domínios) para a memória."""
+    response = get_session().get(file_url, timeout=TIMEOUT)
+    response.raise_for_status()
+    return io.BytesIO(response.content)
+
+def load_keys_from_zip(zip_path: Path):
+    """Lê apenas a coluna cnpj_basico de um zip de Empresas para popular EMPRESA_KEYS."""
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        for member in zf.infolist():
+            with zf.open(member) as zfile:
+                text_stream = io.TextIOWrapper(zfile, encoding="latin1", errors="replace")
+                for keys in _iter_key_batches(csv.reader(text_stream, delimiter=";")):
+                    EMPRESA_KEYS.add_many(keys)
+
+# --- Execução paralela (ProcessPoolExecutor) ---
+# Cada processo tem seu próprio EMPRESA_KEYS: os jobs de Empresas devolvem o
+# bitmap gerado e o processo principal une os bitmaps e salva o índice, que os
+# satélites abrem via memory-map (somente leitura, páginas compartilhadas).
+
+def _empresa_job(zip_path: Path, output_dir: Path, keys_only: bool = False):
+    EMPRESA_KEYS.clear()
+    if keys_only:
+        load_keys_from_zip(zip_path)
+        summaries = []
+    else:
+        summaries = extract_and_sample(zip_path, output_dir, is_empresa=True)
+    return summaries, EMPRESA_KEYS
+
+def _init_satellite_worker(index_path: Path, output_dir: Path):
+    global EMPRESA_KEYS
+    EMPRESA_KEYS = KeyIndex.load(index_path, mmap=True)
+    # Dicionário de CNAEs para a conversão tipada (SCHEMA_VARIANT=typed)
+    domains.use_dictionary(output_dir)
+
+def _satellite_job(zip_path: Path, output_dir: Path):
+    return extract_and_sample(zip_path, output_dir, is_empresa=False)
+
+def _outputs_exist(zip_path: Path, output_dir: Path) -> bool:
+    """Todas as saídas dos membros do zip já existem (leitura só do diretório central)."""
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            return all(output_path(output_dir, name).exists() for name in zf.namelist())
+    except zipfile.BadZipFile:
+        return False
+
+def _output_names(zips: list[Path], output_dir: Path) -> dict[str, list[str]]:
+    """Nomes das saídas dos membros, por zip (leitura só do diretório central)."""
+    names = {}
+    for zip_path in zips:
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                names[zip_path.name] = [output_path(output_dir, name).name for name in zf.namelist()]
+        except zipfile.BadZipFile:
+            continue
+    return names
+
+def log_summary(summaries: list[dict]):
+    """
+    Consolida os resumos por arquivo (inclusive os vindos dos workers) no log
+    principal e os registra nas métricas da execução (src/ingest/metrics.py).
+    """
+    if not summaries:
+        return
+    logger.info("--- RESUMO DA EXTRAÇÃO ---")
+    written = skipped = 0
+    for item in sorted(summaries, key=lambda x: x["file"]):
+        if "error" in item:
+            logger.error(f"❌ {item['file']}: {item['error']}")
+            continue
+        written += item["written"]
+        skipped += item["skipped"]
+        rate = item.get("read", 0) / item["seconds"] if item["seconds"] > 0 else 0.0
+        mb_rate = item.get("bytes", 0) / 1024 / 1024 / item["seconds"] if item["seconds"] > 0 else 0.0
+        parse = item["seconds"] - item.get("write_seconds", 0.0)
+        logger.info(f"📄 {item['file']}: {item['written']} escritas, {item['skipped']} descartadas, {item['seconds']:.1f}s "
+                    f"({rate:,.0f} linhas/s, {mb_rate:,.1f} MB/s; parsing {parse:.1f}s, escrita {item.get('write_seconds', 0.0):.1f}s)")
+    logger.info(f"📊 Total: {written} linhas escritas, {skipped} descartadas.")
+
+    metrics.record("extract", [
+        {"file": item["file"], "ok": False} if "error" in item else {
+            "file": item["file"],
+            "bytes": item.get("bytes", 0),
+            "rows": item["written"],
+            "rows_skipped": item["skipped"],
+            "seconds": item["seconds"],
+            "write_seconds": item.get("write_seconds", 0.0),
+            "parse_seconds": item["seconds"] - item.get("write_seconds", 0.0),
+            "finished_at": item["finished_at"],
+        }
+        for item in summaries
+    ])
 
 def main():
+    global EMPRESA_KEYS
     bootstrap()
     
     if pipeline_settings.mode == "sample":
         logger.info(f"🧪 MODO SAMPLE (Inteligente) ATIVADO")
-        logger.info(f"🎯 Alvo: {pipeline_settings.sample_rows} linhas filtradas por integridade.")
+        if pipeline_settings.sample_strategy == "hash":
+            logger.info(f"🎯 Estratégia hash: {pipeline_settings.sample_hash_rate:.4%} das empresas (seed {pipeline_settings.sample_seed}).")
+        else:
+            logger.info(f"🎯 Alvo: {pipeline_settings.sample_rows} linhas filtradas por integridade (estratégia {pipeline_settings.sample_strategy}).")
         target_dir = SAMPLE_DIR
     else:
         logger.info("🚀 MODO FULL ATIVADO")
         target_dir = PROCESSED_DIR
     
     target_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"⚙️  Motor de extração: {pipeline_settings.extract_engine}")
     
+    if not pipeline_settings.stream_extract:
+        # Domínios primeiro (também no COPY direto): o dicionário de CNAEs é usado na conversão tipada
+        domains.extract(sorted(f for f in RAW_DIR.glob("*.zip") if f.name.startswith(DOMAIN_PREFIXES)), target_dir)
+    
+    if pipeline_settings.schema_variant == "typed":
+        # A conversão de tipos acontece aqui (FULL_DIRECT_COPY é recusado em PipelineConfig)
+        logger.info("🔢 SCHEMA_VARIANT=typed: saídas .pgcopy (COPY binário, colunas tipadas).")
+    elif pipeline_settings.mode == "full" and pipeline_settings.full_direct_copy:
+        # O COPY lê direto do zip na etapa 04: não há CSV intermediário a gerar
+        logger.info("⚡ FULL_DIRECT_COPY ativo: extração dispensada (etapa 04 carrega direto dos zips).")
+        return
+    
+    if pipeline_settings.stream_extract:
+        # Modo streaming: fontes são URLs da release mais recente, não zips locais
+        release, files = latest_release(BASE_URL)
+        if not release:
+            logger.error("❌ Não foi possível encontrar arquivos em nenhum dos meses recentes.")
+            return
+        if pipeline_settings.mode == "sample":
+            files = select_sample_files(files, pipeline_settings.sample_files_per_type)
+        logger.info(f"🌊 MODO STREAMING: {len(files)} arquivos da release {release}")
+        manifest = DownloadManifest.load(release)
+        release_url = f"{BASE_URL}{release}/"
+
+        def process(name: str, is_empresa: bool):
+            return stream_and_sample(release_url + name, name, target_dir, is_empresa, manifest)
+
+        domains.extract([_fetch_archive(release_url + name) for name in files if name.startswith(DOMAIN_PREFIXES)], target_dir)
+
+        # Streaming é limitado pela rede: os arquivos seguem em sequência
+        summaries = []
+        zips_emp = [f for f in files if "Empresas" in f]
+        zips_estab = [f for f in files if "Estabelecimentos" in f]
+        zips_socio = [f for f in files if "Socios" in f]
+        for name in zips_emp:
+            summaries.extend(process(name, True))
+        logger.info(f"🔑 Total de Chaves de Empresas Carregadas: {len(EMPRESA_KEYS)}")
+        for name in zips_estab + zips_socio:
+            summaries.extend(process(name, False))
+        index = _load_stream_index(target_dir)
+        record_release_outputs(target_dir, load_manifest.current_release(), {
+            name: [output_path(target_dir, m).name for m in index[f"{release}/{name}"]]
+            for name in zips_emp + zips_estab + zips_socio if f"{release}/{name}" in index
+        })
+        log_summary(summaries)
+        logger.info("✅ Processo finalizado com sucesso.")
+        return
+
     all_zips = list(RAW_DIR.glob("*.zip"))
     if not all_zips:
         logger.warning("⚠️ Nenhum arquivo .zip encontrado.")
@@ -128,23 +494,108 @@ def main():
         zips_estab = zips_estab[:k]
         zips_socio = zips_socio[:k]
 
+    # Modo delta: só extrai zips alterados/novos em relação à release anterior
+    to_process = None
+    if pipeline_settings.delta and pipeline_settings.mode == "full":
+        delta = ReleaseDelta.load()
+        if delta is None:
+            logger.warning("⚠️ Modo delta sem arquivo de delta. Processando todos os zips.")
+        elif not delta.complete():
+            logger.error(f"❌ Delta incompleto, arquivos sem download: {delta.unknown()}. Abortando.")
+            sys.exit(1)
+        else:
+            to_process = delta.to_process()
+            logger.info(f"🧮 MODO DELTA ({delta.release} vs {delta.previous}): {delta.summary()}")
+
+    def is_unchanged(z: Path) -> bool:
+        return to_process is not None and z.name not in to_process
+
+    # Saídas desta release, por zip, inclusive as já existentes: a etapa 04 carrega só elas
+    # (no delta, só as dos zips alterados; as dos inalterados são as da release anterior)
+    record_release_outputs(target_dir, load_manifest.current_release(),
+                           _output_names(zips_emp + zips_estab + zips_socio, target_dir))
+
+    summaries = []
+    workers = max(1, pipeline_settings.extract_workers)
+
+    # Reaproveita o índice de chaves salvo se ele foi gerado dos mesmos zips de Empresas
+    # e as saídas continuam no lugar: evita reprocessar Empresas só para obter as chaves
+    index_path = target_dir / KEY_INDEX_NAME
+    empresa_jobs = zips_emp
+    reused = False
+    if (
+        not pipeline_settings.sample_force
+        and KeyIndex.saved_sources(index_path) == sorted(z.name for z in zips_emp)
+        and all(is_unchanged(z) or _outputs_exist(z, target_dir) for z in zips_emp)
+    ):
+        EMPRESA_KEYS = KeyIndex.load(index_path, mmap=True)
+        empresa_jobs = []
+        reused = True
+        logger.info(f"♻️  Índice de chaves reaproveitado de {index_path.name} ({len(EMPRESA_KEYS)} chaves).")
+
+    if workers > 1:
+        logger.info(f"⚙️  Extração paralela com {workers} processos.")
+
+        # 1. Empresas em paralelo; as chaves de cada zip são unidas no processo principal
+        logger.info("--- ETAPA 1: EMPRESAS (Gerando Chaves) ---")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_empresa_job, z, target_dir, is_unchanged(z)) for z in empresa_jobs]
+            for future in as_completed(futures):
+                emp_summaries, keys = future.result()
+                summaries.extend(emp_summaries)
+                EMPRESA_KEYS.update(keys)
+        # Sempre salvo (mesmo vazio, sem zips de Empresas): os processos satélite o carregam
+        if not reused:
+            EMPRESA_KEYS.save(index_path, sources=[z.name for z in zips_emp])
+        logger.info(f"🔑 Total de Chaves de Empresas Carregadas: {len(EMPRESA_KEYS)}")
+
+        # 2 e 3. Estabelecimentos e Socios são independentes entre si: um único fan-out
+        logger.info("--- ETAPAS 2/3: ESTABELECIMENTOS E SOCIOS (Filtrando em paralelo) ---")
+        satellites = [z for z in zips_estab + zips_socio if not is_unchanged(z)]
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_satellite_worker,
+            initargs=(index_path, target_dir),
+        ) as pool:
+            futures = [pool.submit(_satellite_job, z, target_dir) for z in satellites]
+            for future in as_completed(futures):
+                summaries.extend(future.result())
+
+        log_summary(summaries)
+        logger.info("✅ Processo finalizado com sucesso.")
+        return
+
     # 1. Processar Empresas
     logger.info("--- ETAPA 1: EMPRESAS (Gerando Chaves) ---")
-    for z in zips_emp:
-        extract_and_sample(z, target_dir, is_empresa=True)
+    for z in empresa_jobs:
+        if is_unchanged(z):
+            # Inalterado: não reextrai, mas as chaves continuam necessárias para o filtro
+            logger.info(f"⏭️  {z.name} inalterado. Carregando apenas as chaves...")
+            load_keys_from_zip(z)
+            continue
+        summaries.extend(extract_and_sample(z, target_dir, is_empresa=True))
     
+    if not reused:
+        EMPRESA_KEYS.save(index_path, sources=[z.name for z in zips_emp])
     logger.info(f"🔑 Total de Chaves de Empresas Carregadas: {len(EMPRESA_KEYS)}")
 
     # 2. Processar Estabelecimentos
     logger.info("--- ETAPA 2: ESTABELECIMENTOS (Filtrando) ---")
     for z in zips_estab:
-        extract_and_sample(z, target_dir, is_empresa=False)
+        if is_unchanged(z):
+            logger.info(f"⏭️  {z.name} inalterado. Pulando.")
+            continue
+        summaries.extend(extract_and_sample(z, target_dir, is_empresa=False))
 
     # 3. Processar Socios
     logger.info("--- ETAPA 3: SOCIOS (Filtrando) ---")
     for z in zips_socio:
-        extract_and_sample(z, target_dir, is_empresa=False)
+        if is_unchanged(z):
+            logger.info(f"⏭️  {z.name} inalterado. Pulando.")
+            continue
+        summaries.extend(extract_and_sample(z, target_dir, is_empresa=False))
 
+    log_summary(summaries)
     logger.info("✅ Processo finalizado com sucesso.")
 
 if __name__ == "__main__":
@@ -1,10 +1,28 @@
+import contextlib
+import hashlib
+import io
 import logging
 import os
+import shutil
+import sys
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import BinaryIO, Callable, ContextManager
 from src.config import settings, pipeline_settings
 from sqlalchemy import create_engine
-from src.paths import PROCESSED_DIR, SAMPLE_DIR, ensure_dirs, validate_data_root
+from src.paths import RAW_DIR, PROCESSED_DIR, SAMPLE_DIR, TMP_DIR, ensure_dirs, validate_data_root
 from src.runners.bootstrap import bootstrap
+from src.ingest import bulk, domains, indexes, load_manifest, merge_refresh, metrics, partitioning, physical_layout, release_schema, secondary_cnae
+from src.ingest.csv_split import RangeReader, record_batches, record_ranges
+from src.ingest.downloader import file_sha256
+from src.ingest.layout import DOMAIN_PREFIXES, domain_for_member, table_for_member
+from src.ingest.release_diff import NEW, ReleaseDelta
+from src.ingest.pgcopy import PGCOPY_SUFFIX
+from src.ingest.sinks import PARQUET_SUFFIX, RELEASE_OUTPUTS_NAME, parquet_as_csv, release_outputs
 
 # Configuração de logging padronizada
 logging.basicConfig(
@@ -15,28 +33,18 @@ logger = logging.getLogger(__name__)
 
 # Define diretório de dados baseado no modo
 DATA_DIR = SAMPLE_DIR if pipeline_settings.mode == "sample" else PROCESSED_DIR
-
-# Mapeamento de sufixos de arquivo para tabelas
-TABLE_MAPPING = {
-    "EMPRECSV": "empresas",
-    "ESTABELE": "estabelecimentos",
-    "SOCIOCSV": "socios"
-}
+# Release registrada no load_manifest (ver src/ingest/load_manifest.py)
+RELEASE = load_manifest.current_release()
 
 def get_table_name(filename: str) -> str:
-    for suffix, table in TABLE_MAPPING.items():
-        if filename.endswith(suffix) or f"{suffix}.loaded" in filename:
-            return table
-    return None
+    # Aceita saídas CSV/Parquet/pgcopy
+    return table_for_member(filename)
 
-def load_file(file_path: Path, table_name: str, connection):
-    logger.info(f"⏳ MODO {pipeline_settings.mode.upper()}: Carregando {file_path.name} na tabela {table_name}...")
-    
-    # Montando comando COPY
-    # Se for sample, o arquivo foi salvo em UTF-8 no passo 03
-    encoding = "UTF8" if pipeline_settings.mode == "sample" else "LATIN1"
-    
-    sql = f"""
+def copy_sql(table_name: str, encoding: str, fmt: str = "csv") -> str:
+    if fmt == "binary":
+        # Saída .pgcopy (SCHEMA_VARIANT=typed): tuplas já tipadas, sem parsing no servidor
+        return f"COPY {table_name} FROM STDIN WITH (FORMAT BINARY)"
+    return f"""
         COPY {table_name} 
         FROM STDIN 
         WITH (
@@ -47,24 +55,671 @@ def load_file(file_path: Path, table_name: str, connection):
             NULL ''
         )
     """
-    
+
+@dataclass
+class CopyStats:
+    """
+    Linhas e tempos de uma carga: COPY no servidor, espera pelo lock da tabela
+    e preparo no cliente (varredura de registros, roteamento por partição).
+    A conversão Parquet -> CSV acontece durante o COPY e conta como COPY.
+    """
+    rows: int = 0
+    copy_seconds: float = 0.0
+    lock_wait_seconds: float = 0.0
+    parse_seconds: float = 0.0
+
+    def add(self, other: "CopyStats") -> "CopyStats":
+        self.rows += other.rows
+        self.copy_seconds += other.copy_seconds
+        self.lock_wait_seconds += other.lock_wait_seconds
+        self.parse_seconds += other.parse_seconds
+        return self
+
+def _timed_iter(iterable, stats: CopyStats):
+    """Repassa os itens de `iterable`, somando o tempo gasto em produzi-los a `stats.parse_seconds`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        item = next(iterator, None)
+        stats.parse_seconds += time.perf_counter() - start
+        if item is None:
+            return
+        yield item
+
+def copy_stream(stream, table_name: str, encoding: str, cursor, fmt: str = "csv") -> CopyStats:
+    """
+    COPY de um stream binário para a tabela, na transação aberta do cursor
+    (o commit fica com quem chama). Devolve linhas gravadas e tempos.
+    Os bytes seguem sem decodificação no Python: o servidor converte a partir de `encoding`.
+    Antes do COPY, o lock ROW EXCLUSIVE é pedido explicitamente para medir
+    quanto tempo a carga ficou esperando por outras sessões (DDL, VACUUM FULL...).
+    """
+    stats = CopyStats()
+    start = time.perf_counter()
+    cursor.execute(f"LOCK TABLE {table_name} IN ROW EXCLUSIVE MODE")
+    stats.lock_wait_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    cursor.copy_expert(copy_sql(table_name, encoding, fmt), stream)
+    stats.rows = cursor.rowcount
+    stats.copy_seconds = time.perf_counter() - start
+    return stats
+
+def _copy_outputs(cursor, target: str, table_name: str, paths) -> None:
+    """COPY das saídas processadas em `paths` (de `table_name`) para `target`."""
+    for path in paths:
+        job = file_job(path, table_name)
+        with job.open() as stream:
+            cursor.copy_expert(copy_sql(target, job.encoding, job.format), stream)
+
+def copy_delta(job: "LoadJob", cursor) -> CopyStats:
+    """
+    Modo delta, uma transação por tabela: apaga as linhas que vieram das saídas
+    substituídas (`replaces`: a versão anterior dos zips alterados e removidos)
+    e insere as das saídas novas (`sources`). A RFB divide Estabelecimentos e
+    Socios por posição, não por empresa: as linhas de uma empresa em zips
+    inalterados não são tocadas. O DELETE compara a linha inteira (cnpj_basico
+    pelo índice, depois o conteúdo); com a tabela toda numa transação, uma
+    linha que mudou de zip entre releases sai e volta uma única vez.
+    """
+    stats = CopyStats()
+    start = time.perf_counter()
+    cursor.execute(f"LOCK TABLE {job.table} IN ROW EXCLUSIVE MODE")
+    stats.lock_wait_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    cursor.execute(f"CREATE TEMP TABLE _delta_stage (LIKE {job.table}) ON COMMIT DROP")
+    cursor.execute(f"CREATE TEMP TABLE _delta_previous (LIKE {job.table}) ON COMMIT DROP")
+    _copy_outputs(cursor, "_delta_stage", job.table, job.sources)
+    _copy_outputs(cursor, "_delta_previous", job.table, job.replaces)
+    cursor.execute("ANALYZE _delta_previous")
+    cursor.execute(f"""
+        DELETE FROM {job.table} t
+        USING (SELECT DISTINCT cnpj_basico, md5(p::text) AS h FROM _delta_previous p) p
+        WHERE t.cnpj_basico = p.cnpj_basico AND md5(t::text) = p.h
+    """)
+    replaced = cursor.rowcount
+    cursor.execute(f"INSERT INTO {job.table} SELECT * FROM _delta_stage")
+    stats.rows = cursor.rowcount
+    stats.copy_seconds = time.perf_counter() - start
+    logger.info(f"🧮 Delta: {replaced} linhas substituídas por {stats.rows} em {job.table}")
+    return stats
+
+@dataclass
+class LoadJob:
+    """Uma unidade de carga: um stream COPY para uma tabela, em uma transação."""
+    name: str
+    table: str
+    size: int
+    open: Callable[[], ContextManager[BinaryIO]]
+    encoding: str
+    # Chave no load_manifest e checksum registrado ao concluir
+    source: str
+    checksum: Callable[[], str]
+    # CSV em disco: pode ser dividido em faixas de bytes (ver run_split_job)
+    path: Path | None = None
+    # csv | binary (COPY ... FORMAT BINARY)
+    format: str = "csv"
+    # Delta (ver copy_delta): saídas novas da tabela e as da release anterior que elas substituem
+    sources: tuple[Path, ...] = ()
+    replaces: tuple[Path, ...] = ()
+
+def file_job(file_path: Path, table_name: str) -> LoadJob:
+    """
+    Arquivo processado pela etapa 03: sempre UTF-8 (sample e full); Parquet é
+    convertido em CSV no caminho e .pgcopy segue como COPY binário (não é dividido).
+    """
+    source = f"{file_path.parent.name}/{file_path.name}"
+    checksum = lambda: file_sha256(file_path)
+    if file_path.name.endswith(PGCOPY_SUFFIX):
+        return LoadJob(file_path.name, table_name, file_path.stat().st_size, lambda: open(file_path, "rb"), "UTF8",
+                       source, checksum, format="binary")
+    if file_path.name.endswith(PARQUET_SUFFIX):
+        opener = lambda: parquet_as_csv(file_path)
+        path = None
+    else:
+        opener = lambda: open(file_path, "rb")
+        path = file_path
+    return LoadJob(file_path.name, table_name, file_path.stat().st_size, opener, "UTF8", source, checksum, path)
+
+@contextlib.contextmanager
+def _open_member(zip_path: Path, member: str):
+    with zipfile.ZipFile(zip_path, 'r') as zf, zf.open(member) as stream:
+        yield stream
+
+def zip_jobs(zip_path: Path) -> list[LoadJob]:
+    """
+    Caminho rápido do modo FULL: COPY direto do membro do zip, em LATIN1.
+    Sem parsing de linhas no Python e sem CSV intermediário em PROCESSED_DIR;
+    o load_manifest registra cada membro como `<zip>/<membro>` (checksum: CRC32 do zip).
+    """
+    jobs = []
     try:
-        with open(file_path, "r", encoding=encoding.lower()) as f:
-            cursor = connection.connection.cursor()
-            cursor.copy_expert(sql, f)
-            connection.connection.commit()
-        logger.info(f"✅ {file_path.name} carregado com sucesso!")
-        
-        # Renomeia o arquivo para evitar recarga
-        if not file_path.name.endswith(".loaded"):
-            file_path.rename(file_path.with_suffix(file_path.suffix + ".loaded"))
-        
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            members = zf.infolist()
+    except zipfile.BadZipFile:
+        logger.error(f"❌ Arquivo corrompido: {zip_path.name}")
+        return jobs
+
+    for member in members:
+        table_name = get_table_name(member.filename)
+        if not table_name:
+            logger.warning(f"⚠️ Membro {member.filename} ignorado (sem mapeamento de tabela).")
+            continue
+
+        jobs.append(LoadJob(
+            member.filename, table_name, member.file_size,
+            lambda name=member.filename: _open_member(zip_path, name), "LATIN1",
+            f"{zip_path.name}/{member.filename}", lambda crc=member.CRC: f"crc32:{crc:08x}",
+        ))
+    return jobs
+
+def _batched(job: LoadJob) -> bool:
+    """CSV em disco é carregado em lotes de LOAD_BATCH_ROWS linhas, retomáveis (jobs delta não têm path)."""
+    return job.path is not None and job.format == "csv" and pipeline_settings.load_batch_rows > 0
+
+def _failure(job: LoadJob, error: str, start: float) -> dict:
+    return {"file": job.name, "table": job.table, "ok": False, "error": error,
+            "bytes": job.size, "seconds": time.time() - start, "finished_at": time.time()}
+
+def _success(job: LoadJob, start: float, stats: CopyStats) -> dict:
+    return {"file": job.name, "table": job.table, "ok": True, "bytes": job.size,
+            "seconds": time.time() - start, "finished_at": time.time(), **asdict(stats)}
+
+def run_job(job: LoadJob, engine) -> dict:
+    """
+    Executa um job numa conexão do pool; falhas são devolvidas, não propagadas.
+    O status `done` no load_manifest é gravado na mesma transação do COPY.
+    """
+    if _batched(job):
+        return run_batched_job(job, engine)
+    start = time.time()
+    logger.info(f"⏳ MODO {pipeline_settings.mode.upper()}: Carregando {job.name} na tabela {job.table}...")
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        load_manifest.begin(cursor, RELEASE, job.source, job.table, job.size, resume=False)
+        conn.commit()
+        try:
+            if job.sources or job.replaces:
+                stats = copy_delta(job, cursor)
+            else:
+                with job.open() as stream:
+                    stats = copy_stream(stream, job.table, job.encoding, cursor, job.format)
+            load_manifest.complete(cursor, RELEASE, job.source, stats.rows, job.checksum(), time.time() - start)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            error = str(e).strip().splitlines()[0]
+            load_manifest.fail(cursor, RELEASE, job.source, error, time.time() - start)
+            conn.commit()
+            logger.error(f"❌ Erro ao carregar {job.name}: {e}")
+            return _failure(job, error, start)
+    finally:
+        conn.close()
+    logger.info(f"✅ {job.name} carregado com sucesso! ({stats.rows:,} linhas)")
+    return _success(job, start, stats)
+
+def _hash_prefix(path: Path, end: int, digest) -> None:
+    """Alimenta `digest` com os bytes [0, end) já carregados (retomada)."""
+    with io.BufferedReader(RangeReader(path, 0, end), buffer_size=1024 * 1024) as stream:
+        while block := stream.read(8 * 1024 * 1024):
+            digest.update(block)
+
+def run_batched_job(job: LoadJob, engine) -> dict:
+    """
+    Carrega um CSV em lotes de até LOAD_BATCH_ROWS registros, um COPY e um
+    commit por lote, com o offset confirmado gravado no load_manifest na mesma
+    transação. Se a carga cair, a próxima execução retoma desse offset.
+    """
+    start = time.time()
+    stats = CopyStats()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        entry = load_manifest.get(cursor, RELEASE, job.source)
+        resume = (entry is not None and entry.status in (load_manifest.LOADING, load_manifest.FAILED)
+                  and entry.committed_offset > 0 and entry.target_table == job.table)
+        offset, rows = (entry.committed_offset, entry.rows) if resume else (0, 0)
+        digest = hashlib.sha256()
+        if resume:
+            logger.info(f"↩️  {job.name}: retomando do byte {offset:,} ({rows:,} linhas já confirmadas)...")
+            prefix_start = time.perf_counter()
+            _hash_prefix(job.path, offset, digest)
+            stats.parse_seconds += time.perf_counter() - prefix_start
+        else:
+            logger.info(f"⏳ MODO {pipeline_settings.mode.upper()}: Carregando {job.name} na tabela {job.table}...")
+        load_manifest.begin(cursor, RELEASE, job.source, job.table, job.size, resume)
+        conn.commit()
+
+        batch_start = time.time()
+        try:
+            batches = record_batches(job.path, pipeline_settings.load_batch_rows, offset, digest=digest)
+            for a, b in _timed_iter(batches, stats):
+                with io.BufferedReader(RangeReader(job.path, a, b), buffer_size=1024 * 1024) as stream:
+                    copied = copy_stream(stream, job.table, job.encoding, cursor)
+                stats.add(copied)
+                rows += copied.rows
+                now = time.time()
+                load_manifest.advance(cursor, RELEASE, job.source, b, rows, now - batch_start)
+                conn.commit()
+                offset, batch_start = b, now
+            load_manifest.complete(cursor, RELEASE, job.source, rows, digest.hexdigest(), time.time() - batch_start)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            error = str(e).strip().splitlines()[0]
+            load_manifest.fail(cursor, RELEASE, job.source, error, time.time() - batch_start)
+            conn.commit()
+            logger.error(f"❌ Erro ao carregar {job.name} (confirmado até o byte {offset:,}): {e}")
+            return _failure(job, error, start)
+    finally:
+        conn.close()
+    logger.info(f"✅ {job.name} carregado com sucesso! ({rows:,} linhas)")
+    # Métricas desta execução: numa retomada, só as linhas carregadas agora
+    return _success(job, start, stats)
+
+def _copy_pieces(job: LoadJob, engine, load_id: str, index: int, pieces: list[tuple[Path, str, int, int]]):
+    """
+    COPY de um grupo de faixas (arquivo, tabela, início, fim) numa mesma
+    conexão, com retentativas do grupo em conexões novas. Devolve a conexão
+    com a transação ABERTA (confirmada por _run_pieces, depois que todos os
+    grupos terminam) e as linhas/tempos do COPY.
+    """
+    attempts = pipeline_settings.load_chunk_retries + 1
+    for attempt in range(1, attempts + 1):
+        conn = None
+        try:
+            # Dentro do try: uma falha ao conectar também é retentada
+            conn = engine.raw_connection()
+            cursor = conn.cursor()
+            # Identifica a carga em pg_stat_activity: cnpj_load:<load_id>:<grupo>
+            cursor.execute("SET application_name = %s", (f"cnpj_load:{load_id}:{index}",))
+            stats = CopyStats()
+            for path, table, start, end in pieces:
+                with io.BufferedReader(RangeReader(path, start, end), buffer_size=1024 * 1024) as stream:
+                    stats.add(copy_stream(stream, table, job.encoding, cursor))
+            return conn, stats
+        except Exception as e:
+            if conn:
+                conn.rollback()
+                conn.close()
+            if attempt == attempts:
+                raise
+            logger.warning(f"⚠️ [{load_id}] Grupo {index} de {job.name} falhou ({str(e).strip().splitlines()[0]}). "
+                           f"Tentativa {attempt + 1}/{attempts}...")
+
+def _manifest(engine, update, *args):
+    """Operação avulsa no load_manifest, numa transação própria."""
+    conn = engine.raw_connection()
+    try:
+        result = update(conn.cursor(), *args)
+        conn.commit()
+        return result
+    finally:
+        conn.close()
+
+def _interrupted_batches(job: LoadJob, engine) -> bool:
+    """Carga em lotes interrompida: só a retomada sequencial sabe de onde continuar."""
+    entry = _manifest(engine, load_manifest.get, RELEASE, job.source)
+    return entry is not None and entry.status != load_manifest.DROPPED and entry.committed_offset > 0
+
+def _run_pieces(job: LoadJob, engine, load_id: str, pieces: list[tuple[Path, str, int, int]],
+                workers: int, unit: str, stats: CopyStats) -> dict:
+    """
+    Distribui as faixas em até `workers` grupos (maiores primeiro, no grupo
+    mais leve), um COPY por faixa e uma conexão por grupo. As transações só
+    são confirmadas quando todos os grupos terminam; se algum esgota as
+    retentativas, todos são desfeitos e o arquivo fica pendente. `stats` traz
+    o preparo já feito no cliente (faixas, roteamento) e recebe os COPYs.
+
+    Os commits dos grupos são sequenciais, não atômicos entre si: antes do
+    primeiro, o manifesto registra o arquivo como `partial`, e só passa a
+    `done` (em transação própria) depois que todos confirmaram. Se um commit
+    falhar, ou o processo cair, no meio, o arquivo fica `partial` e não é
+    recarregado por cima (duplicaria linhas): exige recriar as tabelas.
+    """
+    start_time = time.time()
+    groups = [[] for _ in range(max(1, min(workers, len(pieces))))]
+    loads = [0] * len(groups)
+    for piece in sorted(pieces, key=lambda p: p[3] - p[2], reverse=True):
+        i = loads.index(min(loads))
+        groups[i].append(piece)
+        loads[i] += piece[3] - piece[2]
+    _manifest(engine, load_manifest.begin, RELEASE, job.source, job.table, job.size, False)
+
+    connections, errors = [], []
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        futures = [pool.submit(_copy_pieces, job, engine, load_id, i, group) for i, group in enumerate(groups)]
+        for future in as_completed(futures):
+            try:
+                conn, copied = future.result()
+                connections.append(conn)
+                stats.add(copied)
+            except Exception as e:
+                errors.append(str(e).strip().splitlines()[0])
+
+    result = {"file": job.name, "table": job.table, "bytes": job.size, "chunks": len(pieces), "unit": unit,
+              "finished_at": time.time()}
+    if errors:
+        for conn in connections:
+            conn.rollback()
+            conn.close()
+        logger.error(f"❌ [{load_id}] {job.name}: carga desfeita ({len(errors)} grupos falharam).")
+        error = f"[{load_id}] {errors[0]}"
+        _manifest(engine, load_manifest.fail, RELEASE, job.source, error, time.time() - start_time)
+        return {**result, "ok": False, "error": error, "seconds": time.time() - start_time + stats.parse_seconds}
+
+    _manifest(engine, load_manifest.fail, RELEASE, job.source, f"[{load_id}] confirmando {len(connections)} grupos", 0, True)
+    committed = 0
+    try:
+        for conn in connections:
+            conn.commit()
+            committed += 1
     except Exception as e:
-        connection.connection.rollback()
-        logger.error(f"❌ Erro ao carregar {file_path.name}: {e}")
+        for conn in connections[committed:]:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        error = f"[{load_id}] {committed}/{len(connections)} grupos confirmados: {str(e).strip().splitlines()[0]}"
+        logger.error(f"❌ {job.name}: {error}")
+        # Com algum grupo confirmado, `partial`; sem nenhum, falha comum (recarregável)
+        _manifest(engine, load_manifest.fail, RELEASE, job.source, error, time.time() - start_time, committed > 0)
+        return {**result, "ok": False, "error": error, "seconds": time.time() - start_time + stats.parse_seconds}
+    finally:
+        for conn in connections:
+            conn.close()
+    _manifest(engine, load_manifest.complete, RELEASE, job.source, stats.rows, job.checksum(), time.time() - start_time)
+    logger.info(f"✅ [{load_id}] {job.name} carregado com sucesso ({len(pieces)} {unit})!")
+    return {**result, "ok": True, "seconds": time.time() - start_time + stats.parse_seconds, **asdict(stats)}
+
+def run_split_job(job: LoadJob, engine, parts: int) -> dict:
+    """
+    Carrega um CSV grande em `parts` faixas alinhadas a registros, cada uma num
+    COPY em conexão própria, todas sob o mesmo load_id e confirmadas juntas.
+    """
+    if _interrupted_batches(job, engine):
+        return run_batched_job(job, engine)
+    load_id = uuid.uuid4().hex[:12]
+    start = time.perf_counter()
+    ranges = record_ranges(job.path, parts)
+    stats = CopyStats(parse_seconds=time.perf_counter() - start)
+    logger.info(f"✂️  [{load_id}] {job.name} → {job.table}: {len(ranges)} faixas em paralelo...")
+    pieces = [(job.path, job.table, a, b) for a, b in ranges]
+    return _run_pieces(job, engine, load_id, pieces, len(ranges), "faixas", stats)
+
+def run_partitioned_job(job: LoadJob, engine, workers: int) -> dict:
+    """
+    Tabela particionada por LIST (UF): separa as linhas do CSV em um spool por
+    partição e carrega as partições folha diretamente, em paralelo, sem o
+    roteamento linha a linha no servidor. Confirmadas juntas, como as faixas.
+    """
+    if _interrupted_batches(job, engine):
+        return run_batched_job(job, engine)
+    load_id = uuid.uuid4().hex[:12]
+    spool_dir = TMP_DIR / "partitions" / load_id
+    start = time.time()
+    try:
+        spools = partitioning.route_file(job.path, get_table_name(job.name), job.table, spool_dir)
+        stats = CopyStats(parse_seconds=time.time() - start)
+        logger.info(f"🧩 [{load_id}] {job.name} → {job.table}: {len(spools)} partições "
+                    f"(roteamento em {stats.parse_seconds:.1f}s), {workers} conexões...")
+        pieces = [(path, leaf, 0, path.stat().st_size) for leaf, path in spools.items()]
+        return _run_pieces(job, engine, load_id, pieces, workers, "partições", stats)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+def _split_parts(job: LoadJob, workers: int) -> int:
+    """Número de faixas para o job (1 = sem divisão)."""
+    split_bytes = pipeline_settings.load_split_mb * 1024 * 1024
+    if job.path is None or split_bytes <= 0 or workers <= 1:
+        return 1
+    return min(workers, -(-job.size // split_bytes))
+
+def _routed(job: LoadJob) -> bool:
+    """CSV destinado a tabela particionada por UF: roteado no cliente (run_partitioned_job)."""
+    return job.path is not None and partitioning.routes_on_client(get_table_name(job.name))
+
+def run_jobs(jobs: list[LoadJob], engine, workers: int) -> list[dict]:
+    """
+    Carrega os jobs num pool de até `workers` conexões, um arquivo por conexão.
+    Maiores primeiro (LPT): o arquivo mais longo não fica para o fim.
+    Arquivos roteados por partição e os acima de LOAD_SPLIT_MB são carregados
+    antes, um por vez, usando todas as conexões.
+    """
+    jobs = sorted(jobs, key=lambda j: j.size, reverse=True)
+    results = []
+    remaining = []
+    for job in jobs:
+        parts = _split_parts(job, workers)
+        if _routed(job):
+            results.append(run_partitioned_job(job, engine, workers))
+        elif parts > 1:
+            results.append(run_split_job(job, engine, parts))
+        else:
+            remaining.append(job)
+    jobs = remaining
+
+    if workers <= 1:
+        return results + [run_job(job, engine) for job in jobs]
+
+    logger.info(f"⚙️  Carga paralela: {workers} conexões COPY simultâneas.")
+    # COPY é I/O no libpq (GIL liberado): threads bastam
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, engine) for job in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+def log_report(results: list[dict]):
+    """
+    Relatório por arquivo (throughput e divisão do tempo entre preparo no
+    cliente, espera por lock e COPY), registrado também nas métricas da
+    execução; as falhas aparecem destacadas ao final.
+    """
+    if not results:
+        return
+    logger.info("--- RESUMO DA CARGA ---")
+    for item in sorted(results, key=lambda r: r["file"]):
+        mb = item["bytes"] / 1024 / 1024
+        status = "✅" if item["ok"] else "❌"
+        chunks = f" ({item['chunks']} {item.get('unit', 'faixas')})" if item.get("chunks") else ""
+        rates = ""
+        if item["ok"] and item["seconds"] > 0:
+            rates = (f" — {item['rows'] / item['seconds']:,.0f} linhas/s, {mb / item['seconds']:,.1f} MB/s"
+                     f" (preparo {item['parse_seconds']:.1f}s, lock {item['lock_wait_seconds']:.2f}s, COPY {item['copy_seconds']:.1f}s)")
+        logger.info(f"{status} {item['file']} → {item['table']}: {mb:,.1f} MB em {item['seconds']:.1f}s{chunks}{rates}")
+    # Métricas pela tabela lógica (não pela staging do modo bulk)
+    metrics.record("load", [{**item, "table": get_table_name(item["file"])} for item in results])
+    failed = [r for r in results if not r["ok"]]
+    if failed:
+        logger.error(f"❌ {len(failed)} de {len(results)} arquivos falharam:")
+        for item in failed:
+            logger.error(f"   - {item['file']}: {item['error']}")
+    else:
+        logger.info(f"📊 {len(results)} arquivos carregados sem falhas.")
+
+def direct_zip_sources() -> list[Path]:
+    """Zips em RAW_DIR para o caminho direto (respeitando o delta, se ativo)."""
+    # Domínios não passam pelo COPY direto: vêm das saídas da etapa 03 (domains.load)
+    zips = sorted(z for z in RAW_DIR.glob("*.zip") if not z.name.startswith(DOMAIN_PREFIXES))
+    if pipeline_settings.delta:
+        delta = ReleaseDelta.load()
+        if delta is not None:
+            zips = [z for z in zips if z.name in delta.to_process()]
+    # Empresas primeiro, como nas demais etapas
+    order = {"Empresas": 0, "Estabelecimentos": 1, "Socios": 2}
+    return sorted(zips, key=lambda z: (next((v for k, v in order.items() if z.name.startswith(k)), 3), z.name))
+
+def delta_jobs(jobs: list[LoadJob], outputs: dict[str, list[str]], delta: ReleaseDelta) -> list[LoadJob] | None:
+    """
+    Modo delta: junta os jobs em um por tabela, com as saídas novas dos zips
+    alterados e novos (`sources`) e as saídas da release anterior dos zips
+    alterados e removidos (`replaces`), carregados numa única transação (ver
+    copy_delta). Devolve None se faltar alguma saída anterior: sem ela, o
+    delta não alcança o estado de uma carga completa.
+    """
+    previous = release_outputs(DATA_DIR, delta.previous) if delta.previous else {}
+    if previous is None:
+        logger.error(f"❌ {RELEASE_OUTPUTS_NAME} sem a release anterior {delta.previous}: rode uma carga completa.")
+        return None
+    zip_of = {name: zip_name for zip_name, names in outputs.items() for name in names}
+    sources: dict[str, list[Path]] = {}
+    replaces: dict[str, set[Path]] = {}
+
+    def add_previous(zip_name: str, table: str) -> bool:
+        paths = [DATA_DIR / name for name in previous.get(zip_name, []) if get_table_name(name) == table]
+        missing = [p.name for p in paths if not p.exists()]
+        if missing or (delta.files.get(zip_name) != NEW and not paths):
+            logger.error(f"❌ Saídas de {zip_name} na release {delta.previous} ausentes em {DATA_DIR}: {missing or '-'}")
+            return False
+        replaces.setdefault(table, set()).update(paths)
+        return True
+
+    for job in jobs:
+        sources.setdefault(job.table, []).append(DATA_DIR / job.name)
+        if not add_previous(zip_of[job.name], job.table):
+            return None
+
+    for zip_name in delta.removed:
+        if zip_name.startswith(DOMAIN_PREFIXES):
+            continue
+        tables = sorted({get_table_name(name) for name in previous.get(zip_name, [])} - {None})
+        if not tables:
+            logger.error(f"❌ Zip removido {zip_name} sem saídas registradas na release {delta.previous}.")
+            return None
+        for table in tables:
+            if not add_previous(zip_name, table):
+                return None
+            logger.info(f"🗑️  {zip_name} removido da release: suas linhas saem de {table}.")
+
+    table_jobs = []
+    for table in sorted(set(sources) | set(replaces)):
+        new, old = tuple(sorted(sources.get(table, []))), tuple(sorted(replaces.get(table, set())))
+        checksum = lambda paths=new: hashlib.sha256("".join(file_sha256(p) for p in paths).encode()).hexdigest()
+        table_jobs.append(LoadJob(f"{table} (delta: {len(new)} novas, {len(old)} substituídas)", table,
+                                  sum(p.stat().st_size for p in new), lambda: io.BytesIO(), "UTF8",
+                                  f"delta/{table}", checksum, sources=new, replaces=old))
+    return table_jobs
+
+def target_staging(jobs: list[LoadJob]) -> list[LoadJob]:
+    """Nos modos bulk e merge, os jobs escrevem nas stagings em vez das tabelas de produção."""
+    if bulk.enabled() or merge_refresh.enabled():
+        for job in jobs:
+            job.table = bulk.staging_name(job.table)
+    return jobs
+
+def pending_jobs(jobs: list[LoadJob], engine) -> tuple[list[LoadJob], list[dict]]:
+    """
+    Filtra pelo load_manifest os jobs já carregados nesta release. Um arquivo
+    que mudou desde a carga (total ou parcial) registrada vira falha: recarregar
+    por cima duplicaria linhas.
+    """
+    pending, failures = [], []
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for job in jobs:
+            entry = load_manifest.get(cursor, RELEASE, job.source)
+            # Bulk: o que foi carregado na staging e já trocado consta na tabela de produção
+            targets = {job.table, get_table_name(job.name)}
+            if entry is None or entry.status == load_manifest.DROPPED or entry.target_table not in targets:
+                pending.append(job)
+            elif entry.bytes != job.size and (entry.status == load_manifest.DONE or entry.committed_offset > 0):
+                error = (f"arquivo difere do registrado na release {RELEASE} ({entry.bytes:,} bytes); "
+                         "recrie as tabelas (etapa 02) para recarregar")
+                logger.error(f"❌ {job.name}: {error}")
+                failures.append(_failure(job, error, time.time()))
+            elif entry.status == load_manifest.PARTIAL:
+                error = (f"carga parcial confirmada em {entry.target_table} na release {RELEASE}; "
+                         "recrie as tabelas (etapa 02) para recarregar")
+                logger.error(f"❌ {job.name}: {error}")
+                failures.append(_failure(job, error, time.time()))
+            elif entry.status == load_manifest.DONE:
+                logger.info(f"⏩ {job.name} já carregado na release {RELEASE} ({entry.rows:,} linhas). Pulando.")
+            else:
+                pending.append(job)
+    finally:
+        conn.close()
+    return pending, failures
+
+def load(jobs: list[LoadJob], engine, workers: int):
+    """Carrega os jobs pendentes e conclui (troca/layout); sem pendências, não há trabalho."""
+    if not jobs:
+        logger.warning("⚠️ Nenhum arquivo de carga encontrado.")
+        return
+    jobs, failures = pending_jobs(target_staging(jobs), engine)
+    if not jobs and not failures:
+        logger.info(f"✅ Nada a carregar: todos os arquivos constam como carregados na release {RELEASE}.")
+        if (bulk.enabled() or merge_refresh.enabled()) and bulk.staged_tables(engine):
+            # Execução anterior carregou tudo mas caiu antes da troca (ou do merge)
+            finish([], engine)
+        return
+    if jobs and not (bulk.enabled() or merge_refresh.enabled() or pipeline_settings.delta):
+        # Carga completa direto na produção: sem índices durante o COPY (a etapa 05 os reconstrói)
+        indexes.drop_declared(engine, {job.table for job in jobs})
+    finish(failures + run_jobs(jobs, engine, workers), engine)
+
+def finish(results: list[dict], engine):
+    log_report(results)
+    if merge_refresh.enabled():
+        if any(not r["ok"] for r in results):
+            logger.error("❌ MODO MERGE: houve falhas; merge cancelado (tabelas de produção intactas).")
+            return
+        # O layout ordenado não é refeito: reescreveria a tabela inteira a cada release
+        merge_refresh.apply(engine, RELEASE)
+    elif bulk.enabled():
+        if any(not r["ok"] for r in results):
+            # Produção fica intacta; as stagings permanecem para inspeção/recarga
+            logger.error("❌ MODO BULK: houve falhas; troca cancelada (tabelas de produção intactas).")
+            return
+        if pipeline_settings.sorted_layout:
+            physical_layout.sort_staging(engine)
+        bulk.swap_in(engine)
+    elif pipeline_settings.sorted_layout:
+        physical_layout.sort_in_place(engine)
+    if pipeline_settings.sorted_layout:
+        physical_layout.finalize_indexes(engine)
+    # CNAEs secundários no esquema texto: tabela ponte, com a produção já no lugar
+    secondary_cnae.finalize(engine)
+    logger.info("🎉 Processo de carga finalizado.")
 
 def main():
     bootstrap()
+    schema = release_schema.use_load_schema()
+    workers = max(1, pipeline_settings.load_workers)
+    # Uma conexão por worker, mais uma para o manifesto (registrado enquanto os grupos
+    # de faixas seguram as suas); sem overflow para não passar do limite configurado
+    connect_args = bulk.session_connect_args() if bulk.enabled() else {}
+    engine = create_engine(settings.sqlalchemy_url, pool_size=workers + 1, max_overflow=0, connect_args=connect_args)
+    if merge_refresh.enabled():
+        logger.info("🔀 MODO MERGE: carga nas stagings; só as mudanças são aplicadas à produção.")
+    elif pipeline_settings.merge_refresh:
+        logger.warning("⚠️ MERGE_REFRESH ignorado no modo delta.")
+    if bulk.enabled():
+        logger.info("🧱 MODO BULK: carga nas stagings UNLOGGED (synchronous_commit=off).")
+    if schema:
+        logger.info(f"🗂️  RELEASE_SCHEMAS: carga no schema {schema}.")
+    with engine.begin() as conn:
+        load_manifest.ensure_table(conn.connection.cursor())
+    logger.info(f"🧾 Release {RELEASE}: progresso registrado em load_manifest.")
+    if DATA_DIR.exists():
+        # Domínios (poucos KB) são substituídos inteiros a cada carga, antes das tabelas fato
+        domains.load(engine, DATA_DIR)
+
+    if pipeline_settings.mode == "full" and pipeline_settings.full_direct_copy:
+        if pipeline_settings.delta:
+            # O zip da release anterior foi substituído: sem as chaves dele, o delta não remove as empresas que saíram
+            logger.error("❌ Modo delta requer as saídas da etapa 03 (sem FULL_DIRECT_COPY). Abortando.")
+            sys.exit(1)
+        zips = direct_zip_sources()
+        logger.info(f"🚀 Iniciando carga FULL direto dos zips ({len(zips)} arquivos em {RAW_DIR})")
+        if not zips:
+            logger.warning("⚠️ Nenhum arquivo .zip pendente encontrado.")
+            return
+        jobs = [job for zip_path in zips for job in zip_jobs(zip_path)]
+        load(jobs, engine, workers)
+        return
+
     logger.info(f"🚀 Iniciando carga em modo {pipeline_settings.mode.upper()} a partir de {DATA_DIR}")
     
     if not DATA_DIR.exists():
@@ -72,27 +727,52 @@ def main():
         return
 
     files = list(DATA_DIR.iterdir())
-    files = [f for f in files if f.is_file() and not f.name.endswith(".loaded")]
-# ... (restante do main permanece igual)    
-    if not files:
-        logger.warning("⚠️ Nenhum arquivo pendente encontrado em data/processed.")
+    # .tmp: saídas da etapa 03 ainda incompletas (ver src/ingest/sinks.py);
+    # .loaded: marcadores de versões antigas, anteriores ao load_manifest
+    files = [f for f in files if f.is_file() and not f.name.endswith((".loaded", ".tmp"))]
+    # Saídas de releases anteriores continuam no diretório (sem linha no load_manifest
+    # desta release): carregá-las duplicaria linhas ou misturaria releases
+    outputs = release_outputs(DATA_DIR, RELEASE)
+    delta = None
+    if pipeline_settings.delta and pipeline_settings.mode == "full":
+        delta = ReleaseDelta.load()
+        if delta is None or not delta.complete() or outputs is None:
+            logger.error(f"❌ Modo delta sem delta completo ou sem {RELEASE_OUTPUTS_NAME} da release {RELEASE}. Abortando.")
+            sys.exit(1)
+    if outputs is None:
+        logger.warning(f"⚠️ {RELEASE_OUTPUTS_NAME} sem a release {RELEASE} (extração anterior a este registro): "
+                       f"carregando todos os arquivos de {DATA_DIR}.")
+    else:
+        zips = delta.to_process() if delta else outputs.keys()
+        names = {name for zip_name in zips for name in outputs.get(zip_name, [])}
+        files = [f for f in files if f.name in names]
+    if not files and not (delta and delta.removed):
+        logger.warning(f"⚠️ Nenhum arquivo encontrado em {DATA_DIR}.")
         return
         
     logger.info(f"🚀 Iniciando carga de {len(files)} arquivos...")
+    if pipeline_settings.delta and pipeline_settings.mode == "full":
+        # Só há arquivos pendentes dos zips alterados: a etapa 03 pulou os inalterados
+        logger.info("🧮 MODO DELTA: carregando apenas os zips alterados (uma transação por tabela).")
     
-    engine = create_engine(settings.sqlalchemy_url)
-    
-    with engine.connect() as conn:
-        for file_path in files:
-            table_name = get_table_name(file_path.name)
-            
-            if not table_name:
-                logger.warning(f"⚠️ Arquivo {file_path.name} ignorado (sem mapeamento de tabela).")
-                continue
-                
-            load_file(file_path, table_name, conn)
+    jobs = []
+    for file_path in files:
+        table_name = get_table_name(file_path.name)
+        
+        if not table_name and domain_for_member(file_path.name):
+            continue
+        if not table_name:
+            logger.warning(f"⚠️ Arquivo {file_path.name} ignorado (sem mapeamento de tabela).")
+            continue
             
-    logger.info("🎉 Processo de carga finalizado.")
+        jobs.append(file_job(file_path, table_name))
+
+    if delta:
+        jobs = delta_jobs(jobs, outputs, delta)
+        if jobs is None:
+            sys.exit(1)
+    
+    load(jobs, engine, workers)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,45 @@
+import logging
+import sys
+import time
+from sqlalchemy import create_engine
+from src.config import settings, pipeline_settings
+from src.runners.bootstrap import bootstrap
+from src.ingest import indexes, load_manifest, release_schema
+
+# Configuração de logging padronizada
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    """
+    Etapa 05: índices e chaves declarados em src/ingest/indexes.py, construídos
+    depois da carga — tabelas em paralelo (INDEX_WORKERS conexões), cada
+    construção com até INDEX_PARALLEL_WORKERS workers de manutenção.
+    """
+    bootstrap()
+    release_schema.use_load_schema()
+    workers = max(1, pipeline_settings.index_workers)
+    engine = create_engine(settings.sqlalchemy_url, pool_size=workers, max_overflow=1)
+    release = load_manifest.current_release()
+
+    logger.info(f"🏗️  Construindo índices declarados ({workers} conexões, "
+                f"{pipeline_settings.index_parallel_workers} workers paralelos por índice)...")
+    start = time.time()
+    results = indexes.build_all(engine, release, workers=workers)
+    if not results:
+        logger.info("✅ Todos os índices declarados já existem.")
+        return
+
+    failed = [r for r in results if not r["ok"]]
+    logger.info(f"📊 {len(results) - len(failed)} índices construídos, {len(failed)} com falha, "
+                f"em {time.time() - start:.1f}s (registrado em index_builds).")
+    if failed:
+        logger.error(f"❌ Falharam: {', '.join(r['spec'].name for r in failed)}")
+        # Código de saída != 0: o runner aborta antes do quality gate e da publicação
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
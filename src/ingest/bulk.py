@@ -0,0 +1,170 @@
+"""
+Modo de carga em massa (BULK_LOAD=1).
+
+A etapa 02 cria `<tabela>_staging` como UNLOGGED (cópia da estrutura da
+tabela de produção) e a etapa 04 carrega nelas, com as configurações de
+sessão abaixo. Ao final, cada staging vira LOGGED e todas são trocadas de
+lugar com as tabelas de produção numa única transação: quem lê nunca vê uma
+tabela pela metade, e as views dependentes são recriadas apontando para a
+tabela nova (materialized views, que guardam a referência à tabela antiga,
+são removidas e recriadas com os dados novos na mesma transação).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest import load_manifest, partitioning
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("empresas", "estabelecimentos", "socios")
+STAGING_SUFFIX = "_staging"
+
+
+def staging_name(table: str) -> str:
+    return f"{table}{STAGING_SUFFIX}"
+
+
+def enabled() -> bool:
+    """Bulk não se aplica ao delta, que atualiza as tabelas de produção in-place."""
+    return pipeline_settings.bulk_load and not (pipeline_settings.delta and pipeline_settings.mode == "full")
+
+
+def session_connect_args() -> dict:
+    """Configurações de sessão para as conexões de carga (parâmetro `options` do libpq)."""
+    options = f"-c synchronous_commit=off -c maintenance_work_mem={pipeline_settings.bulk_maintenance_work_mem}"
+    # `options` na conexão substitui PGOPTIONS (ex.: search_path do schema da release)
+    return {"options": f"{os.getenv('PGOPTIONS', '')} {options}".strip()}
+
+
+def create_staging(conn) -> None:
+    """
+    (Re)cria as tabelas de staging UNLOGGED com a estrutura das de produção
+    (particionadas conforme PARTITION_STRATEGY, com partições UNLOGGED).
+    Sem índices: o COPY não os mantém linha a linha; são construídos após a carga.
+    """
+    for table in TABLES:
+        staging = staging_name(table)
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        if partitioning.scheme(table):
+            partitioning.create_partitioned(conn, table, table, staging, unlogged=True)
+        else:
+            conn.execute(text(f"CREATE UNLOGGED TABLE {staging} (LIKE {table} INCLUDING ALL EXCLUDING INDEXES)"))
+        logger.info(f"🧱 Staging UNLOGGED criada: {staging}")
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+@dataclass(frozen=True)
+class DependentView:
+    """View (kind "v") ou materialized view ("m") que lê uma relação: o necessário para recriá-la."""
+    name: str
+    kind: str
+    definition: str
+    # CREATE INDEX da materialized view
+    indexes: tuple[str, ...] = ()
+
+
+def dependent_views(conn, relation: str) -> list[DependentView]:
+    """
+    Views e materialized views que leem `relation`, direta ou indiretamente,
+    na ordem em que podem ser recriadas (cada uma depois das que ela lê).
+    """
+    rows = conn.execute(text("""
+        WITH RECURSIVE deps(oid, depth) AS (
+            SELECT r.ev_class, 1
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.classid = 'pg_rewrite'::regclass
+              AND d.refobjid = CAST(:relation AS regclass)
+              AND r.ev_class <> d.refobjid
+            UNION ALL
+            SELECT r.ev_class, deps.depth + 1
+            FROM deps
+            JOIN pg_depend d ON d.refobjid = deps.oid AND d.classid = 'pg_rewrite'::regclass
+            JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE r.ev_class <> d.refobjid
+        )
+        SELECT v.oid::regclass::text AS name, v.relkind AS kind, pg_get_viewdef(v.oid) AS definition,
+               ARRAY(SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i WHERE i.indrelid = v.oid) AS indexes
+        FROM deps
+        JOIN pg_class v ON v.oid = deps.oid
+        WHERE v.relkind IN ('v', 'm')
+        GROUP BY v.oid
+        ORDER BY max(deps.depth), 1
+    """), {"relation": relation}).all()
+    return [DependentView(row.name, row.kind, row.definition, tuple(row.indexes)) for row in rows]
+
+
+def drop_views(conn, views: list[DependentView]) -> None:
+    """Remove `views` (de dependent_views), das que leem as outras para as lidas."""
+    for view in reversed(views):
+        kind = "MATERIALIZED VIEW" if view.kind == "m" else "VIEW"
+        conn.execute(text(f"DROP {kind} IF EXISTS {view.name}"))
+
+
+def create_views(conn, views: list[DependentView], replace: bool = False) -> None:
+    """Recria `views` na ordem de dependent_views; as materialized views voltam populadas e indexadas."""
+    for view in views:
+        if view.kind == "m":
+            conn.exec_driver_sql(f"CREATE MATERIALIZED VIEW {view.name} AS {view.definition}")
+            for index in view.indexes:
+                conn.exec_driver_sql(index)
+        else:
+            conn.exec_driver_sql(f"CREATE {'OR REPLACE ' if replace else ''}VIEW {view.name} AS {view.definition}")
+
+
+def staged_tables(engine, tables: tuple[str, ...] = TABLES, suffix: str = STAGING_SUFFIX) -> list[str]:
+    """Tabelas com uma cópia `<tabela><suffix>` à espera da troca."""
+    with engine.connect() as conn:
+        return [t for t in tables if _exists(conn, t + suffix)]
+
+
+def swap_in(engine, tables: tuple[str, ...] = TABLES, suffix: str = STAGING_SUFFIX) -> list[str]:
+    """
+    Torna as cópias `<tabela><suffix>` LOGGED (uma transação por tabela, sem
+    bloquear leitores; no-op se já forem) e faz a troca de todas numa única
+    transação. Retorna as tabelas trocadas. Na troca das stagings, o
+    load_manifest passa a apontar para as tabelas de produção.
+    """
+    pending = staged_tables(engine, tables, suffix)
+
+    for table in pending:
+        start = time.time()
+        with engine.begin() as conn:
+            # Particionada: a persistência é de cada partição
+            for leaf in partitioning.leaves(conn, table + suffix):
+                conn.execute(text(f"ALTER TABLE {leaf} SET LOGGED"))
+        logger.info(f"📝 {table + suffix} agora é LOGGED ({time.time() - start:.1f}s).")
+
+    if not pending:
+        return pending
+
+    with engine.begin() as conn:
+        for table in pending:
+            old = f"{table}_old"
+            views = dependent_views(conn, table) if _exists(conn, table) else []
+            # Materialized view não tem OR REPLACE: sai (com as que a leem) e volta sobre a tabela nova
+            rebuilt = any(view.kind == "m" for view in views)
+            if rebuilt:
+                drop_views(conn, views)
+            conn.execute(text(f"DROP TABLE IF EXISTS {old}"))
+            if _exists(conn, table):
+                conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+            conn.execute(text(f"ALTER TABLE {table + suffix} RENAME TO {table}"))
+            # A definição foi lida antes do rename: recriar aponta as views para a tabela nova
+            create_views(conn, views, replace=not rebuilt)
+            conn.execute(text(f"DROP TABLE IF EXISTS {old}"))
+            partitioning.rename_partitions(conn, table, table + suffix)
+            if suffix == STAGING_SUFFIX and _exists(conn, "load_manifest"):
+                load_manifest.retarget(conn.connection.cursor(), table + suffix, table)
+    logger.info(f"🔁 Troca atômica concluída: {', '.join(pending)}.")
+    return pending
@@ -0,0 +1,122 @@
+"""
+Divisão de um CSV grande em faixas de bytes alinhadas a registros.
+
+A fronteira de cada faixa é a primeira quebra de linha, depois do ponto
+alvo, fora de campos entre aspas: a paridade de `"` é acumulada desde o
+início do arquivo (aspas escapadas `""` somam duas, então não alteram a
+paridade). Uma única leitura sequencial, com contagem em C (`bytes.count`).
+"""
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def record_ranges(path: Path, parts: int, block_size: int = BLOCK_SIZE) -> list[tuple[int, int]]:
+    """Divide `path` em até `parts` faixas [início, fim) que começam sempre num registro."""
+    size = path.stat().st_size
+    if parts <= 1 or size == 0:
+        return [(0, size)]
+
+    targets = [size * i // parts for i in range(1, parts)]
+    bounds = [0]
+    quotes = 0
+    offset = 0
+    t = 0
+
+    with open(path, "rb") as f:
+        while t < len(targets):
+            block = f.read(block_size)
+            if not block:
+                break
+            while t < len(targets):
+                search = max(targets[t], bounds[-1]) - offset
+                if search >= len(block):
+                    break
+                found = False
+                while True:
+                    nl = block.find(b"\n", search)
+                    if nl < 0:
+                        break
+                    if (quotes + block.count(b'"', 0, nl)) % 2 == 0:
+                        found = True
+                        break
+                    search = nl + 1
+                if not found:
+                    # A fronteira cai no próximo bloco
+                    targets[t] = offset + len(block)
+                    break
+                boundary = offset + nl + 1
+                if boundary < size:
+                    bounds.append(boundary)
+                t += 1
+            quotes += block.count(b'"')
+            offset += len(block)
+
+    bounds = sorted(set(bounds))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def record_batches(path: Path, max_rows: int, start: int = 0, block_size: int = BLOCK_SIZE,
+                   digest=None) -> Iterator[tuple[int, int]]:
+    """
+    Faixas consecutivas [início, fim) de `path`, a partir de `start` (que deve
+    ser início de registro), com até `max_rows` registros cada. Gerada sob
+    demanda, numa leitura sequencial; se `digest` (hashlib) for passado, recebe
+    todos os bytes lidos.
+    """
+    size = path.stat().st_size
+    batch_start = start
+    rows = 0
+    quotes = 0
+    offset = start
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        while block := f.read(block_size):
+            if digest is not None:
+                digest.update(block)
+            data = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(data == ord("\n"))
+            quote_positions = np.flatnonzero(data == ord('"'))
+            # Fim de registro: quebra de linha com número par de aspas antes dela
+            ends = newlines[(quotes + np.searchsorted(quote_positions, newlines)) % 2 == 0] + offset + 1
+            for i in range(max_rows - rows - 1, len(ends), max_rows):
+                yield batch_start, int(ends[i])
+                batch_start = int(ends[i])
+            rows = (rows + len(ends)) % max_rows
+            quotes += len(quote_positions)
+            offset += len(block)
+
+    if batch_start < size:
+        yield batch_start, size
+
+
+class RangeReader(io.RawIOBase):
+    """Arquivo binário de leitura restrito à faixa [start, end) de `path`."""
+
+    def __init__(self, path: Path, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:min(len(buffer), self._remaining)]
+        n = self._file.readinto(view)
+        self._remaining -= n
+        return n
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
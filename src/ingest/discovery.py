@@ -0,0 +1,164 @@
+"""
+Descoberta de releases no servidor da Receita Federal.
+
+As listagens HTML ficam em cache em disco (CACHE_DIR/listings) junto com
+ETag/Last-Modified; as consultas seguintes usam requisições condicionais,
+então um polling que não encontra nada novo recebe apenas `304 Not Modified`.
+
+Uso avulso (polling agendado):
+    python -m src.ingest.discovery   # exit 0 se há release nova, 1 caso contrário
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from src.paths import CACHE_DIR
+from src.ingest.layout import DOMAIN_PREFIXES
+from src.ingest.http_session import get_session
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj/"
+LISTING_CACHE_DIR = CACHE_DIR / "listings"
+TIMEOUT = 10
+
+FACT_PREFIXES = ("Empresas", "Estabelecimentos", "Socios")
+# Domínios são poucos KB: sempre baixados, inclusive no modo sample
+TARGET_PREFIXES = FACT_PREFIXES + DOMAIN_PREFIXES
+
+_FOLDER_RE = re.compile(r'href="(\d{4}-\d{2})/"')
+_ZIP_RE = re.compile(r'href=["\'](.*?\.zip)["\']', re.IGNORECASE)
+
+
+def _cache_path(url: str) -> Path:
+    return LISTING_CACHE_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def fetch_listing(url: str) -> str | None:
+    """
+    Retorna o HTML da listagem, usando o cache local com requisição condicional.
+    Em falha de rede, devolve a última versão em cache (se houver).
+    """
+    cache_file = _cache_path(url)
+    cached = None
+    if cache_file.exists():
+        try:
+            cached = json.loads(cache_file.read_text(encoding="utf-8"))
+        except ValueError:
+            cached = None
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and cached:
+            logger.debug(f"Listagem sem mudanças (304): {url}")
+            return cached["body"]
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        if cached:
+            logger.warning(f"⚠️  Falha ao consultar {url} ({e}). Usando listagem em cache.")
+            return cached["body"]
+        logger.error(f"❌ Erro de conexão: {e}")
+        return None
+
+    LISTING_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_name(cache_file.name + ".tmp")
+    tmp.write_text(json.dumps({
+        "url": url,
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "body": response.text,
+    }), encoding="utf-8")
+    tmp.replace(cache_file)
+    return response.text
+
+
+def list_folders(base_url: str = BASE_URL) -> list[str]:
+    """Pastas de release (YYYY-MM) ordenadas."""
+    body = fetch_listing(base_url)
+    if body is None:
+        return []
+    return sorted(set(_FOLDER_RE.findall(body)))
+
+
+def list_release_files(folder_url: str, prefixes: tuple[str, ...] = TARGET_PREFIXES) -> list[str]:
+    """Zips de interesse dentro de uma pasta de release."""
+    body = fetch_listing(folder_url)
+    if body is None:
+        return []
+    files = _ZIP_RE.findall(body)
+    return sorted({f for f in files if f.startswith(prefixes)})
+
+
+def select_sample_files(files: list[str], k: int) -> list[str]:
+    """Primeiros `k` arquivos (ordem alfabética) de cada tipo, para o modo sample, mais todos os domínios."""
+    selection = []
+    for prefix in FACT_PREFIXES:
+        selection.extend(sorted(f for f in files if prefix in f)[:k])
+    selection.extend(sorted(f for f in files if f.startswith(DOMAIN_PREFIXES)))
+    return selection
+
+
+def discover_months(months: list[str], base_url: str = BASE_URL, workers: int = 4) -> dict[str, list[str]]:
+    """Lista os arquivos de várias releases em paralelo. Retorna {mês: [arquivos]}."""
+    if not months:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(months)))) as pool:
+        listings = pool.map(lambda m: list_release_files(f"{base_url}{m}/"), months)
+        return dict(zip(months, listings))
+
+
+def latest_release(base_url: str = BASE_URL, lookback: int = 3) -> tuple[str, list[str]]:
+    """
+    Release mais recente com arquivos publicados, considerando os últimos
+    `lookback` meses (pastas vazias/incompletas são ignoradas).
+    Retorna ("", []) se nada for encontrado.
+    """
+    folders = list_folders(base_url)
+    candidates = list(reversed(folders[-lookback:]))
+    found = discover_months(candidates, base_url)
+    for month in candidates:
+        if found.get(month):
+            return month, found[month]
+        logger.warning(f"⚠️  Pasta {month} parece vazia ou incompleta.")
+    return "", []
+
+
+def main() -> None:
+    from src.ingest.download_manifest import MANIFEST_DIR
+    from src.runners.bootstrap import bootstrap
+
+    bootstrap()
+    month, files = latest_release()
+    if not month:
+        logger.error("❌ Nenhuma release disponível encontrada.")
+        sys.exit(1)
+
+    known = sorted(p.stem for p in MANIFEST_DIR.glob("*.json")) if MANIFEST_DIR.exists() else []
+    if known and known[-1] >= month:
+        logger.info(f"⏸️  Nenhuma release nova (mais recente: {month}, local: {known[-1]}).")
+        sys.exit(1)
+
+    logger.info(f"🆕 Release nova disponível: {month} ({len(files)} arquivos).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Tabelas de domínio da RFB: CNAEs, motivos de situação cadastral, municípios,
+naturezas jurídicas, países e qualificações de sócios/responsáveis.
+
+Cada zip de domínio traz um único CSV (latin1, `;`, `"código";"descrição"`)
+de poucos KB. A etapa 03 grava uma cópia UTF-8 de cada um ao lado das demais
+saídas; a etapa 04 substitui o conteúdo das tabelas dim_* a cada carga, numa
+única transação (DELETE + COPY: quem lê as views nunca vê a tabela vazia).
+
+As tabelas fato referenciam os domínios por chaves smallint. Natureza,
+qualificação, país, motivo e município já cabem em smallint: no esquema
+tipado, o próprio código é a chave. O CNAE tem 7 dígitos e recebe uma chave
+substituta (dim_cnae.id), atribuída pelo dicionário persistido em
+`cnae_ids.json`: códigos novos ganham o próximo id e os ids já emitidos não
+mudam entre releases (o MERGE compara as linhas inteiras). Com
+SCHEMA_VARIANT=typed, a extração resolve cnae_fiscal_principal para o id em
+lote, com o dicionário em memória (`CodeDictionary.resolve`).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import zipfile
+from pathlib import Path
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest.layout import DOMAIN_MAPPING, domain_for_member
+
+logger = logging.getLogger(__name__)
+
+# Dicionário código CNAE -> id, ao lado das saídas da extração
+CNAE_IDS_NAME = "cnae_ids.json"
+# Maior id representável em smallint
+MAX_ID = 32767
+
+
+class CodeDictionary:
+    """Códigos (texto) -> chaves substitutas smallint, com resolução vetorizada."""
+
+    def __init__(self, ids: dict[str, int] | None = None):
+        self.ids = dict(ids or {})
+        self._lookup = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path: Path) -> CodeDictionary:
+        if not path.exists():
+            return cls()
+        return cls(json.loads(path.read_text(encoding="utf-8")))
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.ids, indent=0, sort_keys=True), encoding="utf-8")
+        tmp.replace(path)
+
+    def extend(self, codes) -> int:
+        """Atribui ids aos códigos ainda desconhecidos (em ordem); devolve quantos eram novos."""
+        new = sorted(set(codes) - self.ids.keys())
+        next_id = max(self.ids.values(), default=0) + 1
+        if next_id + len(new) - 1 > MAX_ID:
+            raise RuntimeError(f"Dicionário excede o limite de smallint ({MAX_ID} ids).")
+        self.ids.update((code, next_id + i) for i, code in enumerate(new))
+        self._lookup = None
+        return len(new)
+
+    def resolve(self, array):
+        """Coluna de códigos (pyarrow, texto) -> ids int16; código desconhecido vira NULL."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if not self.ids:
+            raise RuntimeError(f"Dicionário vazio ({CNAE_IDS_NAME}): baixe os zips de domínio (Cnaes) antes da extração.")
+        if self._lookup is None:
+            codes = list(self.ids)
+            self._lookup = (pa.array(codes, pa.string()), pa.array([self.ids[c] for c in codes], pa.int16()))
+        value_set, ids = self._lookup
+        return pc.take(ids, pc.index_in(array, value_set=value_set))
+
+
+# Dicionário de CNAEs do processo (nos workers, carregado pelo initializer)
+CNAE = CodeDictionary()
+
+
+def use_dictionary(output_dir: Path) -> None:
+    """Carrega o dicionário de CNAEs salvo em `output_dir`."""
+    global CNAE
+    CNAE = CodeDictionary.load(output_dir / CNAE_IDS_NAME)
+
+
+def read_domain(stream) -> list[tuple[str, str]]:
+    """Pares (código, descrição) de um membro de domínio (stream binário latin1)."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="latin1", errors="replace"), delimiter=";")
+    return [(row[0].strip(), row[1].strip()) for row in reader if len(row) >= 2 and row[0].strip()]
+
+
+def _write_csv(path: Path, rows: list) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, delimiter=";").writerows(rows)
+    tmp.replace(path)
+
+
+def extract(sources: list, output_dir: Path) -> dict[str, int]:
+    """
+    Grava os domínios dos zips em `sources` (caminhos ou streams) em `output_dir`
+    e atualiza o dicionário de CNAEs, que fica carregado em memória.
+    Devolve as linhas por tabela de domínio.
+    """
+    use_dictionary(output_dir)
+    counts = {}
+    for source in sources:
+        with zipfile.ZipFile(source, "r") as zf:
+            for member in zf.infolist():
+                table = domain_for_member(member.filename)
+                if table is None:
+                    continue
+                with zf.open(member) as stream:
+                    rows = read_domain(stream)
+                if table == "dim_cnae":
+                    new = CNAE.extend(code for code, _ in rows)
+                    if new and len(CNAE) > new:
+                        logger.info(f"🆕 {new} CNAEs novos no dicionário.")
+                    rows = [(CNAE.ids[code], code, description) for code, description in rows]
+                _write_csv(output_dir / member.filename, rows)
+                counts[table] = len(rows)
+    if CNAE.ids:
+        CNAE.save(output_dir / CNAE_IDS_NAME)
+    if counts:
+        logger.info(f"📚 Domínios extraídos: {', '.join(f'{t} ({n})' for t, n in sorted(counts.items()))}.")
+    missing = sorted(set(DOMAIN_MAPPING.values()) - counts.keys())
+    if missing:
+        logger.warning(f"⚠️ Domínios sem arquivo nesta extração: {', '.join(missing)}.")
+    return counts
+
+
+def _code_type(typed: bool) -> str:
+    # Esquema texto: os códigos das tabelas fato são VARCHAR com zeros à esquerda
+    return "SMALLINT" if typed else "VARCHAR(7)"
+
+
+def ddl(typed: bool | None = None) -> list[str]:
+    """CREATE TABLE das tabelas de domínio, com o tipo de código do esquema em uso."""
+    typed = pipeline_settings.schema_variant == "typed" if typed is None else typed
+    code = _code_type(typed)
+    statements = [
+        f"""
+        CREATE TABLE IF NOT EXISTS dim_cnae (
+            id SMALLINT PRIMARY KEY,
+            codigo {'INTEGER' if typed else 'VARCHAR(7)'} NOT NULL UNIQUE,
+            descricao TEXT,
+            -- Valor gravado nas tabelas fato: o id (esquema tipado) ou o código (esquema texto)
+            chave {code} GENERATED ALWAYS AS ({'id' if typed else 'codigo'}) STORED
+        )
+        """
+    ]
+    for table in sorted(set(DOMAIN_MAPPING.values()) - {"dim_cnae"}):
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} (codigo {code} PRIMARY KEY, descricao TEXT)")
+    return statements
+
+
+def create_tables(conn, replace: bool = False) -> None:
+    """Cria as tabelas de domínio; com `replace`, recria (troca de SCHEMA_VARIANT)."""
+    if replace:
+        for table in sorted(DOMAIN_MAPPING.values()):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    for statement in ddl():
+        conn.execute(text(statement))
+
+
+def domain_files(data_dir: Path) -> dict[str, Path]:
+    """Saídas de domínio da etapa 03 em `data_dir`, por tabela."""
+    files = {}
+    for path in sorted(data_dir.iterdir()):
+        table = domain_for_member(path.name)
+        if table and path.is_file() and not path.name.endswith(".tmp"):
+            files[table] = path
+    return files
+
+
+def load(engine, data_dir: Path) -> dict[str, int]:
+    """Substitui o conteúdo das tabelas de domínio pelas saídas em `data_dir` (uma transação)."""
+    files = domain_files(data_dir)
+    if not files:
+        logger.warning(f"⚠️ Nenhuma tabela de domínio em {data_dir}: dim_* mantidas como estão.")
+        return {}
+    counts = {}
+    with engine.begin() as conn:
+        create_tables(conn)
+        cursor = conn.connection.cursor()
+        for table, path in files.items():
+            columns = "id, codigo, descricao" if table == "dim_cnae" else "codigo, descricao"
+            cursor.execute(f"DELETE FROM {table}")
+            with open(path, "rb") as f:
+                cursor.copy_expert(
+                    f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT CSV, DELIMITER ';', ENCODING 'UTF8', NULL '')", f
+                )
+            counts[table] = cursor.rowcount
+    logger.info(f"📚 Domínios carregados: {', '.join(f'{t} ({n})' for t, n in counts.items())}.")
+    return counts
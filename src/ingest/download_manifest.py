@@ -0,0 +1,131 @@
+"""
+Manifesto de downloads por release (RAW_DIR/manifests/<YYYY-MM>.json).
+
+Registra, para cada zip baixado, o tamanho, ETag/Last-Modified do servidor e o
+SHA-256 calculado no download. É a fonte de verdade para decidir se um
+arquivo em RAW_DIR está íntegro ou precisa ser baixado de novo.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.paths import RAW_DIR
+from src.ingest.downloader import DownloadResult, RemoteInfo, file_sha256
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_DIR = RAW_DIR / "manifests"
+
+
+@dataclass
+class FileEntry:
+    filename: str
+    size: int
+    sha256: str
+    etag: str | None = None
+    last_modified: str | None = None
+    mtime_ns: int = 0
+    downloaded_at: str = ""
+
+
+class DownloadManifest:
+    def __init__(self, release: str, files: dict[str, FileEntry] | None = None):
+        self.release = release
+        self.files = files or {}
+
+    @property
+    def path(self) -> Path:
+        return MANIFEST_DIR / f"{self.release}.json"
+
+    @classmethod
+    def load(cls, release: str) -> "DownloadManifest":
+        manifest = cls(release)
+        if manifest.path.exists():
+            data = json.loads(manifest.path.read_text(encoding="utf-8"))
+            manifest.files = {name: FileEntry(**entry) for name, entry in data["files"].items()}
+        return manifest
+
+    def save(self) -> None:
+        """Escrita atômica (tmp + rename) para não corromper o manifesto num crash."""
+        MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "release": self.release,
+            "files": {name: asdict(entry) for name, entry in sorted(self.files.items())},
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def record(self, result: DownloadResult) -> FileEntry:
+        entry = FileEntry(
+            filename=result.filename,
+            size=result.size,
+            sha256=result.sha256,
+            etag=result.etag,
+            last_modified=result.last_modified,
+            mtime_ns=result.path.stat().st_mtime_ns,
+            downloaded_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        self.files[result.filename] = entry
+        self.save()
+        return entry
+
+
+def has_any_manifest() -> bool:
+    return MANIFEST_DIR.exists() and any(MANIFEST_DIR.glob("*.json"))
+
+
+def verify_local(
+    manifest: DownloadManifest,
+    path: Path,
+    remote: RemoteInfo,
+    full: bool = False,
+) -> tuple[bool, str]:
+    """
+    Decide se o arquivo local é válido para a release do manifesto.
+    Retorna (valido, motivo). Tamanho é sempre conferido; o SHA-256 é
+    recalculado quando o arquivo foi tocado desde o download (mtime) ou se `full`.
+    """
+    if not path.exists():
+        return False, "ausente"
+
+    stat = path.stat()
+    entry = manifest.files.get(path.name)
+
+    if entry is None:
+        if has_any_manifest():
+            # Arquivo de outra release (ou de um download não registrado)
+            return False, "não consta no manifesto desta release"
+        if remote.size and stat.st_size == remote.size:
+            # Instalação antiga, anterior ao manifesto: adota se o tamanho bate
+            manifest.files[path.name] = FileEntry(
+                filename=path.name,
+                size=stat.st_size,
+                sha256=file_sha256(path),
+                etag=remote.etag,
+                last_modified=remote.last_modified,
+                mtime_ns=stat.st_mtime_ns,
+                downloaded_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            )
+            manifest.save()
+            return True, "adotado (tamanho confere)"
+        return False, "sem manifesto e tamanho divergente"
+
+    if stat.st_size != entry.size:
+        return False, f"tamanho {stat.st_size} != {entry.size}"
+    if remote.size and remote.size != entry.size:
+        return False, "tamanho remoto mudou"
+    if remote.etag and entry.etag and remote.etag != entry.etag:
+        return False, "ETag remoto mudou"
+
+    if full or stat.st_mtime_ns != entry.mtime_ns:
+        if file_sha256(path) != entry.sha256:
+            return False, "checksum divergente"
+        entry.mtime_ns = stat.st_mtime_ns
+        manifest.save()
+
+    return True, "íntegro"
@@ -0,0 +1,321 @@
+"""
+Motor de download paralelo e retomável para os zips da Receita Federal.
+
+Cada arquivo é baixado para `<nome>.part` e só é renomeado para o nome final
+quando completo. Se o servidor aceita `Range`, o arquivo é dividido em
+segmentos baixados em paralelo; o progresso de cada segmento fica em
+`<nome>.part.json`, permitindo retomar exatamente de onde parou.
+Todo download concluído retorna o SHA-256 do conteúdo para o manifesto.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+from tqdm import tqdm
+
+from src.ingest.http_session import get_session
+
+logger = logging.getLogger(__name__)
+
+# Buffer de escrita: blocos grandes reduzem syscalls e seeks em HD externo
+CHUNK_SIZE = 1024 * 1024
+# Segmentos menores que isso não compensam a conexão extra
+MIN_SEGMENT_SIZE = 32 * 1024 * 1024
+# Frequência (em bytes por segmento) de persistência do estado do .part
+STATE_FLUSH_BYTES = 16 * 1024 * 1024
+TIMEOUT = (10, 60)
+
+_BAR_LOCK = threading.Lock()
+
+
+class RangeNotSupported(Exception):
+    """O servidor respondeu 200 a um pedido com `Range`."""
+
+
+@dataclass
+class RemoteInfo:
+    size: int
+    accepts_ranges: bool
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+@dataclass
+class DownloadResult:
+    filename: str
+    path: Path
+    ok: bool
+    size: int = 0
+    error: str | None = None
+    sha256: str | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+def part_path_for(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".part")
+
+
+def state_path_for(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".part.json")
+
+
+def probe(session: requests.Session, url: str) -> RemoteInfo:
+    """Metadados remotos via HEAD. Tamanho 0 = desconhecido."""
+    response = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+    response.raise_for_status()
+    return RemoteInfo(
+        size=int(response.headers.get("content-length", 0) or 0),
+        accepts_ranges=response.headers.get("accept-ranges", "").lower() == "bytes",
+        etag=response.headers.get("etag"),
+        last_modified=response.headers.get("last-modified"),
+    )
+
+
+def file_sha256(path: Path, hasher=None) -> str:
+    """SHA-256 de um arquivo lido em blocos grandes."""
+    hasher = hasher or hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(CHUNK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _plan_segments(size: int, segments: int) -> list[list[int]]:
+    """Divide [0, size) em segmentos [inicio, fim_inclusivo, baixados]."""
+    count = max(1, min(segments, math.ceil(size / MIN_SEGMENT_SIZE)))
+    step = math.ceil(size / count)
+    return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+
+class _SegmentState:
+    """Estado dos segmentos de um .part, persistido em JSON ao lado do arquivo."""
+
+    def __init__(self, path: Path, size: int, etag: str | None, segments: list[list[int]]):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.segments = segments
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path, remote: RemoteInfo) -> "_SegmentState | None":
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("size") != remote.size or data.get("etag") != remote.etag:
+            # Arquivo remoto mudou: o .part não serve mais
+            return None
+        return cls(path, remote.size, remote.etag, data["segments"])
+
+    def save(self) -> None:
+        with self.lock:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            payload = {"size": self.size, "etag": self.etag, "segments": self.segments}
+            tmp.write_text(json.dumps(payload), encoding="utf-8")
+            tmp.replace(self.path)
+
+
+def _fetch_segment(session, url: str, part: Path, segment: list[int], state: _SegmentState, bar) -> None:
+    start, end, _ = segment
+    if start + segment[2] > end:
+        return
+
+    headers = {"Range": f"bytes={start + segment[2]}-{end}"}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeNotSupported(url)
+
+        unflushed = 0
+        with open(part, "r+b") as f:
+            f.seek(start + segment[2])
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                segment[2] += len(chunk)
+                unflushed += len(chunk)
+                bar.update(len(chunk))
+                if unflushed >= STATE_FLUSH_BYTES:
+                    # Dados primeiro, estado depois: no pior caso rebaixamos um pedaço
+                    f.flush()
+                    state.save()
+                    unflushed = 0
+            f.flush()
+    state.save()
+
+    if start + segment[2] <= end:
+        raise IOError(f"Segmento {start}-{end} incompleto ({segment[2]} bytes recebidos)")
+
+
+def _download_segmented(session, url: str, output_path: Path, remote: RemoteInfo, segments: int, bar) -> None:
+    part = part_path_for(output_path)
+    state_path = state_path_for(output_path)
+
+    state = _SegmentState.load(state_path, remote) if part.exists() else None
+    if state is None:
+        state = _SegmentState(state_path, remote.size, remote.etag, _plan_segments(remote.size, segments))
+        with open(part, "wb") as f:
+            f.truncate(remote.size)
+        state.save()
+    else:
+        resumed = sum(s[2] for s in state.segments)
+        logger.info(f"♻️  Retomando {output_path.name} a partir de {resumed / 1024**2:.1f} MiB")
+        bar.update(resumed)
+
+    with ThreadPoolExecutor(max_workers=len(state.segments)) as pool:
+        futures = [
+            pool.submit(_fetch_segment, session, url, part, seg, state, bar)
+            for seg in state.segments
+        ]
+        for future in futures:
+            future.result()
+
+
+def _download_single(session, url: str, output_path: Path, remote: RemoteInfo, bar) -> str:
+    """
+    Download em um único stream, retomando do tamanho atual do .part quando possível.
+    O SHA-256 é calculado durante o stream (o prefixo retomado é relido uma vez).
+    """
+    part = part_path_for(output_path)
+    if state_path_for(output_path).exists():
+        # .part pré-alocado por um download segmentado: o tamanho não indica progresso
+        state_path_for(output_path).unlink()
+        part.unlink(missing_ok=True)
+    offset = part.stat().st_size if part.exists() and remote.accepts_ranges else 0
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if remote.etag:
+            # Se o arquivo remoto mudou, o servidor responde 200 com o conteúdo completo
+            headers["If-Range"] = remote.etag
+
+    hasher = hashlib.sha256()
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0
+        if offset:
+            logger.info(f"♻️  Retomando {output_path.name} a partir de {offset / 1024**2:.1f} MiB")
+            file_sha256(part, hasher)
+            bar.update(offset)
+
+        with open(part, "ab" if offset else "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    bar.update(len(chunk))
+    return hasher.hexdigest()
+
+
+def download_file(
+    url: str,
+    output_path: Path,
+    session: requests.Session | None = None,
+    segments: int = 4,
+    bar=None,
+) -> DownloadResult:
+    """
+    Baixa `url` para `output_path` de forma retomável.
+    Usa segmentos `Range` paralelos quando o servidor permite.
+    O arquivo final só aparece (rename atômico) depois de completo.
+    """
+    session = session or get_session()
+    remote = probe(session, url)
+    size = remote.size
+
+    own_bar = bar is None
+    if own_bar:
+        bar = tqdm(desc=output_path.name, total=size, unit="B", unit_scale=True, unit_divisor=1024)
+    else:
+        with _BAR_LOCK:
+            bar.total += size
+            bar.refresh()
+
+    try:
+        digest = None
+        if size and remote.accepts_ranges and segments > 1:
+            try:
+                _download_segmented(session, url, output_path, remote, segments, bar)
+            except RangeNotSupported:
+                logger.warning(f"⚠️  Servidor ignorou Range para {output_path.name}. Usando stream único.")
+                state_path_for(output_path).unlink(missing_ok=True)
+                part_path_for(output_path).unlink(missing_ok=True)
+                remote.accepts_ranges = False
+                digest = _download_single(session, url, output_path, remote, bar)
+        else:
+            digest = _download_single(session, url, output_path, remote, bar)
+    finally:
+        if own_bar:
+            bar.close()
+
+    part = part_path_for(output_path)
+    if size and part.stat().st_size != size:
+        raise IOError(f"Tamanho final divergente: {part.stat().st_size} != {size}")
+
+    if digest is None:
+        # Segmentos chegam fora de ordem: o hash é feito numa leitura sequencial do .part
+        digest = file_sha256(part)
+
+    part.replace(output_path)
+    state_path_for(output_path).unlink(missing_ok=True)
+    return DownloadResult(
+        output_path.name,
+        output_path,
+        True,
+        size=output_path.stat().st_size,
+        sha256=digest,
+        etag=remote.etag,
+        last_modified=remote.last_modified,
+    )
+
+
+def download_many(
+    jobs: list[tuple[str, Path]],
+    workers: int = 4,
+    segments: int = 4,
+    session: requests.Session | None = None,
+    on_complete=None,
+) -> list[DownloadResult]:
+    """
+    Baixa vários arquivos com um pool limitado de `workers` arquivos simultâneos,
+    cada um dividido em até `segments` conexões.
+    Falhas não interrompem os demais; o `.part` é mantido para retomada.
+    `on_complete(result)` é chamado na thread principal a cada arquivo concluído.
+    """
+    session = session or get_session()
+    results: list[DownloadResult] = []
+
+    with tqdm(desc="Download", total=0, unit="B", unit_scale=True, unit_divisor=1024) as bar:
+
+        def _run(url: str, path: Path) -> DownloadResult:
+            return download_file(url, path, session=session, segments=segments, bar=bar)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(_run, url, path): (url, path) for url, path in jobs}
+            for future in as_completed(futures):
+                _, path = futures[future]
+                try:
+                    result = future.result()
+                    logger.info(f"✅ {path.name} concluído ({result.size / 1024**2:.1f} MiB)")
+                except Exception as e:
+                    result = DownloadResult(path.name, path, False, error=str(e))
+                    logger.error(f"❌ Erro em {path.name}: {e} (parcial mantido para retomada)")
+                results.append(result)
+                if result.ok and on_complete:
+                    on_complete(result)
+
+    return results
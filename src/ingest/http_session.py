@@ -0,0 +1,44 @@
+"""
+Sessão HTTP compartilhada (pool de conexões + retries com backoff) para
+todas as chamadas ao servidor da Receita Federal.
+"""
+from __future__ import annotations
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.config import pipeline_settings
+
+_SESSION: requests.Session | None = None
+_LOCK = threading.Lock()
+
+
+def build_session(pool_size: int = 10) -> requests.Session:
+    """Sessão com keep-alive, pool dimensionado e retry exponencial em falhas transitórias."""
+    retry = Retry(
+        total=5,
+        connect=5,
+        read=3,
+        backoff_factor=1.0,  # 1s, 2s, 4s, ...
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("HEAD", "GET"),
+        respect_retry_after_header=True,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Sessão única do processo, criada sob demanda."""
+    global _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            pool_size = max(10, pipeline_settings.download_workers * pipeline_settings.download_segments)
+            _SESSION = build_session(pool_size)
+        return _SESSION
@@ -0,0 +1,164 @@
+"""
+Índices e restrições declarados das tabelas fato, construídos depois da carga
+(etapa 05, src/ingest/05_build_indexes.py).
+
+As tabelas são criadas e carregadas sem índices: o COPY nunca mantém índice
+linha a linha. Ao fim da carga, cada índice de SPEC é construído de uma vez
+(ordenação única, com os workers de manutenção paralela do PostgreSQL), as
+tabelas em paralelo em conexões separadas e, dentro de uma tabela, em
+sequência. Cada construção fica registrada em `index_builds` e nas métricas
+da execução (etapa "index").
+
+Chave primária em tabela simples: CREATE UNIQUE INDEX + ADD PRIMARY KEY USING
+INDEX (o lock exclusivo dura só a troca). Em tabela particionada, a chave só
+é possível se incluir a coluna de partição; caso contrário, o índice é
+criado sem unicidade.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest import metrics, partitioning
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """Um índice (ou chave primária) declarado para uma tabela."""
+    table: str
+    name: str
+    columns: tuple[str, ...]
+    primary: bool = False
+    method: str = "btree"
+    # Só neste SCHEMA_VARIANT (None = ambos)
+    variant: str | None = None
+
+
+SPEC = (
+    IndexSpec("empresas", "empresas_pkey", ("cnpj_basico",), primary=True),
+    IndexSpec("estabelecimentos", "estabelecimentos_pkey", ("cnpj_basico", "cnpj_ordem", "cnpj_dv"), primary=True),
+    # Socios -> empresas: a busca dos sócios de uma empresa (e o join de órfãos) usa cnpj_basico
+    IndexSpec("socios", "socios_cnpj_basico_idx", ("cnpj_basico",)),
+    # CNAEs (ver src/ingest/secondary_cnae.py): no esquema texto, a busca vai para estabelecimento_cnae
+    IndexSpec("estabelecimentos", "estabelecimentos_cnae_principal_idx", ("cnae_fiscal_principal",), variant="typed"),
+    IndexSpec("estabelecimentos", "estabelecimentos_cnae_secundaria_gin", ("cnae_fiscal_secundaria",), method="gin", variant="typed"),
+)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS index_builds (
+    release TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    index_name TEXT NOT NULL,
+    ok BOOLEAN NOT NULL,
+    seconds DOUBLE PRECISION NOT NULL,
+    error TEXT,
+    built_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+
+def declared(tables=None) -> list[IndexSpec]:
+    """Índices de SPEC que valem no SCHEMA_VARIANT ativo (opcionalmente só de `tables`)."""
+    variant = pipeline_settings.schema_variant
+    return [spec for spec in SPEC
+            if spec.variant in (None, variant) and (tables is None or spec.table in tables)]
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def build(conn, spec: IndexSpec) -> str:
+    """Constrói `spec` na transação de `conn`. Retorna o que foi criado."""
+    columns = ", ".join(spec.columns)
+    if spec.primary and partitioning.is_partitioned(conn, spec.table):
+        _, column = partitioning.scheme(spec.table) or (None, None)
+        if column in spec.columns:
+            conn.execute(text(f"ALTER TABLE {spec.table} ADD CONSTRAINT {spec.name} PRIMARY KEY ({columns})"))
+            return "chave primária"
+        logger.warning(f"⚠️ {spec.table} é particionada por {column}: {spec.name} vira índice sem unicidade.")
+        conn.execute(text(f"CREATE INDEX {spec.name} ON {spec.table} ({columns})"))
+        return "índice"
+    if spec.primary:
+        conn.execute(text(f"CREATE UNIQUE INDEX {spec.name} ON {spec.table} ({columns})"))
+        conn.execute(text(f"ALTER TABLE {spec.table} ADD CONSTRAINT {spec.name} PRIMARY KEY USING INDEX {spec.name}"))
+        return "chave primária"
+    conn.execute(text(f"CREATE INDEX {spec.name} ON {spec.table} USING {spec.method} ({columns})"))
+    return "índice"
+
+
+def _build_table(engine, specs: list[IndexSpec]) -> list[dict]:
+    """Índices de uma tabela, em sequência, numa conexão própria."""
+    results = []
+    for spec in specs:
+        start = time.time()
+        try:
+            with engine.begin() as conn:
+                if not _exists(conn, spec.table) or _exists(conn, spec.name):
+                    continue
+                # Paralelismo e memória só desta construção
+                conn.execute(text(f"SET LOCAL max_parallel_maintenance_workers = {pipeline_settings.index_parallel_workers}"))
+                conn.execute(text(f"SET LOCAL maintenance_work_mem = '{pipeline_settings.bulk_maintenance_work_mem}'"))
+                kind = build(conn, spec)
+            seconds = time.time() - start
+            logger.info(f"🧭 {spec.table}: {kind} {spec.name} ({', '.join(spec.columns)}) em {seconds:.1f}s.")
+            results.append({"spec": spec, "ok": True, "seconds": seconds, "error": None, "finished_at": time.time()})
+        except Exception as e:
+            # Ex.: chave duplicada na origem; os demais índices seguem
+            error = " ".join(line.strip() for line in str(getattr(e, "orig", e)).strip().splitlines())
+            logger.error(f"❌ {spec.table}: {spec.name} falhou: {error}")
+            results.append({"spec": spec, "ok": False, "seconds": time.time() - start, "error": error,
+                            "finished_at": time.time()})
+    return results
+
+
+def build_all(engine, release: str, tables=None, workers: int | None = None) -> list[dict]:
+    """Constrói os índices declarados que faltam, uma conexão por tabela; registra as durações."""
+    by_table: dict[str, list[IndexSpec]] = {}
+    for spec in declared(tables):
+        by_table.setdefault(spec.table, []).append(spec)
+    workers = max(1, min(workers or pipeline_settings.index_workers, len(by_table) or 1))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [r for group in pool.map(lambda specs: _build_table(engine, specs), by_table.values()) for r in group]
+
+    if results:
+        with engine.begin() as conn:
+            conn.execute(text(DDL))
+            conn.execute(text("""
+                INSERT INTO index_builds (release, table_name, index_name, ok, seconds, error)
+                VALUES (:release, :table, :name, :ok, :seconds, :error)
+            """), [{"release": release, "table": r["spec"].table, "name": r["spec"].name, "ok": r["ok"],
+                    "seconds": r["seconds"], "error": r["error"]} for r in results])
+        metrics.record("index", [
+            {"file": r["spec"].name, "table": r["spec"].table, "ok": r["ok"], "seconds": r["seconds"],
+             "finished_at": r["finished_at"]}
+            for r in results
+        ])
+    return results
+
+
+def drop_declared(engine, tables) -> list[str]:
+    """
+    Remove os índices declarados de `tables` antes de uma carga completa (a
+    etapa 05 os reconstrói): o COPY não mantém índice linha a linha.
+    """
+    dropped = []
+    with engine.begin() as conn:
+        for spec in declared(tables):
+            if not _exists(conn, spec.name):
+                continue
+            if spec.primary:
+                conn.execute(text(f"ALTER TABLE {spec.table} DROP CONSTRAINT IF EXISTS {spec.name}"))
+            conn.execute(text(f"DROP INDEX IF EXISTS {spec.name}"))
+            dropped.append(spec.name)
+    if dropped:
+        logger.info(f"🧹 Índices removidos antes da carga (reconstruídos na etapa 05): {', '.join(dropped)}.")
+    return dropped
@@ -0,0 +1,95 @@
+"""
+Índice compacto de chaves `cnpj_basico`.
+
+`cnpj_basico` é um número de 8 dígitos, então o conjunto de empresas cabe em
+um bitmap de 10^8 bits (~12 MB), independente de quantas empresas existam.
+Testes de pertinência e inserções são vetorizados (numpy) e o índice pode ser
+salvo em disco e reaberto via memory-map, compartilhado somente-leitura
+entre processos.
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+KEY_SPACE = 10 ** 8
+KEY_LENGTH = 8
+
+# Popcount por byte, para contar as chaves sem desempacotar o bitmap
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def keys_to_ints(keys: Iterable[str] | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converte chaves texto ('00012345') em uint32.
+    Retorna (inteiros, máscara_de_válidos); chaves malformadas ficam com máscara False.
+    """
+    arr = np.asarray(keys if isinstance(keys, np.ndarray) else list(keys), dtype=f"U{KEY_LENGTH + 1}")
+    valid = (np.char.str_len(arr) == KEY_LENGTH) & np.char.isdigit(arr)
+    ints = np.zeros(arr.shape[0], dtype=np.uint32)
+    if valid.any():
+        ints[valid] = arr[valid].astype(np.uint32)
+    return ints, valid
+
+
+class KeyIndex:
+    """Bitmap de 10^8 posições; bit ligado = cnpj_basico presente."""
+
+    def __init__(self, bits: np.ndarray | None = None):
+        self.bits = bits if bits is not None else np.zeros(KEY_SPACE // 8, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return int(_POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.contains_many([key])[0])
+
+    def add_ints(self, ints: np.ndarray) -> None:
+        ints = np.asarray(ints, dtype=np.uint32)
+        np.bitwise_or.at(self.bits, ints >> 3, (1 << (ints & 7)).astype(np.uint8))
+
+    def add_many(self, keys: Iterable[str] | np.ndarray) -> None:
+        ints, valid = keys_to_ints(keys)
+        self.add_ints(ints[valid])
+
+    def contains_ints(self, ints: np.ndarray) -> np.ndarray:
+        ints = np.asarray(ints, dtype=np.uint32)
+        return ((self.bits[ints >> 3] >> (ints & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def contains_many(self, keys: Iterable[str] | np.ndarray) -> np.ndarray:
+        """Máscara booleana de pertinência, na mesma ordem de `keys`."""
+        ints, valid = keys_to_ints(keys)
+        result = np.zeros(ints.shape[0], dtype=bool)
+        result[valid] = self.contains_ints(ints[valid])
+        return result
+
+    def update(self, other: "KeyIndex") -> None:
+        """União in-place com outro índice."""
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+
+    def clear(self) -> None:
+        self.bits = np.zeros(KEY_SPACE // 8, dtype=np.uint8)
+
+    def save(self, path: Path, sources: list[str] | None = None) -> None:
+        """Grava o bitmap (.npy) e, ao lado, os metadados das fontes que o geraram."""
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.bits)
+        tmp.replace(path)
+        meta = {"sources": sorted(sources or []), "count": len(self)}
+        path.with_suffix(".json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "KeyIndex":
+        """Abre um índice salvo; com `mmap`, as páginas são compartilhadas entre processos."""
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    @staticmethod
+    def saved_sources(path: Path) -> list[str] | None:
+        meta = path.with_suffix(".json")
+        if not path.exists() or not meta.exists():
+            return None
+        return json.loads(meta.read_text(encoding="utf-8")).get("sources")
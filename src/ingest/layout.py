@@ -0,0 +1,86 @@
+"""
+Layout dos arquivos da RFB: sufixo do membro -> tabela e colunas na ordem do CSV oficial.
+Espelha sql/create_tables.sql (e sql/create_tables_typed.sql em TYPED_COLUMNS).
+"""
+from __future__ import annotations
+
+# Mapeamento de sufixos de arquivo para tabelas
+TABLE_MAPPING = {
+    "EMPRECSV": "empresas",
+    "ESTABELE": "estabelecimentos",
+    "SOCIOCSV": "socios"
+}
+
+# Tabelas de domínio (código -> descrição), publicadas em zips próprios
+DOMAIN_PREFIXES = ("Cnaes", "Motivos", "Municipios", "Naturezas", "Paises", "Qualificacoes")
+DOMAIN_MAPPING = {
+    "CNAECSV": "dim_cnae",
+    "MOTICSV": "dim_motivo",
+    "MUNICCSV": "dim_municipio",
+    "NATJUCSV": "dim_natureza",
+    "PAISCSV": "dim_pais",
+    "QUALSCSV": "dim_qualificacao",
+}
+
+TABLE_COLUMNS = {
+    "empresas": [
+        "cnpj_basico", "razao_social", "natureza_juridica", "qualificacao_responsavel",
+        "capital_social", "porte_empresa", "ente_federativo_responsavel",
+    ],
+    "estabelecimentos": [
+        "cnpj_basico", "cnpj_ordem", "cnpj_dv", "identificador_matriz_filial", "nome_fantasia",
+        "situacao_cadastral", "data_situacao_cadastral", "motivo_situacao_cadastral",
+        "nome_cidade_exterior", "pais", "data_inicio_atividade", "cnae_fiscal_principal",
+        "cnae_fiscal_secundaria", "tipo_logradouro", "logradouro", "numero", "complemento",
+        "bairro", "cep", "uf", "municipio", "ddd_1", "telefone_1", "ddd_2", "telefone_2",
+        "ddd_fax", "fax", "correio_eletronico", "situacao_especial", "data_situacao_especial",
+    ],
+    "socios": [
+        "cnpj_basico", "identificador_socio", "nome_socio_razao_social", "cpf_cnpj_socio",
+        "qualificacao_socio", "data_entrada_sociedade", "pais", "representante_legal",
+        "nome_representante", "qualificacao_representante_legal", "faixa_etaria",
+    ],
+}
+
+# Colunas de baixa cardinalidade: dictionary encoding nos formatos colunares
+DICTIONARY_COLUMNS = {
+    "empresas": ["porte_empresa"],
+    "estabelecimentos": ["situacao_cadastral", "uf"],
+    "socios": ["qualificacao_socio"],
+}
+
+# Tipos das colunas não-texto no esquema tipado (sql/create_tables_typed.sql).
+# "cnae": chave substituta smallint de dim_cnae (ver src/ingest/domains.py); "cnae[]": array delas
+TYPED_COLUMNS = {
+    "empresas": {
+        "cnpj_basico": "int4", "natureza_juridica": "int2", "qualificacao_responsavel": "int2",
+        "capital_social": "numeric", "porte_empresa": "int2",
+    },
+    "estabelecimentos": {
+        "cnpj_basico": "int4", "cnpj_ordem": "int2", "cnpj_dv": "int2", "identificador_matriz_filial": "int2",
+        "situacao_cadastral": "int2", "data_situacao_cadastral": "date", "motivo_situacao_cadastral": "int2",
+        "pais": "int2", "data_inicio_atividade": "date", "cnae_fiscal_principal": "cnae",
+        "cnae_fiscal_secundaria": "cnae[]", "municipio": "int2", "data_situacao_especial": "date",
+    },
+    "socios": {
+        "cnpj_basico": "int4", "identificador_socio": "int2", "qualificacao_socio": "int2",
+        "data_entrada_sociedade": "date", "pais": "int2", "qualificacao_representante_legal": "int2",
+        "faixa_etaria": "int2",
+    },
+}
+
+
+def table_for_member(name: str) -> str | None:
+    """Tabela de destino de um membro de zip (ou de uma saída derivada dele)."""
+    for suffix, table in TABLE_MAPPING.items():
+        if name.endswith(suffix) or f"{suffix}." in name:
+            return table
+    return None
+
+
+def domain_for_member(name: str) -> str | None:
+    """Tabela de domínio de um membro de zip (ou da saída derivada dele)."""
+    for suffix, table in DOMAIN_MAPPING.items():
+        if name.endswith(suffix) or f"{suffix}." in name:
+            return table
+    return None
@@ -0,0 +1,144 @@
+"""
+Manifesto de carga no banco (tabela `load_manifest`).
+
+Uma linha por (release, arquivo de origem) com tabela de destino, bytes,
+linhas, checksum, duração, status e o offset (em bytes) já confirmado. A
+etapa 04 atualiza o offset na MESMA transação de cada lote do COPY: o que o
+manifesto diz estar carregado é exatamente o que está nas tabelas. Uma carga
+interrompida retoma do último offset confirmado, e uma segunda execução
+sobre a mesma release não tem nada a fazer.
+
+Um arquivo carregado em grupos paralelos fica `partial` enquanto os commits
+dos grupos acontecem (e se algum falhar no meio): parte das linhas já está
+na tabela, e ele não é recarregado por cima.
+
+Quando a etapa 02 recria as tabelas, as linhas correspondentes passam a
+`dropped` (o histórico fica; os dados, não).
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+from src.ingest.download_manifest import MANIFEST_DIR
+
+LOADING = "loading"
+DONE = "done"
+FAILED = "failed"
+PARTIAL = "partial"
+DROPPED = "dropped"
+
+DDL = """
+CREATE TABLE IF NOT EXISTS load_manifest (
+    release TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    target_table TEXT NOT NULL,
+    bytes BIGINT NOT NULL,
+    rows BIGINT NOT NULL DEFAULT 0,
+    committed_offset BIGINT NOT NULL DEFAULT 0,
+    checksum TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    duration_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    PRIMARY KEY (release, source_file)
+)
+"""
+
+
+@dataclass
+class ManifestEntry:
+    release: str
+    source_file: str
+    target_table: str
+    bytes: int
+    rows: int
+    committed_offset: int
+    checksum: str | None
+    status: str
+
+
+def current_release() -> str:
+    """Release da carga: PIPELINE_RELEASE, ou a do manifesto de download mais recente."""
+    release = os.getenv("PIPELINE_RELEASE")
+    if release:
+        return release
+    manifests = sorted(MANIFEST_DIR.glob("*.json")) if MANIFEST_DIR.exists() else []
+    return manifests[-1].stem if manifests else "local"
+
+
+def ensure_table(cursor) -> None:
+    cursor.execute(DDL)
+
+
+def get(cursor, release: str, source_file: str) -> ManifestEntry | None:
+    cursor.execute("""
+        SELECT release, source_file, target_table, bytes, rows, committed_offset, checksum, status
+        FROM load_manifest WHERE release = %s AND source_file = %s
+    """, (release, source_file))
+    row = cursor.fetchone()
+    return ManifestEntry(*row) if row else None
+
+
+def begin(cursor, release: str, source_file: str, table: str, size: int, resume: bool) -> None:
+    """Registra o início (ou a retomada, se `resume`) da carga de um arquivo."""
+    cursor.execute("""
+        INSERT INTO load_manifest (release, source_file, target_table, bytes, status)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (release, source_file) DO UPDATE SET
+            target_table = EXCLUDED.target_table,
+            bytes = EXCLUDED.bytes,
+            status = EXCLUDED.status,
+            error = NULL,
+            checksum = NULL,
+            finished_at = NULL,
+            rows = CASE WHEN %s THEN load_manifest.rows ELSE 0 END,
+            committed_offset = CASE WHEN %s THEN load_manifest.committed_offset ELSE 0 END,
+            duration_seconds = CASE WHEN %s THEN load_manifest.duration_seconds ELSE 0 END,
+            started_at = CASE WHEN %s THEN load_manifest.started_at ELSE now() END
+    """, (release, source_file, table, size, LOADING, resume, resume, resume, resume))
+
+
+def advance(cursor, release: str, source_file: str, offset: int, rows: int, seconds: float) -> None:
+    """Offset e linhas confirmados até aqui (na transação do lote)."""
+    cursor.execute("""
+        UPDATE load_manifest
+        SET committed_offset = %s, rows = %s, duration_seconds = duration_seconds + %s
+        WHERE release = %s AND source_file = %s
+    """, (offset, rows, seconds, release, source_file))
+
+
+def complete(cursor, release: str, source_file: str, rows: int, checksum: str, seconds: float) -> None:
+    """Marca o arquivo como carregado (na transação do último COPY)."""
+    cursor.execute("""
+        UPDATE load_manifest
+        SET status = %s, rows = %s, committed_offset = bytes, checksum = %s, error = NULL,
+            duration_seconds = duration_seconds + %s, finished_at = now()
+        WHERE release = %s AND source_file = %s
+    """, (DONE, rows, checksum, seconds, release, source_file))
+
+
+def fail(cursor, release: str, source_file: str, error: str, seconds: float, partial: bool = False) -> None:
+    """`partial`: parte das linhas já foi confirmada na tabela (ver PARTIAL)."""
+    cursor.execute("""
+        UPDATE load_manifest
+        SET status = %s, error = %s, duration_seconds = duration_seconds + %s
+        WHERE release = %s AND source_file = %s
+    """, (PARTIAL if partial else FAILED, error, seconds, release, source_file))
+
+
+def drop_tables(cursor, tables) -> None:
+    """As tabelas foram recriadas vazias: o que constava como carregado nelas deixa de valer."""
+    cursor.execute("""
+        UPDATE load_manifest SET status = %s
+        WHERE target_table = ANY(%s) AND status <> %s
+    """, (DROPPED, list(tables), DROPPED))
+
+
+def retarget(cursor, source_table: str, target_table: str) -> None:
+    """Após a troca atômica: as cargas feitas na staging agora estão na tabela de produção."""
+    cursor.execute("UPDATE load_manifest SET status = %s WHERE target_table = %s AND status <> %s",
+                   (DROPPED, target_table, DROPPED))
+    cursor.execute("UPDATE load_manifest SET target_table = %s WHERE target_table = %s",
+                   (target_table, source_table))
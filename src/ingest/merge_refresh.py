@@ -0,0 +1,187 @@
+"""
+Atualização incremental entre releases (MERGE_REFRESH=1).
+
+Em vez de recriar as tabelas, a etapa 02 preserva a produção e cria as
+stagings (as mesmas do modo bulk, ver src/ingest/bulk.py), que a etapa 04
+carrega com a release nova. Ao final, cada tabela é comparada com a sua
+staging por chave natural e hash do conteúdo da linha, e só a diferença é
+aplicada, numa única transação:
+
+- chave presente só na staging        -> INSERT (MERGE ... WHEN NOT MATCHED)
+- chave nas duas, com hash diferente  -> UPDATE (MERGE ... WHEN MATCHED)
+- chave presente só na produção       -> DELETE (PostgreSQL 16: fora do MERGE)
+
+A escrita (WAL, índices, bloat, cache de quem lê) acompanha o volume de
+mudanças, não o tamanho da base; views e índices da produção seguem de pé.
+As contagens por release ficam na tabela `release_changes`.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest import bulk, load_manifest
+from src.ingest.layout import TABLE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Chave natural de cada tabela. Socios não tem identificador próprio: a chave
+# é a combinação empresa + sócio + qualificação.
+KEYS = {
+    "empresas": ("cnpj_basico",),
+    "estabelecimentos": ("cnpj_basico", "cnpj_ordem", "cnpj_dv"),
+    "socios": ("cnpj_basico", "identificador_socio", "cpf_cnpj_socio", "nome_socio_razao_social", "qualificacao_socio"),
+}
+
+DDL = """
+CREATE TABLE IF NOT EXISTS release_changes (
+    release TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    inserted BIGINT NOT NULL,
+    updated BIGINT NOT NULL,
+    deleted BIGINT NOT NULL,
+    duration_seconds DOUBLE PRECISION NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (release, table_name)
+)
+"""
+
+
+def enabled() -> bool:
+    """Como o bulk, não se aplica ao delta: a staging precisa conter a release inteira."""
+    return pipeline_settings.merge_refresh and not (pipeline_settings.delta and pipeline_settings.mode == "full")
+
+
+def _key(alias: str, table: str) -> str:
+    """
+    Chave como um único texto (ROW(...)::text): comparável por hash join e
+    sem ambiguidade entre NULL e vazio, o que importa nas colunas anuláveis da chave de socios.
+    """
+    return f"ROW({', '.join(f'{alias}.{column}' for column in KEYS[table])})::text"
+
+
+def merge_table(conn, table: str, staging: str) -> dict[str, int]:
+    """
+    Aplica em `table` a diferença para `staging`, na transação de `conn`.
+    Devolve as contagens (por chave) de inserções, atualizações e remoções.
+
+    A comparação é por (chave, hash da linha) com o número de cópias de cada
+    linha, então o resultado é exato mesmo com chave repetida na origem (não
+    deveria haver, mas a origem não garante): uma chave com exatamente uma
+    linha que sai e uma que entra é um UPDATE; nos demais casos, as linhas
+    que sobram saem e as que faltam entram.
+    """
+    diff, keys, leaving = f"_diff_{table}", f"_keys_{table}", f"_leaving_{table}"
+    columns = TABLE_COLUMNS[table]
+    # Leitores seguem liberados; outra escrita invalidaria os ctids abaixo
+    conn.execute(text(f"LOCK TABLE {table} IN EXCLUSIVE MODE"))
+    conn.execute(text(f"ANALYZE {staging}"))
+
+    # Uma passada de leitura nas duas tabelas; só as linhas alteradas são materializadas
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {diff} ON COMMIT DROP AS
+        SELECT coalesce(s.k, t.k) AS k, coalesce(s.h, t.h) AS h,
+               coalesce(s.copies, 0) AS new_copies, coalesce(t.copies, 0) AS old_copies
+        FROM (SELECT {_key('x', table)} AS k, md5(x::text) AS h, count(*) AS copies FROM {staging} x GROUP BY 1, 2) s
+        FULL JOIN (SELECT {_key('x', table)} AS k, md5(x::text) AS h, count(*) AS copies FROM {table} x GROUP BY 1, 2) t
+            ON s.k = t.k AND s.h = t.h
+        WHERE s.copies IS DISTINCT FROM t.copies
+    """))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {keys} ON COMMIT DROP AS
+        SELECT k, sum(greatest(new_copies - old_copies, 0)) AS n_new, sum(greatest(old_copies - new_copies, 0)) AS n_old
+        FROM {diff} GROUP BY k
+    """))
+    counts = conn.execute(text(f"""
+        SELECT count(*) FILTER (WHERE n_old = 0) AS insert,
+               count(*) FILTER (WHERE n_old > 0 AND n_new > 0) AS update,
+               count(*) FILTER (WHERE n_new = 0) AS delete
+        FROM {keys}
+    """)).one()._asdict()
+    conn.execute(text(f"ANALYZE {diff}"))
+    conn.execute(text(f"ANALYZE {keys}"))
+
+    # Linhas da produção que saem, endereçadas por (tableoid, ctid): entre cópias idênticas, só as excedentes
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {leaving} ON COMMIT DROP AS
+        SELECT k, rel, tid, paired FROM (
+            SELECT d.k, x.tableoid AS rel, x.ctid AS tid, c.n_new = 1 AND c.n_old = 1 AS paired,
+                   d.old_copies - d.new_copies AS surplus,
+                   row_number() OVER (PARTITION BY d.k, d.h) AS copy
+            FROM {table} x
+            JOIN {diff} d ON d.old_copies > d.new_copies AND {_key('x', table)} = d.k AND md5(x::text) = d.h
+            JOIN {keys} c ON c.k = d.k
+        ) y
+        WHERE copy <= surplus
+    """))
+    # O PostgreSQL 16 não tem WHEN NOT MATCHED BY SOURCE no MERGE: remoções num DELETE à parte
+    conn.execute(text(f"""
+        DELETE FROM {table} x USING {leaving} l
+        WHERE NOT l.paired AND x.tableoid = l.rel AND x.ctid = l.tid
+    """))
+    # Linhas que entram: UPDATE da linha que sai quando o par é 1:1, INSERT nos demais casos
+    conn.execute(text(f"""
+        MERGE INTO {table} t
+        USING (
+            SELECT y.*, l.rel AS _rel, l.tid AS _tid FROM (
+                SELECT s.*, d.k AS _k, d.new_copies - d.old_copies AS _missing, c.n_new = 1 AND c.n_old = 1 AS _paired,
+                       row_number() OVER (PARTITION BY d.k, d.h) AS _copy
+                FROM {staging} s
+                JOIN {diff} d ON d.new_copies > d.old_copies AND {_key('s', table)} = d.k AND md5(s::text) = d.h
+                JOIN {keys} c ON c.k = d.k
+            ) y
+            LEFT JOIN {leaving} l ON y._paired AND l.paired AND l.k = y._k
+            WHERE y._copy <= y._missing
+        ) src
+        ON t.tableoid = src._rel AND t.ctid = src._tid
+        WHEN MATCHED THEN
+            UPDATE SET {', '.join(f'{column} = src.{column}' for column in columns)}
+        WHEN NOT MATCHED THEN
+            INSERT ({', '.join(columns)}) VALUES ({', '.join(f'src.{column}' for column in columns)})
+    """))
+    return counts
+
+
+def apply(engine, release: str, tables: tuple[str, ...] = bulk.TABLES) -> dict[str, dict[str, int]]:
+    """
+    Aplica as stagings carregadas sobre a produção (uma transação para todas
+    as tabelas), registra as contagens em release_changes e descarta as
+    stagings. O load_manifest passa a apontar para as tabelas de produção.
+    """
+    pending = bulk.staged_tables(engine, tables)
+    if not pending:
+        logger.warning("⚠️ MODO MERGE: nenhuma staging carregada; nada a aplicar.")
+        return {}
+
+    results = {}
+    with engine.begin() as conn:
+        conn.execute(text(DDL))
+        for table in pending:
+            staging = bulk.staging_name(table)
+            empty = not conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {staging})")).scalar()
+            if empty and conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {table})")).scalar():
+                # Aplicar uma staging vazia apagaria a tabela inteira
+                raise RuntimeError(f"{staging} está vazia e {table} não: merge cancelado (recarregue a staging).")
+
+            start = time.time()
+            counts = merge_table(conn, table, staging)
+            seconds = time.time() - start
+            conn.execute(text("""
+                INSERT INTO release_changes (release, table_name, inserted, updated, deleted, duration_seconds)
+                VALUES (:release, :table, :insert, :update, :delete, :seconds)
+                ON CONFLICT (release, table_name) DO UPDATE SET
+                    inserted = EXCLUDED.inserted, updated = EXCLUDED.updated, deleted = EXCLUDED.deleted,
+                    duration_seconds = EXCLUDED.duration_seconds, applied_at = now()
+            """), {"release": release, "table": table, "seconds": seconds, **counts})
+            logger.info(f"🔀 {table}: +{counts['insert']:,} inseridas, ~{counts['update']:,} atualizadas, "
+                        f"-{counts['delete']:,} removidas ({seconds:.1f}s).")
+            results[table] = counts
+
+        for table in pending:
+            conn.execute(text(f"DROP TABLE {bulk.staging_name(table)}"))
+            load_manifest.retarget(conn.connection.cursor(), bulk.staging_name(table), table)
+    logger.info(f"✅ MODO MERGE: release {release} aplicada em {', '.join(pending)}.")
+    return results
@@ -0,0 +1,191 @@
+"""
+Métricas de throughput por arquivo (extração e carga).
+
+Cada etapa grava uma linha JSON por arquivo em `DATA_ROOT/metrics/<run_id>.jsonl`
+(bytes, linhas escritas/descartadas, tempo, linhas/s, MB/s e a divisão do
+tempo: parsing no cliente x escrita/COPY, espera por lock) e regenera
+`DATA_ROOT/metrics/cnpj_pipeline.prom` para o textfile collector do
+node_exporter, agregado por etapa e tabela.
+
+O run_id vem de PIPELINE_RUN_ID (definido pelo orquestrador, comum a todas
+as etapas); rodando uma etapa avulsa, cada processo gera o seu.
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from src.ingest.layout import table_for_member
+from src.paths import METRICS_DIR
+
+PROM_FILE = "cnpj_pipeline.prom"
+# Campos de tempo somados na agregação (além de `seconds`)
+TIMING_FIELDS = ("parse_seconds", "write_seconds", "copy_seconds", "lock_wait_seconds")
+
+_lock = threading.Lock()
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+
+
+RUN_ID = os.getenv("PIPELINE_RUN_ID") or new_run_id()
+
+
+def run_log(run_id: str = RUN_ID) -> Path:
+    return METRICS_DIR / f"{run_id}.jsonl"
+
+
+class CountingReader(io.RawIOBase):
+    """Stream binário que conta os bytes lidos (bytes de entrada da extração)."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        return n
+
+
+def _rates(item: dict) -> dict:
+    seconds = item.get("seconds") or 0.0
+    rows = item.get("rows") or 0
+    size = item.get("bytes") or 0
+    return {
+        "rows_per_s": round(rows / seconds, 1) if seconds > 0 else 0.0,
+        "mb_per_s": round(size / 1024 / 1024 / seconds, 3) if seconds > 0 else 0.0,
+    }
+
+
+def record(stage: str, items: list[dict]) -> None:
+    """
+    Grava uma linha por arquivo no log da execução e atualiza o .prom.
+    Cada item: file, ok, bytes, rows, seconds (+ rows_skipped, table e os TIMING_FIELDS).
+    """
+    if not items:
+        return
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    finished_at = time.time()
+    lines = []
+    for item in items:
+        entry = {
+            "run_id": RUN_ID,
+            "stage": stage,
+            "file": item["file"],
+            "table": item.get("table") or table_for_member(item["file"]),
+            "ok": item.get("ok", True),
+            "bytes": item.get("bytes", 0),
+            "rows": item.get("rows", 0),
+            "rows_skipped": item.get("rows_skipped", 0),
+            "seconds": round(item.get("seconds", 0.0), 3),
+            **{name: round(item[name], 3) for name in TIMING_FIELDS if name in item},
+            "finished_at": item.get("finished_at", finished_at),
+        }
+        entry.update(_rates(entry))
+        lines.append(json.dumps(entry, ensure_ascii=False))
+    with _lock:
+        with open(run_log(), "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        export_prometheus()
+
+
+def read_run(run_id: str = RUN_ID) -> list[dict]:
+    path = run_log(run_id)
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def aggregate(entries: list[dict]) -> dict[tuple[str, str], dict]:
+    """
+    Totais por (etapa, tabela). `wall_seconds` é o intervalo real entre o
+    início do primeiro e o fim do último arquivo (arquivos em paralelo se
+    sobrepõem), base das taxas agregadas.
+    """
+    groups: dict[tuple[str, str], dict] = defaultdict(lambda: {
+        "files": 0, "failed": 0, "bytes": 0, "rows": 0, "rows_skipped": 0, "seconds": 0.0,
+        **{name: 0.0 for name in TIMING_FIELDS}, "start": float("inf"), "end": 0.0,
+    })
+    for entry in entries:
+        for key in ((entry["stage"], entry.get("table") or "-"), (entry["stage"], "*")):
+            group = groups[key]
+            group["files"] += 1
+            group["failed"] += 0 if entry["ok"] else 1
+            for name in ("bytes", "rows", "rows_skipped", "seconds", *TIMING_FIELDS):
+                group[name] += entry.get(name, 0) or 0
+            group["start"] = min(group["start"], entry["finished_at"] - entry["seconds"])
+            group["end"] = max(group["end"], entry["finished_at"])
+    for group in groups.values():
+        group["wall_seconds"] = max(group.pop("end") - group.pop("start"), 0.0)
+        group.update(_rates({**group, "seconds": group["wall_seconds"]}))
+    return dict(groups)
+
+
+def export_prometheus(run_id: str = RUN_ID) -> Path:
+    """Regenera o arquivo do textfile collector (escrita atômica) com os totais da execução."""
+    groups = aggregate(read_run(run_id))
+    metrics = {
+        "files_total": ("counter", "Arquivos processados", "files"),
+        "files_failed_total": ("counter", "Arquivos com falha", "failed"),
+        "bytes_total": ("counter", "Bytes de entrada", "bytes"),
+        "rows_total": ("counter", "Linhas escritas/carregadas", "rows"),
+        "rows_skipped_total": ("counter", "Linhas descartadas", "rows_skipped"),
+        "seconds_total": ("counter", "Tempo somado dos arquivos", "seconds"),
+        "wall_seconds": ("gauge", "Tempo real da etapa", "wall_seconds"),
+        "rows_per_second": ("gauge", "Linhas por segundo (tempo real)", "rows_per_s"),
+        "megabytes_per_second": ("gauge", "MB por segundo (tempo real)", "mb_per_s"),
+        **{f"{name}_total": ("counter", name.replace("_", " "), name) for name in TIMING_FIELDS},
+    }
+    lines = [
+        "# HELP cnpj_pipeline_run_info Execução a que as métricas se referem",
+        "# TYPE cnpj_pipeline_run_info gauge",
+        f'cnpj_pipeline_run_info{{run_id="{run_id}"}} 1',
+        "# HELP cnpj_pipeline_last_update_timestamp_seconds Última atualização deste arquivo",
+        "# TYPE cnpj_pipeline_last_update_timestamp_seconds gauge",
+        f"cnpj_pipeline_last_update_timestamp_seconds {time.time():.0f}",
+    ]
+    for metric, (kind, help_text, field) in metrics.items():
+        lines.append(f"# HELP cnpj_pipeline_{metric} {help_text}")
+        lines.append(f"# TYPE cnpj_pipeline_{metric} {kind}")
+        for (stage, table), group in sorted(groups.items()):
+            if table == "*":
+                continue
+            value = group[field]
+            value = value if isinstance(value, int) else round(value, 3)
+            lines.append(f'cnpj_pipeline_{metric}{{stage="{stage}",table="{table}"}} {value}')
+
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    path = METRICS_DIR / PROM_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    tmp.replace(path)
+    return path
+
+
+def summary_lines(run_id: str = RUN_ID) -> list[str]:
+    """Resumo legível dos totais da execução, por etapa e tabela."""
+    lines = []
+    for (stage, table), group in sorted(aggregate(read_run(run_id)).items(), key=lambda kv: (kv[0][0], kv[0][1] == "*", kv[0][1])):
+        label = "TOTAL" if table == "*" else table
+        failed = f", {group['failed']} com falha" if group["failed"] else ""
+        split = " | ".join(f"{name.removesuffix('_seconds')} {group[name]:.1f}s" for name in TIMING_FIELDS if group[name])
+        lines.append(
+            f"{stage:<8} {label:<20} {group['files']:>3} arq{failed} | {group['rows']:>12,} linhas | "
+            f"{group['bytes'] / 1024 / 1024:>10,.1f} MB | {group['wall_seconds']:>7.1f}s | "
+            f"{group['rows_per_s']:>10,.0f} linhas/s | {group['mb_per_s']:>7.1f} MB/s" + (f" | {split}" if split else "")
+        )
+    return lines
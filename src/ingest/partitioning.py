@@ -0,0 +1,153 @@
+"""
+Particionamento declarativo de estabelecimentos e socios (PARTITION_STRATEGY).
+
+- none: tabelas simples (padrão).
+- uf:   estabelecimentos por LIST (uf), uma partição por UF + EX (exterior)
+        + DEFAULT (UF vazia ou fora da lista); socios, que não tem UF, por
+        HASH (cnpj_basico) em PARTITION_COUNT partições.
+- hash: estabelecimentos e socios por HASH (cnpj_basico) em PARTITION_COUNT partições.
+
+As partições se chamam `<tabela>_p_<sufixo>` (ex.: estabelecimentos_p_sp,
+socios_p_03). Consultas filtradas por UF leem só a partição da UF (partition
+pruning); manutenção por partição em src/maintain_partitions.py.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+from pathlib import Path
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest.layout import TABLE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("none", "uf", "hash")
+PARTITION_INFIX = "_p_"
+UFS = (
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+    "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO", "EX",
+)
+DEFAULT_SUFFIX = "default"
+# Linhas acumuladas por partição antes de gravar no spool (roteamento no cliente)
+ROUTE_BATCH_ROWS = 50_000
+
+
+def scheme(table: str) -> tuple[str, str] | None:
+    """(método, coluna) de particionamento de `table` na estratégia ativa, ou None."""
+    strategy = pipeline_settings.partition_strategy
+    if strategy == "none" or table not in ("estabelecimentos", "socios"):
+        return None
+    if strategy == "uf" and table == "estabelecimentos":
+        return "list", "uf"
+    return "hash", "cnpj_basico"
+
+
+def partition_bounds(table: str) -> list[tuple[str, str]]:
+    """(sufixo, cláusula FOR VALUES/DEFAULT) de cada partição de `table`."""
+    method, _ = scheme(table)
+    if method == "list":
+        return [(uf.lower(), f"FOR VALUES IN ('{uf}')") for uf in UFS] + [(DEFAULT_SUFFIX, "DEFAULT")]
+    count = pipeline_settings.partition_count
+    width = len(str(count - 1))
+    return [(f"{i:0{width}d}", f"FOR VALUES WITH (MODULUS {count}, REMAINDER {i})") for i in range(count)]
+
+
+def partition_name(parent: str, suffix: str) -> str:
+    return f"{parent}{PARTITION_INFIX}{suffix}"
+
+
+def create_partitioned(conn, table: str, like: str, parent: str, unlogged: bool = False) -> None:
+    """
+    Cria `parent` particionada segundo o esquema de `table`, com as colunas de
+    `like`, e todas as suas partições (UNLOGGED se `unlogged`; o pai não tem
+    armazenamento próprio).
+    """
+    method, column = scheme(table)
+    conn.execute(text(f"DROP TABLE IF EXISTS {parent}"))
+    conn.execute(text(
+        f"CREATE TABLE {parent} (LIKE {like} INCLUDING ALL EXCLUDING INDEXES) PARTITION BY {method.upper()} ({column})"
+    ))
+    for suffix, bound in partition_bounds(table):
+        conn.execute(text(
+            f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {partition_name(parent, suffix)} PARTITION OF {parent} {bound}"
+        ))
+
+
+def apply(conn, tables: tuple[str, ...]) -> None:
+    """Troca as tabelas recém-criadas (vazias) pela versão particionada, na transação de `conn`."""
+    for table in tables:
+        if scheme(table) is None:
+            continue
+        template = f"{table}_template"
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {template}"))
+        create_partitioned(conn, table, template, table)
+        conn.execute(text(f"DROP TABLE {template}"))
+        method, column = scheme(table)
+        logger.info(f"🧩 {table} particionada por {method.upper()} ({column}): {len(partition_bounds(table))} partições.")
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar() or False
+
+
+def leaves(conn, table: str) -> list[str]:
+    """Partições folha de `table` (ou a própria tabela, se não for particionada)."""
+    rows = conn.execute(text("""
+        SELECT relid::regclass::text FROM pg_partition_tree(CAST(:t AS regclass)) WHERE isleaf ORDER BY 1
+    """), {"t": table}).scalars().all()
+    return rows or [table]
+
+
+def rename_partitions(conn, table: str, previous: str) -> None:
+    """Após renomear `previous` -> `table`, alinha os nomes das partições ao novo pai."""
+    prefix = previous + PARTITION_INFIX
+    for leaf in leaves(conn, table):
+        if leaf.startswith(prefix):
+            conn.execute(text(f"ALTER TABLE {leaf} RENAME TO {table + PARTITION_INFIX + leaf[len(prefix):]}"))
+
+
+def routes_on_client(table: str) -> bool:
+    """LIST por UF: o loader separa as linhas por partição e carrega as folhas em paralelo."""
+    found = scheme(table)
+    return found is not None and found[0] == "list"
+
+
+def route_file(path: Path, table: str, parent: str, spool_dir: Path) -> dict[str, Path]:
+    """
+    Separa um CSV processado (UTF-8, `;`) em um spool por partição de LIST,
+    no mesmo formato. Devolve {partição folha: arquivo}.
+    """
+    _, column = scheme(table)
+    index = TABLE_COLUMNS[table].index(column)
+    known = {uf.upper(): partition_name(parent, uf.lower()) for uf in UFS}
+    default = partition_name(parent, DEFAULT_SUFFIX)
+
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    files, writers, pending = {}, {}, {}
+
+    def flush(leaf: str):
+        if leaf not in writers:
+            files[leaf] = open(spool_dir / f"{leaf}.csv", "w", encoding="utf-8", newline="")
+            writers[leaf] = csv.writer(files[leaf], delimiter=";")
+        writers[leaf].writerows(pending[leaf])
+        pending[leaf] = []
+
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.reader(f, delimiter=";"):
+                value = row[index] if len(row) > index else ""
+                leaf = known.get(value, default)
+                rows = pending.setdefault(leaf, [])
+                rows.append(row)
+                if len(rows) >= ROUTE_BATCH_ROWS:
+                    flush(leaf)
+        for leaf in list(pending):
+            if pending[leaf]:
+                flush(leaf)
+    finally:
+        for handle in files.values():
+            handle.close()
+    return {leaf: spool_dir / f"{leaf}.csv" for leaf in files}
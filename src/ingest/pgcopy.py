@@ -0,0 +1,227 @@
+"""
+Saída no formato binário do COPY do PostgreSQL (SCHEMA_VARIANT=typed).
+
+Cada lote de linhas (texto, na ordem do layout oficial) é convertido de forma
+vetorizada para os tipos de sql/create_tables_typed.sql e serializado direto
+no formato `COPY ... FROM STDIN WITH (FORMAT BINARY)`: o servidor só copia os
+bytes, sem parsing de texto, datas ou números.
+
+Conversões (valor fora do padrão vira NULL, como o COPY faria com '' no CSV):
+- int2/int4: só dígitos (até 4 / 9), zeros à esquerda descartados;
+- date:      AAAAMMDD; `00000000` e datas inexistentes viram NULL;
+- numeric:   capital com vírgula decimal (`1000,00`), gravado como numeric(18,2);
+- cnae:      código de 7 dígitos -> id smallint de dim_cnae (ver src/ingest/domains.py);
+- cnae[]:    lista separada por vírgulas -> smallint[] de ids de dim_cnae (códigos
+             desconhecidos ficam de fora; lista vazia vira NULL).
+
+Requer `pyarrow` (importado só quando o formato é usado).
+"""
+from __future__ import annotations
+
+import mmap
+import struct
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from src.ingest import domains
+from src.ingest.layout import TABLE_COLUMNS, TYPED_COLUMNS
+
+PGCOPY_SUFFIX = ".pgcopy"
+HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+TRAILER = struct.pack("!h", -1)
+
+# 2000-01-01 (época do PostgreSQL) em dias desde 1970-01-01
+_PG_EPOCH_DAYS = 10957
+_INT_PATTERNS = {"int2": r"^[0-9]{1,4}$", "int4": r"^[0-9]{1,9}$"}
+_NUMERIC_PATTERN = r"^-?[0-9]{1,16}(,[0-9]{1,2})?$"
+# numeric(18,2) em base 10000: 4 grupos inteiros + 1 grupo com os centavos
+_NUMERIC_GROUPS = 5
+_NUMERIC_WEIGHT = 3
+_NUMERIC_NEG = 0x4000
+_NUMERIC_DSCALE = 2
+# Array binário de uma dimensão: ndim, flags (sem NULLs), OID do elemento (int2), tamanho, limite inferior
+_INT2_OID = 21
+_ARRAY_HEADER = 20
+_ARRAY_ELEMENT = 6
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:
+        raise RuntimeError("SCHEMA_VARIANT=typed requer o pacote 'pyarrow' (pip install pyarrow).") from e
+    return pa, pc
+
+
+def convert_column(array, kind: str):
+    """Coluna de texto (pyarrow) -> (valores numpy no tipo de `kind`, máscara de válidos)."""
+    pa, pc = _pyarrow()
+    if kind in _INT_PATTERNS:
+        array = pc.if_else(pc.match_substring_regex(array, _INT_PATTERNS[kind]), array, pa.scalar(None, pa.string()))
+        array = pc.cast(array, pa.int16() if kind == "int2" else pa.int32())
+    elif kind == "date":
+        stamps = pc.strptime(array, format="%Y%m%d", unit="s", error_is_null=True)
+        # strptime normaliza dias inexistentes (20240230 -> 1º de março): só vale o que volta igual
+        exact = pc.equal(pc.strftime(stamps, format="%Y%m%d"), array)
+        stamps = pc.if_else(exact, stamps, pa.scalar(None, stamps.type))
+        array = pc.subtract(pc.cast(pc.cast(stamps, pa.date32()), pa.int32()), _PG_EPOCH_DAYS)
+    elif kind == "numeric":
+        array = pc.if_else(pc.match_substring_regex(array, _NUMERIC_PATTERN), array, pa.scalar(None, pa.string()))
+        decimal = pc.cast(pc.replace_substring(array, ",", "."), pa.decimal128(18, 2))
+        array = pc.cast(pc.multiply(decimal, pa.scalar(100, pa.decimal128(3, 0))), pa.int64())
+    elif kind == "cnae":
+        array = domains.CNAE.resolve(array)
+    else:
+        raise ValueError(f"Tipo desconhecido: {kind}")
+    valid = ~np.asarray(array.is_null().to_numpy(zero_copy_only=False), dtype=bool)
+    return array.fill_null(0).to_numpy(zero_copy_only=False), valid
+
+
+def _numeric_payload(cents: np.ndarray) -> np.ndarray:
+    """Centavos (int64) -> campos numeric binários de tamanho fixo (uint8, n x 18)."""
+    magnitude = np.abs(cents)
+    integer, fraction = magnitude // 100, magnitude % 100
+    header = np.empty((len(cents), 4), dtype=">u2")
+    header[:, 0] = _NUMERIC_GROUPS
+    header[:, 1] = _NUMERIC_WEIGHT
+    header[:, 2] = np.where(cents < 0, _NUMERIC_NEG, 0)
+    header[:, 3] = _NUMERIC_DSCALE
+    digits = np.empty((len(cents), _NUMERIC_GROUPS), dtype=">u2")
+    for i in range(_NUMERIC_GROUPS - 1):
+        digits[:, i] = (integer // 10000 ** (_NUMERIC_GROUPS - 2 - i)) % 10000
+    digits[:, -1] = fraction * 100
+    return np.concatenate([header.view(np.uint8), digits.view(np.uint8)], axis=1)
+
+
+def _fixed_payload(values: np.ndarray, kind: str) -> np.ndarray:
+    """Valores convertidos -> bytes big-endian por linha (uint8, n x largura)."""
+    if kind == "numeric":
+        return _numeric_payload(values)
+    dtype = ">i2" if kind in ("int2", "cnae") else ">i4"
+    return values.astype(dtype).view(np.uint8).reshape(len(values), -1)
+
+
+def _cnae_array_column(array):
+    """
+    Coluna `cnae[]` -> arrays binários int2[] já serializados, como um
+    BinaryArray do pyarrow (mesmo caminho das colunas de texto), e a máscara de válidos.
+    """
+    pa, pc = _pyarrow()
+    n = len(array)
+    lists = pc.split_pattern(pc.utf8_trim_whitespace(array), ",")
+    ids = domains.CNAE.resolve(pc.utf8_trim_whitespace(pc.list_flatten(lists)))
+    parents = pc.list_parent_indices(lists).to_numpy(zero_copy_only=False)
+    known = ~np.asarray(ids.is_null().to_numpy(zero_copy_only=False), dtype=bool)
+    ids = ids.fill_null(0).to_numpy(zero_copy_only=False)[known]
+    parents = parents[known]
+
+    counts = np.bincount(parents, minlength=n).astype(np.int64)
+    valid = counts > 0
+    lengths = np.where(valid, _ARRAY_HEADER + _ARRAY_ELEMENT * counts, 0)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError("Lote grande demais para a coluna cnae[] (reduza o tamanho do lote).")
+    buffer = np.empty(int(offsets[-1]), dtype=np.uint8)
+
+    header = np.zeros((int(valid.sum()), 5), dtype=">i4")
+    header[:, 0] = 1
+    header[:, 2] = _INT2_OID
+    header[:, 3] = counts[valid]
+    header[:, 4] = 1
+    _put(buffer, offsets[:-1][valid], header.view(np.uint8))
+
+    # Posição de cada elemento: início da linha + cabeçalho + ordem dentro da linha
+    rank = np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    elements = np.zeros((len(ids), 3), dtype=">i2")
+    elements[:, 1] = 2
+    elements[:, 2] = ids
+    _put(buffer, offsets[parents] + _ARRAY_HEADER + _ARRAY_ELEMENT * rank, elements.view(np.uint8))
+
+    binary = pa.Array.from_buffers(pa.binary(), n, [None, pa.py_buffer(offsets.astype(np.int32)), pa.py_buffer(buffer)])
+    return binary, valid
+
+
+def _put(buffer: np.ndarray, positions: np.ndarray, payload: np.ndarray) -> None:
+    for j in range(payload.shape[1]):
+        buffer[positions + j] = payload[:, j]
+
+
+def encode_batch(batch, table: str) -> bytes:
+    """Serializa um RecordBatch de texto (colunas do layout de `table`) em tuplas do COPY binário."""
+    pa, pc = _pyarrow()
+    typed = TYPED_COLUMNS[table]
+    n = batch.num_rows
+    if n == 0:
+        return b""
+
+    fields = []
+    for name, array in zip(TABLE_COLUMNS[table], batch.columns):
+        array = array.cast(pa.string()) if array.type != pa.string() else array
+        kind = typed.get(name)
+        if kind == "cnae[]":
+            # Tamanho variável: os bytes já serializados seguem o caminho do texto
+            array, valid = _cnae_array_column(array)
+            offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[:n + 1]
+            fields.append(("text", array, offsets, np.diff(offsets).astype(np.int64), valid))
+        elif kind is None:
+            # Texto: vazio vira NULL (mesma semântica do NULL '' do CSV)
+            array = pc.fill_null(array, "")
+            offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset:array.offset + n + 1]
+            lengths = np.diff(offsets).astype(np.int64)
+            fields.append(("text", array, offsets, lengths, lengths > 0))
+        else:
+            values, valid = convert_column(array, kind)
+            payload = _fixed_payload(values, kind)
+            lengths = np.where(valid, payload.shape[1], 0).astype(np.int64)
+            fields.append(("fixed", payload, None, lengths, valid))
+
+    row_sizes = 2 + sum(4 + lengths for _, _, _, lengths, _ in fields)
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(row_sizes[:-1], out=starts[1:])
+    buffer = np.empty(int(starts[-1] + row_sizes[-1]), dtype=np.uint8)
+
+    _put(buffer, starts, np.full(n, len(fields), dtype=">i2").view(np.uint8).reshape(n, 2))
+    position = starts + 2
+    for kind, data, offsets, lengths, valid in fields:
+        header = np.where(valid, lengths, -1).astype(">i4").view(np.uint8).reshape(n, 4)
+        _put(buffer, position, header)
+        position = position + 4
+        if kind == "fixed":
+            _put(buffer, position[valid], data[valid])
+        elif offsets[-1] > offsets[0]:
+            source = np.frombuffer(data.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]]
+            first = offsets[:-1].astype(np.int64)
+            buffer[np.repeat(position - first, lengths) + np.arange(offsets[0], offsets[-1])] = source
+        position = position + lengths
+    return buffer.tobytes()
+
+
+def read_key_batches(path: Path, size: int) -> Iterator[list[str]]:
+    """Coluna cnpj_basico (primeiro campo, int4) de um .pgcopy, como texto de 8 dígitos."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield from _scan_keys(data, size)
+
+
+def _scan_keys(data, size: int) -> Iterator[list[str]]:
+    position = len(HEADER)
+    batch = []
+    while position < len(data):
+        (count,) = struct.unpack_from("!h", data, position)
+        if count == -1:
+            break
+        position += 2
+        for i in range(count):
+            (length,) = struct.unpack_from("!i", data, position)
+            position += 4
+            if i == 0 and length == 4:
+                batch.append(f"{struct.unpack_from('!i', data, position)[0]:08d}")
+            position += max(length, 0)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
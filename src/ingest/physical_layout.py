@@ -0,0 +1,96 @@
+"""
+Layout físico ordenado por cnpj_basico (SORTED_LAYOUT=1).
+
+Cada tabela é reescrita em ordem de `cnpj_basico` (INSERT ... ORDER BY numa
+cópia com a mesma estrutura) e recebe um índice BRIN nessa coluna. Com as
+linhas ordenadas, o BRIN (poucos KB por milhão de linhas) filtra faixas de
+páginas quase como um B-tree nos joins e buscas por cnpj_basico.
+
+No modo bulk a ordenação acontece nas stagings, antes da troca; fora dele a
+cópia ordenada é trocada com a de produção via `bulk.swap_in`. Tabelas
+particionadas (PARTITION_STRATEGY) não são reescritas: recebem só o BRIN,
+criado em cada partição.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from sqlalchemy import text
+
+from src.ingest import bulk, partitioning
+
+logger = logging.getLogger(__name__)
+
+SORT_KEY = "cnpj_basico"
+SORTED_SUFFIX = "_sorted"
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def sorted_copy(conn, source: str, target: str, unlogged: bool) -> None:
+    """
+    Cria `target` com a estrutura de `source` (sem índices, reconstruídos depois)
+    e copia as linhas em ordem de SORT_KEY.
+    """
+    conn.execute(text(f"DROP TABLE IF EXISTS {target}"))
+    conn.execute(text(f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {target} (LIKE {source} INCLUDING ALL EXCLUDING INDEXES)"))
+    conn.execute(text(f"INSERT INTO {target} SELECT * FROM {source} ORDER BY {SORT_KEY}"))
+
+
+def ensure_brin(conn, table: str) -> None:
+    """Índice BRIN em SORT_KEY, se a tabela ainda não tiver um (de qualquer nome)."""
+    has_brin = conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = CAST(:table AS regclass) AND am.amname = 'brin' AND a.attname = :key
+        )
+    """), {"table": table, "key": SORT_KEY}).scalar()
+    if not has_brin:
+        conn.execute(text(f"CREATE INDEX {table}_{SORT_KEY}_brin ON {table} USING brin ({SORT_KEY})"))
+
+
+def sort_staging(engine, tables: tuple[str, ...] = bulk.TABLES) -> None:
+    """Modo bulk: substitui cada staging por uma cópia ordenada (ainda UNLOGGED, invisível a leitores)."""
+    for table in tables:
+        staging = bulk.staging_name(table)
+        start = time.time()
+        with engine.begin() as conn:
+            if not _exists(conn, staging) or partitioning.is_partitioned(conn, staging):
+                continue
+            sorted_copy(conn, staging, staging + SORTED_SUFFIX, unlogged=True)
+            conn.execute(text(f"DROP TABLE {staging}"))
+            conn.execute(text(f"ALTER TABLE {staging + SORTED_SUFFIX} RENAME TO {staging}"))
+        logger.info(f"🗂️  {staging} reordenada por {SORT_KEY} ({time.time() - start:.1f}s).")
+
+
+def sort_in_place(engine, tables: tuple[str, ...] = bulk.TABLES) -> None:
+    """Fora do modo bulk: cópia ordenada de cada tabela e troca atômica com a de produção."""
+    copied = []
+    for table in tables:
+        start = time.time()
+        with engine.begin() as conn:
+            if not _exists(conn, table) or partitioning.is_partitioned(conn, table):
+                continue
+            sorted_copy(conn, table, table + SORTED_SUFFIX, unlogged=False)
+        copied.append(table)
+        logger.info(f"🗂️  Cópia ordenada de {table} por {SORT_KEY} ({time.time() - start:.1f}s).")
+    bulk.swap_in(engine, tuple(copied), suffix=SORTED_SUFFIX)
+
+
+def finalize_indexes(engine, tables: tuple[str, ...] = bulk.TABLES) -> None:
+    """BRIN em SORT_KEY e estatísticas atualizadas nas tabelas de produção."""
+    for table in tables:
+        start = time.time()
+        with engine.begin() as conn:
+            if not _exists(conn, table):
+                continue
+            ensure_brin(conn, table)
+            conn.execute(text(f"ANALYZE {table}"))
+        logger.info(f"🧭 BRIN em {table}.{SORT_KEY} pronto ({time.time() - start:.1f}s).")
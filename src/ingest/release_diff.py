@@ -0,0 +1,159 @@
+"""
+Detecção de delta entre releases mensais.
+
+Compara o manifesto de download da release atual com o da release anterior
+e classifica cada zip como `unchanged`, `changed` ou `new` (e lista os
+`removed`). O resultado fica em RAW_DIR/manifests/deltas/<release>.json e é
+consumido pelas etapas 03 (extração) e 04 (carga) no modo delta.
+
+Um zip listado na release que não chegou ao manifesto (falha de consulta ou
+de download) fica `unknown`: nunca vira `removed`, e o delta com arquivos
+desconhecidos é recusado (ver `ReleaseDelta.complete`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from src.ingest.download_manifest import MANIFEST_DIR, DownloadManifest, FileEntry
+from src.ingest.downloader import RemoteInfo
+
+logger = logging.getLogger(__name__)
+
+DELTA_DIR = MANIFEST_DIR / "deltas"
+
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+NEW = "new"
+# Listado na release, mas sem entrada no manifesto (download falhou)
+UNKNOWN = "unknown"
+
+
+@dataclass
+class ReleaseDelta:
+    release: str
+    previous: str | None
+    files: dict[str, str] = field(default_factory=dict)
+    removed: list[str] = field(default_factory=list)
+
+    @property
+    def path(self) -> Path:
+        return DELTA_DIR / f"{self.release}.json"
+
+    def to_process(self) -> set[str]:
+        """Zips que precisam ser extraídos/carregados (changed + new)."""
+        return {name for name, status in self.files.items() if status in (CHANGED, NEW)}
+
+    def unknown(self) -> list[str]:
+        return sorted(name for name, status in self.files.items() if status == UNKNOWN)
+
+    def complete(self) -> bool:
+        """Todos os zips da release foram classificados: só então o delta equivale a uma carga completa."""
+        return not self.unknown()
+
+    def summary(self) -> dict[str, int]:
+        counts = {UNCHANGED: 0, CHANGED: 0, NEW: 0, UNKNOWN: 0}
+        for status in self.files.values():
+            counts[status] += 1
+        counts["removed"] = len(self.removed)
+        return counts
+
+    def save(self) -> None:
+        DELTA_DIR.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "release": self.release,
+            "previous": self.previous,
+            "files": dict(sorted(self.files.items())),
+            "removed": sorted(self.removed),
+        }
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        tmp.replace(self.path)
+
+    @classmethod
+    def load(cls, release: str | None = None) -> "ReleaseDelta | None":
+        """Carrega o delta de `release` (ou o mais recente, se omitido)."""
+        if release is None:
+            candidates = sorted(DELTA_DIR.glob("*.json")) if DELTA_DIR.exists() else []
+            if not candidates:
+                return None
+            path = candidates[-1]
+        else:
+            path = DELTA_DIR / f"{release}.json"
+            if not path.exists():
+                return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(data["release"], data.get("previous"), data["files"], data.get("removed", []))
+
+
+def previous_release(release: str) -> str | None:
+    """Release anterior mais recente com manifesto salvo."""
+    if not MANIFEST_DIR.exists():
+        return None
+    older = sorted(p.stem for p in MANIFEST_DIR.glob("*.json") if p.stem < release)
+    return older[-1] if older else None
+
+
+def _same_remote(entry: FileEntry, remote: RemoteInfo) -> bool:
+    """Metadados remotos idênticos aos registrados na release anterior."""
+    if not remote.size or remote.size != entry.size:
+        return False
+    if remote.etag and entry.etag:
+        return remote.etag == entry.etag
+    if remote.last_modified and entry.last_modified:
+        return remote.last_modified == entry.last_modified
+    return False
+
+
+def carry_over_unchanged(
+    current: DownloadManifest,
+    previous: DownloadManifest | None,
+    path: Path,
+    remote: RemoteInfo,
+) -> bool:
+    """
+    Se o arquivo remoto é o mesmo da release anterior e a cópia local ainda é
+    a daquela release, reaproveita a entrada do manifesto sem baixar de novo.
+    """
+    if previous is None or path.name in current.files:
+        return False
+    entry = previous.files.get(path.name)
+    if entry is None or not path.exists() or not _same_remote(entry, remote):
+        return False
+
+    stat = path.stat()
+    if stat.st_size != entry.size or stat.st_mtime_ns != entry.mtime_ns:
+        # Cópia local não é mais a registrada: deixa a verificação normal decidir
+        return False
+
+    current.files[path.name] = FileEntry(**{**entry.__dict__, "etag": remote.etag, "last_modified": remote.last_modified})
+    current.save()
+    return True
+
+
+def compute_delta(current: DownloadManifest, previous: DownloadManifest | None, listed=None) -> ReleaseDelta:
+    """
+    Classifica os arquivos da release atual comparando o SHA-256 com a anterior.
+    `listed`: arquivos publicados na release; os que não estão no manifesto
+    (falha de rede) ficam `unknown`, e só um arquivo ausente da listagem é `removed`.
+    """
+    delta = ReleaseDelta(current.release, previous.release if previous else None)
+    previous_files = previous.files if previous else {}
+    listed = set(current.files) if listed is None else set(listed) | set(current.files)
+
+    for name in sorted(listed):
+        entry = current.files.get(name)
+        old = previous_files.get(name)
+        if entry is None:
+            delta.files[name] = UNKNOWN
+        elif old is None:
+            delta.files[name] = NEW
+        elif old.sha256 == entry.sha256:
+            delta.files[name] = UNCHANGED
+        else:
+            delta.files[name] = CHANGED
+
+    delta.removed = [name for name in previous_files if name not in listed]
+    return delta
@@ -0,0 +1,187 @@
+"""
+Releases em schemas próprios, com troca atômica para os leitores (RELEASE_SCHEMAS=1).
+
+Cada release é carregada no seu schema (`release_2026_09`): as etapas de
+carga (02, 04, 05) e o quality gate (08) conectam com
+`search_path=release_<...>` (via PGOPTIONS, lido pela libpq), então nenhum
+SQL muda e nada em `public` ou na release publicada é tocado durante a carga.
+
+Os leitores usam o schema `current`: uma view por tabela publicada
+(`current.empresas` -> `release_2026_09.empresas`). Aprovado o gate, a etapa
+09 (src/09_release_cutover.py) aponta todas as views para o schema novo numa
+única transação; as views de `analytics` leem de `current` e seguem a troca
+(as materialized views, no REFRESH seguinte da etapa 07).
+As releases anteriores ficam retidas (RELEASE_RETAIN) para rollback, que é a
+mesma troca no sentido inverso. O histórico fica em `public.release_history`:
+o rollback não grava uma troca nova, marca a última como revertida
+(`reverted_at`), então rollbacks seguidos recuam release a release.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from src.config import pipeline_settings
+from src.ingest import bulk, load_manifest
+from src.ingest.layout import DOMAIN_MAPPING
+from src.ingest.secondary_cnae import BRIDGE
+
+logger = logging.getLogger(__name__)
+
+CURRENT_SCHEMA = "current"
+SCHEMA_PREFIX = "release_"
+# Relações expostas em `current` (as que existirem no schema da release)
+PUBLISHED = (*bulk.TABLES, BRIDGE, *sorted(DOMAIN_MAPPING.values()))
+
+HISTORY_DDL = """
+CREATE TABLE IF NOT EXISTS public.release_history (
+    id BIGSERIAL PRIMARY KEY,
+    schema_name TEXT NOT NULL,
+    previous_schema TEXT,
+    activated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE public.release_history ADD COLUMN IF NOT EXISTS reverted_at TIMESTAMPTZ
+"""
+
+
+def enabled() -> bool:
+    """Como o bulk, não se aplica ao delta: o schema de uma release começa vazio."""
+    return pipeline_settings.release_schemas and not (pipeline_settings.delta and pipeline_settings.mode == "full")
+
+
+def schema_for(release: str) -> str:
+    return SCHEMA_PREFIX + re.sub(r"[^0-9a-z]+", "_", release.lower()).strip("_")
+
+
+def use_load_schema() -> str | None:
+    """
+    Direciona as conexões deste processo ao schema da release em carga
+    (PGOPTIONS; o `options` de bulk.session_connect_args o inclui). Chamar no
+    início do main(), antes de abrir conexões. Retorna o schema, ou None.
+    """
+    if not enabled():
+        return None
+    schema = schema_for(load_manifest.current_release())
+    # Só o schema da release: um DROP/CREATE sem qualificação nunca alcança public
+    os.environ["PGOPTIONS"] = f"{os.getenv('PGOPTIONS', '')} -c search_path={schema}".strip()
+    return schema
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def release_schemas(conn) -> list[str]:
+    """Schemas de release existentes, do mais recente (pelo nome) ao mais antigo."""
+    return conn.execute(text(
+        "SELECT nspname FROM pg_namespace WHERE starts_with(nspname, :prefix) ORDER BY nspname DESC"
+    ), {"prefix": SCHEMA_PREFIX}).scalars().all()
+
+
+def active_schema(conn) -> str | None:
+    """Schema para o qual `current` aponta (última troca não revertida)."""
+    entry = _last_cutover(conn)
+    return entry.schema_name if entry else None
+
+
+def _last_cutover(conn):
+    """Última troca não revertida (id, schema_name, previous_schema), ou None."""
+    if not _exists(conn, "public.release_history"):
+        return None
+    return conn.execute(text(
+        "SELECT id, schema_name, previous_schema FROM public.release_history "
+        "WHERE reverted_at IS NULL ORDER BY id DESC LIMIT 1"
+    )).first()
+
+
+def _repoint(conn, relation: str, schema: str) -> None:
+    view = f"{CURRENT_SCHEMA}.{relation}"
+    try:
+        with conn.begin_nested():
+            conn.execute(text(f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM {schema}.{relation}"))
+        return
+    except DBAPIError:
+        # Colunas diferentes (ex.: troca de SCHEMA_VARIANT): recria a view e as que dependem dela
+        logger.warning(f"⚠️ {view}: estrutura mudou; recriando a view e as dependentes.")
+    dependents = bulk.dependent_views(conn, view) if _exists(conn, view) else []
+    bulk.drop_views(conn, dependents)
+    conn.execute(text(f"DROP VIEW IF EXISTS {view}"))
+    conn.execute(text(f"CREATE VIEW {view} AS SELECT * FROM {schema}.{relation}"))
+    bulk.create_views(conn, dependents)
+
+
+def _switch(conn, schema: str) -> list[str]:
+    """Aponta as views de `current` para `schema` (na transação de `conn`). Retorna as relações trocadas."""
+    relations = [r for r in PUBLISHED if _exists(conn, f"{schema}.{r}")]
+    if "empresas" not in relations or not conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {schema}.empresas)")).scalar():
+        raise RuntimeError(f"{schema}.empresas ausente ou vazia: troca cancelada.")
+    conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {CURRENT_SCHEMA}"))
+    for relation in relations:
+        _repoint(conn, relation, schema)
+    # Ex.: estabelecimento_cnae só existe no esquema texto; não fica apontando para a release anterior
+    stale = [r for r in PUBLISHED if r not in relations and _exists(conn, f"{CURRENT_SCHEMA}.{r}")]
+    for relation in stale:
+        conn.execute(text(f"DROP VIEW {CURRENT_SCHEMA}.{relation}"))
+    if stale:
+        logger.warning(f"⚠️ Sem correspondente em {schema}, removidas de {CURRENT_SCHEMA}: {', '.join(stale)}.")
+    return relations
+
+
+def _lock(conn) -> None:
+    # Uma troca por vez
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('release_cutover'))"))
+    conn.execute(text(HISTORY_DDL))
+
+
+def cutover(engine, schema: str) -> list[str]:
+    """Aponta as views de `current` para `schema`, numa única transação. Retorna as relações trocadas."""
+    with engine.begin() as conn:
+        _lock(conn)
+        previous = active_schema(conn)
+        relations = _switch(conn, schema)
+        conn.execute(text("INSERT INTO public.release_history (schema_name, previous_schema) VALUES (:s, :p)"),
+                     {"s": schema, "p": previous})
+    logger.info(f"🔀 {CURRENT_SCHEMA} -> {schema} ({len(relations)} relações; antes: {previous or 'nenhum'}).")
+    return relations
+
+
+def rollback(engine) -> str | None:
+    """
+    Desfaz a última troca não revertida: volta `current` ao schema anterior, se
+    ainda retido, e marca a troca como revertida. Chamado de novo, recua mais uma.
+    """
+    with engine.begin() as conn:
+        _lock(conn)
+        last = _last_cutover(conn)
+        previous = last.previous_schema if last else None
+        if not previous or previous not in release_schemas(conn):
+            logger.error(f"❌ Nenhuma release anterior disponível para rollback ({previous or 'sem histórico'}).")
+            return None
+        relations = _switch(conn, previous)
+        conn.execute(text("UPDATE public.release_history SET reverted_at = now() WHERE id = :id"), {"id": last.id})
+    logger.info(f"⏪ {CURRENT_SCHEMA} -> {previous} ({len(relations)} relações; revertida: {last.schema_name}).")
+    return previous
+
+
+def retain(engine, keep: int) -> list[str]:
+    """
+    Mantém o schema ativo, os mais novos que ele (carregados, ainda sem troca)
+    e os `keep - 1` imediatamente anteriores; remove os demais.
+    """
+    dropped = []
+    with engine.begin() as conn:
+        active = active_schema(conn)
+        schemas = release_schemas(conn)
+        if active not in schemas:
+            return dropped
+        older = schemas[schemas.index(active) + 1:]
+        for schema in older[max(keep - 1, 0):]:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            dropped.append(schema)
+    if dropped:
+        logger.info(f"🧹 Releases removidas (retenção {keep}): {', '.join(dropped)}.")
+    return dropped
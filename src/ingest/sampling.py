@@ -0,0 +1,100 @@
+"""
+Estratégias de amostragem do modo SAMPLE (SAMPLE_STRATEGY).
+
+- head:      primeiras `sample_rows` linhas (comportamento original).
+- reservoir: amostra uniforme de `sample_rows` linhas em uma única passada,
+             com memória O(k) (Algoritmo L) e seed fixa por arquivo.
+- hash:      mantém as linhas cujo hash de `cnpj_basico` fica abaixo de
+             SAMPLE_HASH_RATE. Como depende só da chave e da seed, seleciona
+             as mesmas empresas em Empresas, Estabelecimentos e Socios, sem
+             precisar do índice de chaves.
+"""
+from __future__ import annotations
+
+import math
+import random
+import zlib
+
+import numpy as np
+
+from src.ingest.key_index import keys_to_ints
+
+STRATEGIES = ("head", "reservoir", "hash")
+
+_MASK64 = (1 << 64) - 1
+
+
+def member_seed(seed: int, name: str) -> int:
+    """Seed estável por membro: arquivos diferentes não repetem a mesma sequência."""
+    return ((seed & 0xFFFFFFFF) << 32) ^ zlib.crc32(name.encode("utf-8"))
+
+
+def splitmix64(values: np.ndarray) -> np.ndarray:
+    """Finalizador SplitMix64 vetorizado (aritmética uint64 com overflow)."""
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_threshold(rate: float) -> int:
+    return min(_MASK64, max(0, int(rate * 2.0 ** 64)))
+
+
+def hash_mask(keys, seed: int, rate: float) -> np.ndarray:
+    """Máscara das chaves selecionadas pela amostragem por hash (chaves inválidas ficam de fora)."""
+    ints, valid = keys_to_ints(keys)
+    hashed = splitmix64(ints.astype(np.uint64) ^ np.uint64(seed & _MASK64))
+    return valid & (hashed < np.uint64(hash_threshold(rate)))
+
+
+class Reservoir:
+    """
+    Amostragem por reservatório (Algoritmo L): k itens uniformes de um stream
+    de tamanho desconhecido. Os saltos são geométricos, então só as linhas
+    efetivamente sorteadas custam alguma coisa. O resultado sai na ordem
+    original do arquivo.
+    """
+
+    def __init__(self, k: int, seed: int):
+        self.k = k
+        self.seen = 0
+        self._rng = random.Random(seed)
+        self._items: list[tuple[int, object]] = []
+        self._w = 1.0
+        self._next = 0
+
+    def _uniform(self) -> float:
+        u = self._rng.random()
+        while u == 0.0:
+            u = self._rng.random()
+        return u
+
+    def _advance(self, position: int) -> None:
+        """Sorteia a próxima posição (global) a entrar no reservatório."""
+        self._w *= math.exp(math.log(self._uniform()) / self.k)
+        self._next = position + int(math.log(self._uniform()) / math.log1p(-self._w)) + 1
+
+    def offer(self, rows: list) -> None:
+        start, n = self.seen, len(rows)
+        if self.k <= 0:
+            self.seen += n
+            return
+
+        taken = 0
+        if len(self._items) < self.k:
+            taken = min(self.k - len(self._items), n)
+            self._items.extend(zip(range(start, start + taken), rows[:taken]))
+            if len(self._items) == self.k:
+                self._advance(start + taken - 1)
+
+        if len(self._items) == self.k:
+            while self._next < start + n:
+                position = self._next
+                self._items[self._rng.randrange(self.k)] = (position, rows[position - start])
+                self._advance(position)
+
+        self.seen += n
+
+    def result(self) -> list:
+        return [row for _, row in sorted(self._items, key=lambda item: item[0])]
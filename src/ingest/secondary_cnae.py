@@ -0,0 +1,84 @@
+"""
+CNAEs secundários indexáveis (estabelecimentos.cnae_fiscal_secundaria).
+
+Na origem, os CNAEs secundários são uma lista separada por vírgulas; buscar
+"estabelecimentos com o CNAE X, principal ou secundário" sobre esse texto
+exige ler e comparar todas as linhas. Ao fim da etapa 04:
+
+- esquema tipado: a coluna já chega como smallint[] de ids de dim_cnae
+  (convertida na extração, ver src/ingest/pgcopy.py); o índice GIN e o
+  B-tree em cnae_fiscal_principal são declarados em src/ingest/indexes.py
+  (etapa 05):
+      WHERE cnae_fiscal_principal = :id OR cnae_fiscal_secundaria @> ARRAY[:id]::smallint[]
+- esquema texto: a tabela ponte `estabelecimento_cnae` (uma linha por
+  estabelecimento e CNAE, principal e secundários) é reconstruída em lote
+  com um único INSERT ... SELECT, indexada por cnae e trocada atomicamente
+  com a anterior:
+      SELECT ... FROM estabelecimento_cnae WHERE cnae = :codigo
+
+A tabela ponte não é mantida incrementalmente (delta/merge): a reconstrução
+é uma leitura sequencial de estabelecimentos.
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from sqlalchemy import text
+
+from src.config import pipeline_settings
+from src.ingest import bulk
+
+logger = logging.getLogger(__name__)
+
+TABLE = "estabelecimentos"
+BRIDGE = "estabelecimento_cnae"
+REBUILD_SUFFIX = "_rebuild"
+
+
+def _exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def rebuild_bridge(engine) -> int:
+    """Esquema texto: reconstrói estabelecimento_cnae e troca com a anterior. Retorna as linhas."""
+    staging = BRIDGE + REBUILD_SUFFIX
+    start = time.time()
+    with engine.begin() as conn:
+        if not _exists(conn, TABLE):
+            return 0
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        conn.execute(text(f"""
+            CREATE TABLE {staging} (
+                cnpj_basico CHAR(8) NOT NULL,
+                cnpj_ordem CHAR(4) NOT NULL,
+                cnpj_dv CHAR(2) NOT NULL,
+                cnae VARCHAR(7) NOT NULL,
+                principal BOOLEAN NOT NULL
+            )
+        """))
+        rows = conn.execute(text(f"""
+            INSERT INTO {staging}
+            SELECT cnpj_basico, cnpj_ordem, cnpj_dv, cnae_fiscal_principal, true
+            FROM {TABLE}
+            WHERE cnae_fiscal_principal <> ''
+            UNION ALL
+            SELECT e.cnpj_basico, e.cnpj_ordem, e.cnpj_dv, btrim(s.cnae), false
+            FROM {TABLE} e, unnest(string_to_array(e.cnae_fiscal_secundaria, ',')) AS s(cnae)
+            WHERE btrim(s.cnae) <> ''
+        """)).rowcount
+        conn.execute(text(f"CREATE INDEX {staging}_cnae_idx ON {staging} (cnae)"))
+        conn.execute(text(f"ANALYZE {staging}"))
+    logger.info(f"🧩 {BRIDGE}: {rows:,} pares estabelecimento x CNAE ({time.time() - start:.1f}s).")
+
+    bulk.swap_in(engine, (BRIDGE,), suffix=REBUILD_SUFFIX)
+    with engine.begin() as conn:
+        # O índice mantém o nome da tabela de origem: volta ao nome estável
+        conn.execute(text(f"ALTER INDEX IF EXISTS {staging}_cnae_idx RENAME TO {BRIDGE}_cnae_idx"))
+    return rows
+
+
+def finalize(engine) -> None:
+    """Esquema texto: reconstrói a tabela ponte (no tipado, basta o índice da etapa 05)."""
+    if pipeline_settings.schema_variant != "typed":
+        rebuild_bridge(engine)
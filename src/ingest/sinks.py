@@ -0,0 +1,300 @@
+"""
+Formatos da camada processada (PROCESSED_FORMAT).
+
+- csv:     `;`-delimitado, UTF-8 (padrão; carregado direto via COPY).
+- parquet: colunas do layout oficial, colunas de baixa cardinalidade com
+           dictionary encoding e row groups com estatísticas min/max (inclusive
+           de `cnpj_basico`), o que permite predicate pushdown nas leituras.
+           Requer `pyarrow` (importado só quando o formato é usado).
+- pgcopy:  com SCHEMA_VARIANT=typed, substitui os dois acima: tuplas já no
+           formato binário do COPY, com os tipos de sql/create_tables_typed.sql
+           (ver src/ingest/pgcopy.py).
+
+As saídas são gravadas em `<arquivo>.tmp` e renomeadas ao fechar, então um
+arquivo final nunca fica pela metade. Cada writer acumula em `write_seconds`
+o tempo gasto gravando (conversão, codificação e I/O), separado do parsing.
+"""
+from __future__ import annotations
+
+import abc
+import csv
+import functools
+import io
+import json
+import time
+from pathlib import Path
+from typing import Iterator
+
+from src.config import pipeline_settings
+from src.ingest import pgcopy
+from src.ingest.layout import DICTIONARY_COLUMNS, TABLE_COLUMNS, table_for_member
+from src.ingest.stream_unzip import ChunkReader
+
+PROCESSED_FORMATS = ("csv", "parquet")
+PARQUET_SUFFIX = ".parquet"
+# Linhas por row group (e por lote de leitura)
+ROW_GROUP_ROWS = 250_000
+PARQUET_COMPRESSION = "zstd"
+# Saídas de cada release no diretório da extração: as de releases anteriores
+# continuam lá, e a etapa 04 carrega só as da release em carga
+RELEASE_OUTPUTS_NAME = "release_outputs.json"
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("PROCESSED_FORMAT=parquet requer o pacote 'pyarrow' (pip install pyarrow).") from e
+    return pa, pq
+
+
+def output_path(output_dir: Path, member_name: str, fmt: str | None = None) -> Path:
+    """Caminho da saída processada de um membro de zip no formato ativo."""
+    if fmt is None:
+        fmt = "pgcopy" if pipeline_settings.schema_variant == "typed" else pipeline_settings.processed_format
+    suffix = {"parquet": PARQUET_SUFFIX, "pgcopy": pgcopy.PGCOPY_SUFFIX}.get(fmt, "")
+    return output_dir / f"{member_name}{suffix}"
+
+
+def record_release_outputs(output_dir: Path, release: str, outputs: dict[str, list[str]]) -> None:
+    """Registra, por zip, as saídas (nomes de arquivo) que a etapa 03 produziu ou reaproveitou para `release`."""
+    path = output_dir / RELEASE_OUTPUTS_NAME
+    recorded = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    recorded[release] = {zip_name: sorted(set(names)) for zip_name, names in sorted(outputs.items())}
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(recorded, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def release_outputs(output_dir: Path, release: str) -> dict[str, list[str]] | None:
+    """Saídas registradas para `release`, por zip, ou None se a extração não as registrou."""
+    path = output_dir / RELEASE_OUTPUTS_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8")).get(release)
+
+
+def parquet_schema(table: str):
+    pa, _ = _pyarrow()
+    dictionary = set(DICTIONARY_COLUMNS.get(table, []))
+    return pa.schema([
+        pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name in dictionary else pa.string())
+        for name in TABLE_COLUMNS[table]
+    ])
+
+
+def _timed(method):
+    """Soma a duração da chamada em `self.write_seconds`."""
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self.write_seconds += time.perf_counter() - start
+    return wrapper
+
+
+class _AtomicSink(abc.ABC):
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.write_seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        start = time.perf_counter()
+        self._close_handle()
+        self.write_seconds += time.perf_counter() - start
+        if exc_type is None:
+            self.tmp_path.replace(self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+        return False
+
+    @abc.abstractmethod
+    def _close_handle(self) -> None:
+        """Fecha o arquivo temporário (antes da renomeação)."""
+
+
+class CsvSink(_AtomicSink):
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._file = open(self.tmp_path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file, delimiter=";")
+
+    @_timed
+    def write_rows(self, rows: list[list[str]]) -> None:
+        self._writer.writerows(rows)
+
+    @_timed
+    def write_batch(self, batch) -> None:
+        """Grava um RecordBatch do pyarrow (motor arrow) numa única chamada."""
+        pa, _ = _pyarrow()
+        from pyarrow import csv as pa_csv
+
+        buffer = pa.BufferOutputStream()
+        pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=False, delimiter=";"))
+        self._file.flush()
+        self._file.buffer.write(buffer.getvalue().to_pybytes())
+
+    def _close_handle(self) -> None:
+        self._file.close()
+
+
+class ParquetSink(_AtomicSink):
+    """Acumula linhas e grava um row group a cada ROW_GROUP_ROWS."""
+
+    def __init__(self, path: Path, table: str, row_group_rows: int = ROW_GROUP_ROWS):
+        super().__init__(path)
+        pa, pq = _pyarrow()
+        self._pa = pa
+        self.columns = TABLE_COLUMNS[table]
+        self.schema = parquet_schema(table)
+        self.row_group_rows = row_group_rows
+        self._dictionary = set(DICTIONARY_COLUMNS.get(table, []))
+        self._pending: list[list[str]] = []
+        self._pending_batches = []
+        self._pending_batch_rows = 0
+        self._writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=PARQUET_COMPRESSION)
+
+    @_timed
+    def write_rows(self, rows: list[list[str]]) -> None:
+        self._pending.extend(rows)
+        while len(self._pending) >= self.row_group_rows:
+            self._flush(self._pending[:self.row_group_rows])
+            self._pending = self._pending[self.row_group_rows:]
+
+    @_timed
+    def write_batch(self, batch) -> None:
+        """Acumula RecordBatches (motor arrow, só texto/NULL) até completar um row group."""
+        self._pending_batches.append(batch)
+        self._pending_batch_rows += batch.num_rows
+        if self._pending_batch_rows >= self.row_group_rows:
+            self._flush_batches()
+
+    def _flush_batches(self) -> None:
+        pa = self._pa
+        table = pa.Table.from_batches(self._pending_batches)
+        arrays = [
+            column.dictionary_encode() if name in self._dictionary else column
+            for name, column in zip(self.columns, table.columns)
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=self.row_group_rows)
+        self._pending_batches = []
+        self._pending_batch_rows = 0
+
+    def _flush(self, rows: list[list[str]]) -> None:
+        import pyarrow.compute as pc
+
+        pa = self._pa
+        width = len(self.columns)
+        # Linhas malformadas (colunas a mais/a menos) são ajustadas ao layout
+        rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+        arrays = []
+        for name, values in zip(self.columns, zip(*rows)):
+            array = pa.array(values, type=pa.string())
+            # Vazio no CSV vira NULL no COPY (NULL ''): mantém a mesma semântica
+            array = pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+            arrays.append(array.dictionary_encode() if name in self._dictionary else array)
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self._writer.write_table(table, row_group_size=len(rows))
+
+    def _close_handle(self) -> None:
+        if self._pending:
+            self._flush(self._pending)
+            self._pending = []
+        if self._pending_batches:
+            self._flush_batches()
+        self._writer.close()
+
+
+class PgCopySink(_AtomicSink):
+    """Grava header, tuplas binárias (convertidas lote a lote) e trailer do COPY binário."""
+
+    def __init__(self, path: Path, table: str):
+        super().__init__(path)
+        self._pa, _ = _pyarrow()
+        self.table = table
+        self.columns = TABLE_COLUMNS[table]
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(pgcopy.HEADER)
+
+    @_timed
+    def write_rows(self, rows: list[list[str]]) -> None:
+        if not rows:
+            return
+        pa = self._pa
+        width = len(self.columns)
+        rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+        arrays = [pa.array(values, type=pa.string()) for values in zip(*rows)]
+        self._write(pa.RecordBatch.from_arrays(arrays, names=self.columns))
+
+    @_timed
+    def write_batch(self, batch) -> None:
+        self._write(batch)
+
+    def _write(self, batch) -> None:
+        self._file.write(pgcopy.encode_batch(batch, self.table))
+
+    def _close_handle(self) -> None:
+        if not self._file.closed:
+            self._file.write(pgcopy.TRAILER)
+            self._file.close()
+
+
+def open_sink(path: Path):
+    """Abre o writer adequado à extensão de `path`."""
+    if path.name.endswith(PARQUET_SUFFIX):
+        return ParquetSink(path, table_for_member(path.name))
+    if path.name.endswith(pgcopy.PGCOPY_SUFFIX):
+        return PgCopySink(path, table_for_member(path.name))
+    return CsvSink(path)
+
+
+def read_key_batches(path: Path, size: int) -> Iterator[list[str]]:
+    """Coluna cnpj_basico de uma saída processada (CSV, Parquet ou pgcopy), em lotes."""
+    if path.name.endswith(pgcopy.PGCOPY_SUFFIX):
+        yield from pgcopy.read_key_batches(path, size)
+        return
+    if path.name.endswith(PARQUET_SUFFIX):
+        _, pq = _pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=size, columns=["cnpj_basico"]):
+            yield [key for key in batch.column(0).to_pylist() if key]
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        batch = []
+        for row in csv.reader(f, delimiter=";"):
+            if row:
+                batch.append(row[0])
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def parquet_as_csv(path: Path) -> io.BufferedReader:
+    """
+    Stream binário com o conteúdo de um Parquet em CSV UTF-8 (`;`, sem header),
+    no mesmo formato das saídas CSV: serve direto de entrada para o COPY.
+    Convertido row group a row group, sem materializar o arquivo inteiro.
+    """
+    pa, pq = _pyarrow()
+    from pyarrow import csv as pa_csv
+
+    options = pa_csv.WriteOptions(include_header=False, delimiter=";")
+
+    def _chunks():
+        parquet = pq.ParquetFile(path)
+        plain = pa.schema([pa.field(f.name, pa.string()) for f in parquet.schema_arrow])
+        for batch in parquet.iter_batches(batch_size=ROW_GROUP_ROWS):
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(batch.cast(plain), sink, options)
+            yield sink.getvalue().to_pybytes()
+
+    return io.BufferedReader(ChunkReader(_chunks()), buffer_size=1024 * 1024)
@@ -0,0 +1,190 @@
+"""
+Descompactação de zip em streaming, sem precisar do arquivo inteiro em disco.
+
+Lê os *local file headers* à medida que os bytes chegam (ex.: de um download
+HTTP) e entrega o conteúdo descompactado de cada membro em blocos. Suporta
+membros `stored` e `deflate`, data descriptors (flag bit 3) e Zip64.
+O diretório central no fim do arquivo é ignorado.
+"""
+from __future__ import annotations
+
+import io
+import struct
+import zlib
+from typing import Iterable, Iterator
+
+LOCAL_HEADER_SIG = 0x04034B50
+CENTRAL_DIR_SIG = 0x02014B50
+DATA_DESCRIPTOR_SIG = 0x08074B50
+ZIP64_EXTRA_ID = 0x0001
+
+STORED = 0
+DEFLATED = 8
+
+
+class StreamUnzipError(Exception):
+    """Estrutura de zip inválida ou não suportada no modo streaming."""
+
+
+class _ByteSource:
+    """Buffer sobre um iterador de bytes com leitura exata e devolução (unread)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def _fill(self) -> bool:
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        return False
+
+    def read_exact(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            if not self._fill():
+                raise StreamUnzipError("Fim inesperado do stream")
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def read_up_to(self, n: int) -> bytes:
+        if not self._buffer and not self._fill():
+            return b""
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self._buffer = data + self._buffer
+
+    def peek_signature(self) -> int | None:
+        while len(self._buffer) < 4:
+            if not self._fill():
+                return None
+        return struct.unpack("<I", self._buffer[:4])[0]
+
+
+def _zip64_sizes(extra: bytes, comp_size: int, uncomp_size: int) -> tuple[int, int, bool]:
+    """Aplica o campo extra Zip64 (se houver) aos tamanhos do header."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[pos:pos + 4])
+        if header_id == ZIP64_EXTRA_ID:
+            data = extra[pos + 4:pos + 4 + size]
+            values = [struct.unpack("<Q", data[i:i + 8])[0] for i in range(0, len(data) - len(data) % 8, 8)]
+            # A ordem é fixa (uncompressed, compressed), mas só aparecem os que estouraram 32 bits
+            if uncomp_size == 0xFFFFFFFF and values:
+                uncomp_size = values.pop(0)
+            if comp_size == 0xFFFFFFFF and values:
+                comp_size = values.pop(0)
+            return comp_size, uncomp_size, True
+        pos += 4 + size
+    return comp_size, uncomp_size, False
+
+
+def _read_data_descriptor(source: _ByteSource, zip64: bool) -> int:
+    """Consome o data descriptor e retorna o CRC declarado."""
+    head = source.read_exact(4)
+    if struct.unpack("<I", head)[0] != DATA_DESCRIPTOR_SIG:
+        # A assinatura é opcional: os 4 bytes já eram o CRC
+        source.unread(head)
+    crc = struct.unpack("<I", source.read_exact(4))[0]
+    source.read_exact(16 if zip64 else 8)
+    return crc
+
+
+def _iter_member_data(source: _ByteSource, method: int, flags: int, comp_size: int,
+                      expected_crc: int, zip64: bool, block_size: int) -> Iterator[bytes]:
+    has_descriptor = bool(flags & 0x08)
+    crc = 0
+
+    if method == DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        remaining = None if has_descriptor else comp_size
+        while not decompressor.eof:
+            want = block_size if remaining is None else min(block_size, remaining)
+            if remaining == 0:
+                break
+            raw = source.read_up_to(want)
+            if not raw:
+                raise StreamUnzipError("Stream terminou dentro de um membro deflate")
+            if remaining is not None:
+                remaining -= len(raw)
+            data = decompressor.decompress(raw)
+            if data:
+                crc = zlib.crc32(data, crc)
+                yield data
+        tail = decompressor.flush()
+        if tail:
+            crc = zlib.crc32(tail, crc)
+            yield tail
+        if decompressor.unused_data:
+            source.unread(decompressor.unused_data)
+    elif method == STORED:
+        if has_descriptor:
+            raise StreamUnzipError("Membro 'stored' com data descriptor não é suportado em streaming")
+        remaining = comp_size
+        while remaining:
+            data = source.read_up_to(min(block_size, remaining))
+            if not data:
+                raise StreamUnzipError("Stream terminou dentro de um membro stored")
+            remaining -= len(data)
+            crc = zlib.crc32(data, crc)
+            yield data
+    else:
+        raise StreamUnzipError(f"Método de compressão não suportado: {method}")
+
+    if has_descriptor:
+        expected_crc = _read_data_descriptor(source, zip64)
+    if crc != expected_crc:
+        raise StreamUnzipError(f"CRC divergente ({crc:08x} != {expected_crc:08x})")
+
+
+def iter_members(chunks: Iterable[bytes], block_size: int = 1024 * 1024) -> Iterator[tuple[str, Iterator[bytes]]]:
+    """
+    Itera os membros de um zip recebido em `chunks`.
+    Gera (nome, blocos_descompactados). Cada membro deve ser consumido
+    por completo antes de avançar para o próximo.
+    """
+    source = _ByteSource(chunks)
+    while True:
+        signature = source.peek_signature()
+        if signature is None or signature == CENTRAL_DIR_SIG:
+            return
+        if signature != LOCAL_HEADER_SIG:
+            raise StreamUnzipError(f"Assinatura inesperada: {signature:#010x}")
+
+        header = source.read_exact(30)
+        (_, _, flags, method, _, _, crc, comp_size, uncomp_size,
+         name_len, extra_len) = struct.unpack("<IHHHHHIIIHH", header)
+        name = source.read_exact(name_len).decode("utf-8" if flags & 0x800 else "cp437")
+        extra = source.read_exact(extra_len)
+        comp_size, uncomp_size, zip64 = _zip64_sizes(extra, comp_size, uncomp_size)
+
+        data = _iter_member_data(source, method, flags, comp_size, crc, zip64, block_size)
+        yield name, data
+
+        # Garante o avanço caso o consumidor tenha parado no meio
+        for _ in data:
+            pass
+
+
+class ChunkReader(io.RawIOBase):
+    """Adapta um iterador de blocos para um arquivo binário de leitura."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
@@ -0,0 +1,71 @@
+"""
+Manutenção por partição (ver src/ingest/partitioning.py).
+
+Roda VACUUM/ANALYZE/REINDEX em cada partição folha, uma por vez, sem tocar
+nas demais: dá para manter só as UFs que mudaram, ou espalhar a manutenção
+de uma tabela grande em janelas menores.
+
+    python -m src.maintain_partitions --table estabelecimentos --partition sp --partition rj
+    python -m src.maintain_partitions --table socios --reindex
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import create_engine, text
+
+from src.config import settings
+from src.ingest import partitioning, release_schema
+from src.runners.bootstrap import bootstrap
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("PartitionMaintenance")
+
+
+def main():
+    bootstrap()
+    parser = argparse.ArgumentParser(description="VACUUM/ANALYZE/REINDEX por partição")
+    parser.add_argument("--table", action="append", choices=["estabelecimentos", "socios"],
+                        help="Tabela particionada (repetível; padrão: ambas)")
+    parser.add_argument("--partition", action="append", default=[],
+                        help="Sufixo da partição, ex.: sp, default, 03 (repetível; padrão: todas)")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) — padrão se nada for escolhido")
+    parser.add_argument("--analyze", action="store_true", help="Só ANALYZE")
+    parser.add_argument("--reindex", action="store_true", help="REINDEX TABLE CONCURRENTLY")
+    args = parser.parse_args()
+
+    if not (args.vacuum or args.analyze or args.reindex):
+        args.vacuum = True
+    tables = args.table or ["estabelecimentos", "socios"]
+    wanted = {p.lower() for p in args.partition}
+
+    # RELEASE_SCHEMAS: as partições da release carregada, não as de public
+    schema = release_schema.use_load_schema()
+    if schema:
+        logger.info(f"🗂️  Mantendo o schema {schema}.")
+    # VACUUM e REINDEX CONCURRENTLY não rodam dentro de transação
+    engine = create_engine(settings.sqlalchemy_url, isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        for table in tables:
+            if not partitioning.is_partitioned(conn, table):
+                logger.warning(f"⚠️ {table} não é particionada. Pulando.")
+                continue
+            prefix = table + partitioning.PARTITION_INFIX
+            leaves = [leaf for leaf in partitioning.leaves(conn, table)
+                      if not wanted or leaf.removeprefix(prefix) in wanted]
+            logger.info(f"🧩 {table}: {len(leaves)} partições.")
+            for leaf in leaves:
+                start = time.time()
+                if args.vacuum:
+                    conn.execute(text(f"VACUUM (ANALYZE) {leaf}"))
+                elif args.analyze:
+                    conn.execute(text(f"ANALYZE {leaf}"))
+                if args.reindex:
+                    conn.execute(text(f"REINDEX TABLE CONCURRENTLY {leaf}"))
+                logger.info(f"✅ {leaf} ({time.time() - start:.1f}s)")
+
+    logger.info("🎉 Manutenção concluída.")
+
+
+if __name__ == "__main__":
+    main()
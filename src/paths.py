@@ -19,6 +19,8 @@ RAW_DIR = DATA_ROOT / "raw"
 PROCESSED_DIR = DATA_ROOT / "processed"
 SAMPLE_DIR = DATA_ROOT / "processed_sample"
 TMP_DIR = DATA_ROOT / "tmp"
+CACHE_DIR = DATA_ROOT / "cache"
+METRICS_DIR = DATA_ROOT / "metrics"
 
 def validate_data_root() -> None:
     """
@@ -34,7 +36,7 @@ def validate_data_root() -> None:
             )
 
 def ensure_dirs() -> None:
-    for p in (RAW_DIR, PROCESSED_DIR, TMP_DIR, SAMPLE_DIR):
+    for p in (RAW_DIR, PROCESSED_DIR, TMP_DIR, SAMPLE_DIR, CACHE_DIR, METRICS_DIR):
         p.mkdir(parents=True, exist_ok=True)
 
 SAMPLE_DIR = DATA_ROOT / "processed_sample"
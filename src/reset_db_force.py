@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine, text
 from src.config import settings
+from src.ingest import bulk, load_manifest
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +24,9 @@ def main():
         # Recreate
         logger.info("🏗️ Recriando tabelas...")
         conn.execute(text(sql))
+        cursor = conn.connection.cursor()
+        load_manifest.ensure_table(cursor)
+        load_manifest.drop_tables(cursor, bulk.TABLES)
         
     logger.info("✅ Reset concluído com sucesso!")
 
@@ -5,6 +5,8 @@ import time
 import argparse
 import os
 
+from src.ingest import metrics
+
 # Configuração de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,9 +19,19 @@ PIPELINE_STEPS = [
     "src.ingest.01_download",      # Baixa arquivos
     "src.ingest.02_init_db",       # Cria/Reseta tabelas
     "src.ingest.03_extract_files", # Extrai zips
-    "src.ingest.04_load_data"      # Carrega no Banco
+    "src.ingest.04_load_data",     # Carrega no Banco
+    "src.ingest.05_build_indexes"  # Índices e chaves, após a carga
+]
+
+# Com --release-schemas: a release só é publicada se o quality gate aprovar
+RELEASE_STEPS = [
+    "src.08_quality_gate",         # Valida o schema da release carregada
+    "src.09_release_cutover"       # Troca atômica de current + retenção
 ]
 
+# Por último: as views de analytics leem a release publicada (após a troca, com --release-schemas)
+ANALYTICS_STEP = "src.07_promote_to_analytics"
+
 def run_step(module_name: str, dry_run: bool = False) -> None:
     """Executa um módulo python como script e aborta em caso de erro."""
     prefix = "[DRY-RUN] " if dry_run else ""
@@ -55,19 +67,73 @@ def main():
     parser.add_argument("--mode", choices=["full", "sample"], default="sample", help="Modo de execução (padrão: sample)")
     parser.add_argument("--sample-rows", type=int, default=10000, help="Núm. de linhas por arquivo no modo sample")
     parser.add_argument("--sample-files-per-type", type=int, default=1, dest="sample_files", help="Núm. de arquivos por tipo no modo sample")
-    parser.add_argument("--sample-seed", type=int, default=42, help="Seed para seleção aleatória (se implementado)")
+    parser.add_argument("--sample-seed", type=int, default=42, help="Seed das estratégias reservoir e hash")
+    parser.add_argument("--sample-strategy", choices=["head", "reservoir", "hash"], default="head", help="Amostragem: primeiras linhas, reservatório uniforme ou hash do cnpj_basico")
+    parser.add_argument("--sample-hash-rate", type=float, default=0.002, help="Fração de empresas mantida pela estratégia hash")
     parser.add_argument("--force", action="store_true", help="Força a re-extração/re-amostragem de arquivos já existentes")
+    parser.add_argument("--delta", action="store_true", help="Processa apenas os arquivos alterados desde a release anterior (modo full)")
+    parser.add_argument("--stream", action="store_true", help="Extrai os zips em streaming durante o download, sem gravá-los em disco")
+    parser.add_argument("--keep-archive", action="store_true", help="No modo --stream, mantém também o zip em RAW_DIR")
+    parser.add_argument("--extract-workers", type=int, default=1, help="Processos paralelos na extração (1 = sequencial)")
+    parser.add_argument("--extract-engine", choices=["python", "arrow"], default="python", help="Motor de extração: csv.reader linha a linha ou leitor vetorizado do pyarrow")
+    parser.add_argument("--processed-format", choices=["csv", "parquet"], default="csv", help="Formato da camada processada (parquet requer pyarrow)")
+    parser.add_argument("--schema-variant", choices=["text", "typed"], default="text", help="Esquema das tabelas: text (VARCHAR) ou typed (inteiros, datas e numeric; carga via COPY binário, requer pyarrow)")
+    parser.add_argument("--load-workers", type=int, default=1, help="Conexões COPY simultâneas na carga (1 = sequencial)")
+    parser.add_argument("--load-split-mb", type=int, default=0, help="Divide CSVs maiores que N MB em faixas carregadas em paralelo (0 = desligado)")
+    parser.add_argument("--load-batch-rows", type=int, default=1_000_000, help="Linhas por lote confirmado na carga de CSVs (retomada a partir do último lote; 0 = um COPY por arquivo)")
+    parser.add_argument("--bulk", action="store_true", help="Carga em stagings UNLOGGED com troca atômica ao final")
+    parser.add_argument("--merge", action="store_true", help="Atualização incremental: carrega a release em stagings e aplica só inserções, alterações e remoções (MERGE)")
+    parser.add_argument("--sorted-layout", action="store_true", help="Reescreve as tabelas ordenadas por cnpj_basico e cria índices BRIN")
+    parser.add_argument("--partition", choices=["none", "uf", "hash"], default="none", help="Particionamento de estabelecimentos/socios: por UF (LIST) ou hash de cnpj_basico")
+    parser.add_argument("--partition-count", type=int, default=8, help="Número de partições HASH")
+    parser.add_argument("--direct-copy", action="store_true", help="Modo full: COPY direto dos zips (LATIN1), sem CSV intermediário; carrega todas as linhas, inclusive estabelecimentos/sócios sem empresa (órfãos)")
+    parser.add_argument("--index-workers", type=int, default=3, help="Tabelas indexadas em paralelo na etapa 05 (uma conexão cada)")
+    parser.add_argument("--index-parallel-workers", type=int, default=4, help="max_parallel_maintenance_workers de cada construção de índice")
+    parser.add_argument("--release-schemas", action="store_true", help="Carrega a release no seu schema (release_<release>) e publica com troca atômica do schema current após o quality gate")
+    parser.add_argument("--release-retain", type=int, default=2, help="Releases mantidas para rollback, incluindo a publicada")
     parser.add_argument("--dry-run", action="store_true", help="Simula a execução")
     parser.add_argument("--only", type=str, help="Executa apenas uma etapa específica")
 
     args = parser.parse_args()
+    if args.release_schemas and args.delta:
+        parser.error("--release-schemas não se combina com --delta (o schema de uma release começa vazio)")
 
     # Repassa argumentos via variáveis de ambiente para os sub-processos
     os.environ["PIPELINE_MODE"] = args.mode
     os.environ["SAMPLE_ROWS"] = str(args.sample_rows)
     os.environ["SAMPLE_FILES_PER_TYPE"] = str(args.sample_files)
     os.environ["SAMPLE_SEED"] = str(args.sample_seed)
+    os.environ["SAMPLE_STRATEGY"] = args.sample_strategy
+    os.environ["SAMPLE_HASH_RATE"] = str(args.sample_hash_rate)
     os.environ["SAMPLE_FORCE"] = "1" if args.force else "0"
+    os.environ["PIPELINE_DELTA"] = "1" if args.delta else "0"
+    os.environ["STREAM_EXTRACT"] = "1" if args.stream else "0"
+    os.environ["STREAM_KEEP_ARCHIVE"] = "1" if args.keep_archive else "0"
+    os.environ["EXTRACT_WORKERS"] = str(args.extract_workers)
+    os.environ["EXTRACT_ENGINE"] = args.extract_engine
+    os.environ["PROCESSED_FORMAT"] = args.processed_format
+    os.environ["SCHEMA_VARIANT"] = args.schema_variant
+    os.environ["LOAD_WORKERS"] = str(args.load_workers)
+    os.environ["LOAD_SPLIT_MB"] = str(args.load_split_mb)
+    os.environ["LOAD_BATCH_ROWS"] = str(args.load_batch_rows)
+    os.environ["BULK_LOAD"] = "1" if args.bulk else "0"
+    os.environ["MERGE_REFRESH"] = "1" if args.merge else "0"
+    os.environ["SORTED_LAYOUT"] = "1" if args.sorted_layout else "0"
+    os.environ["PARTITION_STRATEGY"] = args.partition
+    os.environ["PARTITION_COUNT"] = str(args.partition_count)
+    os.environ["FULL_DIRECT_COPY"] = "1" if args.direct_copy else "0"
+    os.environ["INDEX_WORKERS"] = str(args.index_workers)
+    os.environ["INDEX_PARALLEL_WORKERS"] = str(args.index_parallel_workers)
+    os.environ["RELEASE_SCHEMAS"] = "1" if args.release_schemas else "0"
+    os.environ["RELEASE_RETAIN"] = str(args.release_retain)
+    try:
+        # Importado só agora, com as variáveis acima: PipelineConfig recusa combinações inválidas
+        from src.config import pipeline_settings
+    except ValueError as e:
+        parser.error(str(e))
+    # Mesmo run_id para todas as etapas: as métricas vão para um único log
+    run_id = metrics.new_run_id()
+    os.environ["PIPELINE_RUN_ID"] = run_id
 
     print("="*60)
     mode_str = f"MODO {args.mode.upper()}"
@@ -76,9 +142,10 @@ def main():
     logger.info(f"📍 DATA_ROOT: {os.getenv('DATA_ROOT', 'data/ (local)')}")
     print("="*60 + "\n")
 
-    steps_to_run = PIPELINE_STEPS
+    pipeline_steps = PIPELINE_STEPS + (RELEASE_STEPS if args.release_schemas else []) + [ANALYTICS_STEP]
+    steps_to_run = pipeline_steps
     if args.only:
-        steps_to_run = [s for s in PIPELINE_STEPS if args.only in s]
+        steps_to_run = [s for s in pipeline_steps if args.only in s]
         if not steps_to_run:
             logger.error(f"❌ Nenhuma etapa encontrada para: {args.only}")
             sys.exit(1)
@@ -90,6 +157,11 @@ def main():
     total_elapsed = time.time() - total_start
     print("\n" + "="*60)
     logger.info(f"🎉 PIPELINE FINALIZADO! Tempo total: {total_elapsed:.2f}s")
+    summary = metrics.summary_lines(run_id)
+    if summary:
+        logger.info(f"📈 Throughput da execução {run_id} ({metrics.run_log(run_id)}):")
+        for line in summary:
+            logger.info(f"   {line}")
     print("="*60)
 
 if __name__ == "__main__":
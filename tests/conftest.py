@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Os caminhos de src/paths.py são resolvidos no import: DATA_ROOT temporário antes de qualquer módulo do pipeline
+os.environ["DATA_ROOT"] = tempfile.mkdtemp(prefix="cnpj-tests-")
+os.environ.setdefault("PIPELINE_RELEASE", "2026-09")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
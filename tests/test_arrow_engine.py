@@ -0,0 +1,74 @@
+import csv
+import dataclasses
+import importlib
+import io
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.ingest import arrow_engine
+from src.ingest.key_index import KeyIndex
+from src.ingest.layout import TABLE_COLUMNS
+
+extract = importlib.import_module("src.ingest.03_extract_files")
+
+EMPRESAS = "K3241.K03200Y0.D41011.EMPRECSV"
+ESTABELECIMENTOS = "K3241.K03200Y0.D41011.ESTABELE"
+
+
+def member(table: str, rows: int) -> bytes:
+    """Membro no formato da RFB: latin1, `;`, campos entre aspas, vazios no meio."""
+    width = len(TABLE_COLUMNS[table])
+    lines = []
+    for i in range(rows):
+        key = f"{(i * 7919) % 2000:08d}"
+        fields = [key, f"{i % 9999:04d}", "AÇÃO; \"LTDA\"" if i % 5 == 0 else f"NOME {i}", ""]
+        fields += [str(i % 13)] * (width - len(fields))
+        lines.append(";".join('"' + f.replace('"', '""') + '"' for f in fields[:width]))
+    return ("\n".join(lines) + "\n").encode("latin1")
+
+
+def run(engine: str, strategy: str, name: str, data: bytes, keys: KeyIndex, tmp_path, monkeypatch,
+        sample_rows: int = 50) -> tuple:
+    settings = dataclasses.replace(extract.pipeline_settings, mode="sample", extract_engine=engine,
+                                   sample_strategy=strategy, sample_rows=sample_rows, sample_hash_rate=0.1)
+    monkeypatch.setattr(extract, "pipeline_settings", settings)
+    monkeypatch.setattr(arrow_engine, "pipeline_settings", settings)
+    monkeypatch.setattr(extract, "EMPRESA_KEYS", keys)
+    # Blocos pequenos: vários lotes Arrow por membro
+    monkeypatch.setattr(arrow_engine, "BLOCK_SIZE", 16 * 1024)
+    path = tmp_path / engine / name
+    path.parent.mkdir(exist_ok=True)
+    summary = extract.sample_member(io.BytesIO(data), path, name == EMPRESAS)
+    # A serialização (aspas) difere entre os motores; o conteúdo, não
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f, delimiter=";"))
+    return rows, summary["written"], summary["skipped"]
+
+
+@pytest.mark.parametrize("strategy", ["head", "reservoir", "hash"])
+@pytest.mark.parametrize("name", [EMPRESAS, ESTABELECIMENTOS])
+def test_engines_write_same_sample(strategy, name, tmp_path, monkeypatch):
+    table = "empresas" if name == EMPRESAS else "estabelecimentos"
+    data = member(table, 3000)
+    outputs = []
+    for engine in ("python", "arrow"):
+        keys = KeyIndex()
+        keys.add_many([f"{k:08d}" for k in range(0, 2000, 3)])
+        outputs.append(run(engine, strategy, name, data, keys, tmp_path, monkeypatch))
+
+    python, arrow = outputs
+    assert python[1] > 0
+    assert arrow == python
+
+
+@pytest.mark.parametrize("engine", ["python", "arrow"])
+def test_zero_sample_rows_writes_nothing(engine, tmp_path, monkeypatch):
+    keys = KeyIndex()
+    keys.add_many(["00000000"])
+    data = member("estabelecimentos", 100)
+
+    rows, written, skipped = run(engine, "head", ESTABELECIMENTOS, data, keys, tmp_path, monkeypatch, sample_rows=0)
+
+    assert (rows, written, skipped) == ([], 0, 100)
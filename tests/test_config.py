@@ -0,0 +1,9 @@
+import pytest
+
+from src.config import PipelineConfig
+
+
+def test_typed_schema_rejects_direct_copy():
+    with pytest.raises(ValueError, match="FULL_DIRECT_COPY"):
+        PipelineConfig(full_direct_copy=True, schema_variant="typed")
+    assert PipelineConfig(full_direct_copy=True, schema_variant="text").full_direct_copy
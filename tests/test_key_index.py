@@ -0,0 +1,35 @@
+import numpy as np
+
+from src.ingest.key_index import KeyIndex, keys_to_ints
+
+
+def test_keys_to_ints_flags_malformed_keys():
+    ints, valid = keys_to_ints(["00000001", "99999999", "1234567", "ABCDEFGH", "123456789", ""])
+    assert valid.tolist() == [True, True, False, False, False, False]
+    assert ints[:2].tolist() == [1, 99_999_999]
+
+
+def test_add_and_contains():
+    index = KeyIndex()
+    index.add_many(["00000001", "12345678", "12345678", "invalida"])
+
+    assert len(index) == 2
+    assert "12345678" in index and "00000002" not in index
+    assert index.contains_many(["00000001", "00000002", "x", "12345678"]).tolist() == [True, False, False, True]
+
+
+def test_update_clear_and_save_load(tmp_path):
+    a, b = KeyIndex(), KeyIndex()
+    a.add_many(["00000001"])
+    b.add_many(["00000002", "99999999"])
+    a.update(b)
+    assert len(a) == 3
+
+    path = tmp_path / "empresa_keys.npy"
+    a.save(path, sources=["Empresas1.zip", "Empresas0.zip"])
+    loaded = KeyIndex.load(path)
+    assert np.array_equal(loaded.bits, a.bits)
+    assert KeyIndex.saved_sources(path) == ["Empresas0.zip", "Empresas1.zip"]
+
+    a.clear()
+    assert len(a) == 0
@@ -0,0 +1,112 @@
+import importlib
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from src.config import settings
+from src.ingest.layout import TABLE_COLUMNS
+from src.ingest.release_diff import CHANGED, NEW, UNCHANGED, ReleaseDelta
+from src.ingest.sinks import record_release_outputs
+
+load_data = importlib.import_module("src.ingest.04_load_data")
+
+EMPRESAS_OLD = "K3241.K03200Y0.D40911.EMPRECSV"
+EMPRESAS_NEW = "K3241.K03200Y0.D41011.EMPRECSV"
+SOCIOS_OLD = "K3241.K03200Y9.D40911.SOCIOCSV"
+ESTAB_NEW = "K3241.K03200Y0.D41011.ESTABELE"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(load_data, "DATA_DIR", tmp_path)
+    for name in (EMPRESAS_OLD, EMPRESAS_NEW, SOCIOS_OLD, ESTAB_NEW):
+        (tmp_path / name).write_text("00000001;X\n", encoding="utf-8")
+    record_release_outputs(tmp_path, "2026-08", {"Empresas0.zip": [EMPRESAS_OLD], "Socios9.zip": [SOCIOS_OLD]})
+    return tmp_path
+
+
+def delta(**files: str) -> ReleaseDelta:
+    return ReleaseDelta("2026-09", "2026-08", files, removed=["Socios9.zip", "Paises.zip"])
+
+
+def test_jobs_grouped_per_table_with_previous_outputs_and_removed_zips(data_dir):
+    jobs = [load_data.file_job(data_dir / EMPRESAS_NEW, "empresas"), load_data.file_job(data_dir / ESTAB_NEW, "estabelecimentos")]
+    outputs = {"Empresas0.zip": [EMPRESAS_NEW], "Estabelecimentos0.zip": [ESTAB_NEW]}
+
+    result = load_data.delta_jobs(jobs, outputs, delta(**{"Empresas0.zip": CHANGED, "Estabelecimentos0.zip": NEW}))
+
+    by_table = {job.table: job for job in result}
+    assert by_table["empresas"].sources == (data_dir / EMPRESAS_NEW,)
+    assert by_table["empresas"].replaces == (data_dir / EMPRESAS_OLD,)
+    # Zip novo: nada a substituir
+    assert by_table["estabelecimentos"].sources == (data_dir / ESTAB_NEW,) and by_table["estabelecimentos"].replaces == ()
+    # Zip de fato removido: só apaga as linhas que vieram dele; domínios ficam de fora
+    removal = by_table["socios"]
+    assert removal.size == 0 and removal.sources == () and removal.replaces == (data_dir / SOCIOS_OLD,)
+    assert len(result) == 3
+    assert all(job.path is None for job in result)
+
+
+def test_missing_previous_output_aborts(data_dir):
+    (data_dir / EMPRESAS_OLD).unlink()
+    jobs = [load_data.file_job(data_dir / EMPRESAS_NEW, "empresas")]
+
+    assert load_data.delta_jobs(jobs, {"Empresas0.zip": [EMPRESAS_NEW]}, delta(**{"Empresas0.zip": CHANGED})) is None
+
+
+def test_missing_previous_record_aborts(data_dir):
+    jobs = [load_data.file_job(data_dir / EMPRESAS_NEW, "empresas")]
+    unrecorded = ReleaseDelta("2026-09", "2026-07", {"Empresas0.zip": UNCHANGED})
+
+    assert load_data.delta_jobs(jobs, {"Empresas0.zip": [EMPRESAS_NEW]}, unrecorded) is None
+
+
+def estab_row(cnpj: str, ordem: str, situacao: str) -> str:
+    cols = TABLE_COLUMNS["estabelecimentos"]
+    return ";".join([cnpj, ordem, "00", "1", "", situacao] + [""] * (len(cols) - 6)) + "\n"
+
+
+def test_copy_delta_keeps_rows_of_unchanged_zips():
+    """A RFB divide Estabelecimentos por posição: a empresa 1 tem linhas em dois zips e só um deles muda."""
+    psycopg2 = pytest.importorskip("psycopg2")
+    try:
+        conn = psycopg2.connect(host=settings.host, port=settings.port, dbname=settings.name,
+                                user=settings.user, password=settings.password, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        old0, new0, unchanged1 = tmp / "estab0.old", tmp / "estab0.new", tmp / "estab1"
+        old0.write_text(estab_row("00000001", "0001", "02") + estab_row("00000002", "0001", "02")
+                        + estab_row("00000003", "0001", "02"), encoding="utf-8")
+        # Zip 0 na release nova: filial 0001 da empresa 1 muda de situação, a empresa 2 sai,
+        # e a filial 0003 da empresa 3 chega vinda do zip 1
+        new0.write_text(estab_row("00000001", "0001", "08") + estab_row("00000003", "0001", "02")
+                        + estab_row("00000003", "0003", "02"), encoding="utf-8")
+        unchanged1.write_text(estab_row("00000001", "0002", "02") + estab_row("00000001", "0003", "02"),
+                              encoding="utf-8")
+        cols = TABLE_COLUMNS["estabelecimentos"]
+        try:
+            cur = conn.cursor()
+            cur.execute(f"CREATE TEMP TABLE estabelecimentos ({', '.join(f'{c} TEXT' for c in cols)})")
+            for path in (old0, unchanged1):
+                with open(path, "rb") as f:
+                    cur.copy_expert(load_data.copy_sql("estabelecimentos", "UTF8"), f)
+            job = load_data.LoadJob("estabelecimentos (delta)", "estabelecimentos", 0, None, "UTF8", "delta/estabelecimentos",
+                                    lambda: "x", sources=(new0,), replaces=(old0,))
+
+            stats = load_data.copy_delta(job, cur)
+
+            cur.execute("SELECT cnpj_basico, cnpj_ordem, situacao_cadastral FROM estabelecimentos ORDER BY 1, 2")
+            assert cur.fetchall() == [
+                ("00000001", "0001", "08"),
+                ("00000001", "0002", "02"),
+                ("00000001", "0003", "02"),
+                ("00000003", "0001", "02"),
+                ("00000003", "0003", "02"),
+            ]
+            assert stats.rows == 3
+        finally:
+            conn.rollback()
+            conn.close()
@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+from src.config import settings
+from src.ingest import load_manifest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+RELEASE = "2026-09"
+SOURCE = "processed/K3241.K03200Y0.D41011.EMPRECSV"
+
+
+@pytest.fixture
+def cursor():
+    """Cursor num schema descartável do PostgreSQL configurado (DB_*); sem banco, os testes são pulados."""
+    try:
+        conn = psycopg2.connect(host=settings.host, port=settings.port, dbname=settings.name,
+                                user=settings.user, password=settings.password, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    schema = f"test_manifest_{uuid.uuid4().hex[:8]}"
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}")
+    load_manifest.ensure_table(cur)
+    try:
+        yield cur
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_begin_starts_at_offset_zero(cursor):
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+
+    entry = load_manifest.get(cursor, RELEASE, SOURCE)
+    assert (entry.status, entry.committed_offset, entry.rows, entry.bytes) == (load_manifest.LOADING, 0, 0, 1000)
+
+
+def test_resume_keeps_committed_offset(cursor):
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+    load_manifest.advance(cursor, RELEASE, SOURCE, 400, 40, 1.0)
+    load_manifest.fail(cursor, RELEASE, SOURCE, "conexão perdida", 0.5)
+
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=True)
+
+    entry = load_manifest.get(cursor, RELEASE, SOURCE)
+    assert (entry.status, entry.committed_offset, entry.rows) == (load_manifest.LOADING, 400, 40)
+
+
+def test_restart_without_resume_resets_offset(cursor):
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+    load_manifest.advance(cursor, RELEASE, SOURCE, 400, 40, 1.0)
+
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+
+    entry = load_manifest.get(cursor, RELEASE, SOURCE)
+    assert (entry.committed_offset, entry.rows) == (0, 0)
+
+
+def test_complete_commits_whole_file(cursor):
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+    load_manifest.advance(cursor, RELEASE, SOURCE, 400, 40, 1.0)
+
+    load_manifest.complete(cursor, RELEASE, SOURCE, 100, "abc", 2.0)
+
+    entry = load_manifest.get(cursor, RELEASE, SOURCE)
+    assert (entry.status, entry.committed_offset, entry.rows, entry.checksum) == (load_manifest.DONE, 1000, 100, "abc")
+
+
+def test_partial_failure_and_drop(cursor):
+    load_manifest.begin(cursor, RELEASE, SOURCE, "empresas", 1000, resume=False)
+    load_manifest.fail(cursor, RELEASE, SOURCE, "1/3 grupos confirmados", 1.0, partial=True)
+    assert load_manifest.get(cursor, RELEASE, SOURCE).status == load_manifest.PARTIAL
+
+    load_manifest.drop_tables(cursor, ["empresas"])
+
+    assert load_manifest.get(cursor, RELEASE, SOURCE).status == load_manifest.DROPPED
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from src.config import settings
+from src.ingest.layout import TABLE_COLUMNS
+from src.ingest.pgcopy import HEADER, TRAILER, convert_column, encode_batch, read_key_batches
+
+EMPRESAS = [
+    ["00000001", "EMPRESA A", "2062", "49", "1000,00", "01", ""],
+    ["12345678", "AÇÃO LTDA", "", "05", "-12,5", "5", "UNIÃO"],
+    ["99999999", "", "X", "123456", "0", "", "ESTADO"],
+]
+
+
+def empresas_batch(rows=EMPRESAS):
+    return pa.RecordBatch.from_arrays([pa.array(list(col), pa.string()) for col in zip(*rows)],
+                                      names=TABLE_COLUMNS["empresas"])
+
+
+def test_convert_column_invalid_values_become_null():
+    values, valid = convert_column(pa.array(["0042", "", "12345", None, "-1"]), "int2")
+    assert valid.tolist() == [True, False, False, False, False] and values[0] == 42
+
+    values, valid = convert_column(pa.array(["20240229", "20230229", "00000000", "2024011"]), "date")
+    # 2024-02-29 = dia 8825 desde 2000-01-01 (época do PostgreSQL)
+    assert valid.tolist() == [True, False, False, False] and values[0] == 8825
+
+    values, valid = convert_column(pa.array(["1000,00", "-12,5", "1.000,00", "7"]), "numeric")
+    assert valid.tolist() == [True, True, False, True]
+    assert values[[0, 1, 3]].tolist() == [100000, -1250, 700]
+
+
+def test_encoded_keys_read_back(tmp_path):
+    path = tmp_path / "K3241.K03200Y0.D41011.EMPRECSV.pgcopy"
+    path.write_bytes(HEADER + encode_batch(empresas_batch(), "empresas") + TRAILER)
+
+    batches = list(read_key_batches(path, 2))
+
+    assert batches == [["00000001", "12345678"], ["99999999"]]
+
+
+def test_binary_copy_round_trip_in_postgres():
+    psycopg2 = pytest.importorskip("psycopg2")
+    try:
+        conn = psycopg2.connect(host=settings.host, port=settings.port, dbname=settings.name,
+                                user=settings.user, password=settings.password, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE empresas (
+                cnpj_basico INTEGER NOT NULL, razao_social VARCHAR(255), natureza_juridica SMALLINT,
+                qualificacao_responsavel SMALLINT, capital_social NUMERIC(18,2), porte_empresa SMALLINT,
+                ente_federativo_responsavel VARCHAR(255)
+            )
+        """)
+        data = HEADER + encode_batch(empresas_batch(), "empresas") + TRAILER
+        cur.copy_expert("COPY empresas FROM STDIN WITH (FORMAT BINARY)", io.BytesIO(data))
+        cur.execute("SELECT cnpj_basico, razao_social, natureza_juridica, qualificacao_responsavel, "
+                    "capital_social::text, porte_empresa, ente_federativo_responsavel FROM empresas ORDER BY 1")
+        assert cur.fetchall() == [
+            (1, "EMPRESA A", 2062, 49, "1000.00", 1, None),
+            (12345678, "AÇÃO LTDA", None, 5, "-12.50", 5, "UNIÃO"),
+            (99999999, None, None, None, "0.00", None, "ESTADO"),
+        ]
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from src.ingest import release_diff
+from src.ingest.download_manifest import DownloadManifest, FileEntry
+from src.ingest.release_diff import CHANGED, NEW, UNCHANGED, UNKNOWN, ReleaseDelta, compute_delta
+
+
+def manifest(release: str, **hashes: str) -> DownloadManifest:
+    files = {f"{name}.zip": FileEntry(f"{name}.zip", 100, sha) for name, sha in hashes.items()}
+    return DownloadManifest(release, files)
+
+
+@pytest.fixture
+def previous():
+    return manifest("2026-08", Empresas0="a", Empresas1="b", Socios0="c", Socios9="d")
+
+
+def test_classifies_by_sha256(previous):
+    current = manifest("2026-09", Empresas0="a", Empresas1="B", Socios0="c", Estabelecimentos0="e")
+
+    delta = compute_delta(current, previous)
+
+    assert delta.files == {
+        "Empresas0.zip": UNCHANGED,
+        "Empresas1.zip": CHANGED,
+        "Estabelecimentos0.zip": NEW,
+        "Socios0.zip": UNCHANGED,
+    }
+    assert delta.removed == ["Socios9.zip"]
+    assert delta.to_process() == {"Empresas1.zip", "Estabelecimentos0.zip"}
+    assert delta.complete()
+
+
+def test_failed_download_is_unknown_not_removed(previous):
+    """Listado na release mas fora do manifesto (download falhou): nunca vira `removed`."""
+    current = manifest("2026-09", Empresas0="a", Socios0="c", Socios9="d")
+    listed = ["Empresas0.zip", "Empresas1.zip", "Socios0.zip", "Socios9.zip"]
+
+    delta = compute_delta(current, previous, listed=listed)
+
+    assert delta.files["Empresas1.zip"] == UNKNOWN
+    assert delta.removed == []
+    assert delta.unknown() == ["Empresas1.zip"]
+    assert not delta.complete()
+    assert "Empresas1.zip" not in delta.to_process()
+    assert delta.summary() == {UNCHANGED: 3, CHANGED: 0, NEW: 0, UNKNOWN: 1, "removed": 0}
+
+
+def test_only_unlisted_files_are_removed(previous):
+    current = manifest("2026-09", Empresas0="a")
+
+    delta = compute_delta(current, previous, listed=["Empresas0.zip", "Socios0.zip"])
+
+    assert delta.files == {"Empresas0.zip": UNCHANGED, "Socios0.zip": UNKNOWN}
+    assert sorted(delta.removed) == ["Empresas1.zip", "Socios9.zip"]
+
+
+def test_first_release_is_all_new():
+    delta = compute_delta(manifest("2026-09", Empresas0="a"), None)
+
+    assert delta.previous is None
+    assert delta.files == {"Empresas0.zip": NEW}
+    assert delta.removed == []
+
+
+def test_save_and_load_round_trip(tmp_path, monkeypatch, previous):
+    monkeypatch.setattr(release_diff, "DELTA_DIR", tmp_path)
+    delta = compute_delta(manifest("2026-09", Empresas0="x"), previous, listed=["Empresas0.zip", "Socios0.zip"])
+
+    delta.save()
+
+    assert ReleaseDelta.load("2026-09") == delta
+    assert ReleaseDelta.load() == delta
+    assert ReleaseDelta.load("2026-10") is None
@@ -0,0 +1,59 @@
+import contextlib
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg2")
+
+from sqlalchemy import text
+
+from src.config import settings
+from src.ingest import release_schema
+
+SCHEMAS = ["release_2090_01", "release_2090_02", "release_2090_03"]
+
+
+class SavepointEngine:
+    """Engine de uma conexão só: cada begin()/connect() é um savepoint da transação externa, desfeita no fim."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextlib.contextmanager
+    def begin(self):
+        with self.conn.begin_nested():
+            yield self.conn
+
+    connect = begin
+
+
+@pytest.fixture
+def engine():
+    try:
+        conn = sqlalchemy.create_engine(settings.sqlalchemy_url, connect_args={"connect_timeout": 3}).connect()
+    except sqlalchemy.exc.OperationalError as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    outer = conn.begin()
+    try:
+        for schema in SCHEMAS:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+            conn.execute(text(f"CREATE TABLE {schema}.empresas AS SELECT '{schema}'::text AS cnpj_basico"))
+        yield SavepointEngine(conn)
+    finally:
+        outer.rollback()
+        conn.close()
+
+
+def test_rollback_steps_back_through_history(engine):
+    for schema in SCHEMAS:
+        release_schema.cutover(engine, schema)
+
+    assert release_schema.rollback(engine) == "release_2090_02"
+    # Um segundo rollback recua mais uma release, em vez de voltar à que foi revertida
+    assert release_schema.rollback(engine) == "release_2090_01"
+    with engine.connect() as conn:
+        assert release_schema.active_schema(conn) == "release_2090_01"
+        assert conn.execute(text("SELECT cnpj_basico FROM current.empresas")).scalar() == "release_2090_01"
+
+    release_schema.cutover(engine, "release_2090_03")
+    assert release_schema.rollback(engine) == "release_2090_01"
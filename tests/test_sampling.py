@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.ingest.sampling import Reservoir, hash_mask, member_seed
+
+
+def feed(reservoir: Reservoir, rows: list, batch: int) -> list:
+    for i in range(0, len(rows), batch):
+        reservoir.offer(rows[i:i + batch])
+    return reservoir.result()
+
+
+@pytest.mark.parametrize("batch", [1, 7, 1000])
+def test_reservoir_keeps_k_rows_in_file_order(batch):
+    rows = list(range(500))
+    sample = feed(Reservoir(20, seed=1), rows, batch)
+
+    assert len(sample) == 20 and len(set(sample)) == 20
+    assert sample == sorted(sample)
+
+
+def test_reservoir_is_deterministic_and_independent_of_batching():
+    rows = list(range(1000))
+    assert feed(Reservoir(10, seed=3), rows, 1) == feed(Reservoir(10, seed=3), rows, 333)
+    assert feed(Reservoir(10, seed=3), rows, 50) != feed(Reservoir(10, seed=4), rows, 50)
+
+
+def test_reservoir_smaller_stream_and_zero_k():
+    assert feed(Reservoir(10, seed=1), [1, 2, 3], 2) == [1, 2, 3]
+    empty = Reservoir(0, seed=1)
+    assert feed(empty, [1, 2, 3], 2) == [] and empty.seen == 3
+
+
+def test_reservoir_is_roughly_uniform():
+    hits = np.zeros(100)
+    for seed in range(400):
+        hits[feed(Reservoir(10, seed=seed), list(range(100)), 17)] += 1
+    # Esperado: 40 por posição
+    assert hits.min() > 15 and hits.max() < 70
+
+
+def test_hash_mask_selects_same_keys_everywhere():
+    keys = [f"{i:08d}" for i in range(0, 10_000_000, 97)]
+    mask = hash_mask(keys, seed=42, rate=0.1)
+
+    assert 0.08 < mask.mean() < 0.12
+    # Mesma chave, mesma decisão, em qualquer arquivo e ordem
+    assert np.array_equal(hash_mask(keys[::-1], 42, 0.1), mask[::-1])
+    assert not np.array_equal(hash_mask(keys, 43, 0.1), mask)
+    assert not hash_mask(["invalida", "123"], 42, 1.0).any()
+
+
+def test_member_seed_differs_per_member():
+    assert member_seed(42, "a.EMPRECSV") != member_seed(42, "b.EMPRECSV")
+    assert member_seed(42, "a.EMPRECSV") == member_seed(42, "a.EMPRECSV")